@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Bring-up/teardown benchmark suite for the project's topologies
+
+Runs each topology at increasing sizes and records wall time and peak
+RSS for net.build(), net.start(), pingAll() convergence and net.stop()
+over several repetitions.  Results are written as JSON and can be
+compared against a previous run to catch regressions:
+
+    sudo python3 benchmark.py --sizes 4 16 64 -o new.json
+    sudo python3 benchmark.py --compare old.json new.json
+"""
+
+from mininet.net import Mininet
+from mininet.node import Controller, OVSKernelSwitch
+from mininet.link import TCLink
+from mininet.clean import cleanup
+from mininet.log import setLogLevel, info, warn
+from topobuilder import StarTopo, LinearTopo, build_network
+from proactive import proactive_network
+import argparse
+import json
+import os
+import platform
+import runpy
+import statistics
+import sys
+import threading
+import time
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def load_mytopo():
+    """Load MyTopo from topo-2sw-2host.py (the file name is not importable)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'topo-2sw-2host.py')
+    return runpy.run_path(path)['topos']['mytopo']()
+
+
+# name -> (topology factory taking a size, whether the size is fixed)
+TOPOLOGIES = {
+    # SingleSwitchTopo(n) from single_switch.py: n hosts, 10 Mbit links
+    'single_switch': (lambda n: StarTopo(n=n, host_link=dict(bw=10)),
+                      False),
+    # MyTopo from topo-2sw-2host.py: always two hosts and two switches
+    'mytopo': (lambda n: load_mytopo(), True),
+    # The shaped switch chain of topo1.py, one host per switch, without
+    # its 10% loss: pingAll() would then hardly ever see every pair answer
+    'chain': (lambda n: LinearTopo(
+        k=n, n=1, host_link=dict(bw=10, delay='5ms', max_queue_size=1000,
+                                 use_htb=True)), False),
+    # create_simple_topology() from trafficanalyzer.py
+    'simple': (lambda n: StarTopo(n=n, host_link=dict(bw=50, delay='2ms')),
+               False),
+}
+
+
+def tree_rss(root_pid):
+    """Return the summed RSS in bytes of root_pid and all its descendants"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; ppid follows its ')'
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except OSError:
+            pass
+        stack.extend(children.get(pid, ()))
+    return total
+
+
+class PeakRSSMonitor:
+    """Track the peak RSS of this process tree in a background thread"""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = 0
+        self._running = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while self._running.is_set():
+            self.peak = max(self.peak, tree_rss(os.getpid()))
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = tree_rss(os.getpid())
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._running.clear()
+        self._thread.join()
+        self.peak = max(self.peak, tree_rss(os.getpid()))
+
+
+def timed(phases, name, fn, *args, **kwargs):
+    """Run fn, storing its wall time and peak RSS in phases[name]"""
+    with PeakRSSMonitor() as rss:
+        start = time.monotonic()
+        result = fn(*args, **kwargs)
+        wall = time.monotonic() - start
+    phases[name] = {'wall': wall, 'peak_rss': rss.peak}
+    return result
+
+
+def ping_until_converged(net, attempts=5):
+    """Repeat pingAll() until no packets are dropped; return attempts used"""
+    for attempt in range(1, attempts + 1):
+        if net.pingAll(timeout=1) == 0:
+            return attempt
+    warn(f'*** pingAll did not converge after {attempts} attempts\n')
+    return None
+
+
+def run_once(topo, builder=False, proactive=False):
+    """Bring one topology up and down, returning per-phase measurements
+
+    proactive: install all flows up front and run without a controller
+    """
+    phases = {}
+    if proactive:
+        net, breakdown = timed(phases, 'build', proactive_network, topo,
+                               switch=OVSKernelSwitch, link=TCLink)
+        phases['build']['breakdown'] = dict(breakdown)
+    elif builder:
+        # build_network covers build and start; keep its own breakdown
+        net, breakdown = timed(phases, 'build', build_network, topo,
+                               controller=Controller,
+                               switch=OVSKernelSwitch, link=TCLink)
+        phases['build']['breakdown'] = dict(breakdown)
+    else:
+        net = Mininet(topo=topo, controller=Controller,
+                      switch=OVSKernelSwitch, link=TCLink, build=False)
+        timed(phases, 'build', net.build)
+        timed(phases, 'start', net.start)
+    try:
+        attempts = timed(phases, 'pingall', ping_until_converged, net)
+        phases['pingall']['attempts'] = attempts
+    finally:
+        timed(phases, 'stop', net.stop)
+    return phases
+
+
+def run_suite(names, sizes, repetitions, builder=False, proactive=False):
+    """Run every topology at every size and return the result records"""
+    results = []
+    for name in names:
+        factory, fixed = TOPOLOGIES[name]
+        for size in (sizes[:1] if fixed else sizes):
+            for rep in range(repetitions):
+                info(f'*** {name} size={size} repetition {rep + 1}\n')
+                cleanup()
+                topo = factory(size)
+                results.append({
+                    'topology': name,
+                    'size': len(topo.hosts()),
+                    'repetition': rep,
+                    'builder': builder,
+                    'proactive': proactive,
+                    'phases': run_once(topo, builder=builder,
+                                       proactive=proactive),
+                })
+    return results
+
+
+def summarize(results):
+    """Median wall time and peak RSS per (topology, size, phase)"""
+    groups = {}
+    for record in results:
+        for phase, data in record['phases'].items():
+            key = f'{record["topology"]}/{record["size"]}/{phase}'
+            groups.setdefault(key, []).append(data)
+    return {key: {'wall': statistics.median(d['wall'] for d in data),
+                  'peak_rss': max(d['peak_rss'] for d in data),
+                  'runs': len(data)}
+            for key, data in sorted(groups.items())}
+
+
+def compare(old, new, threshold=0.2):
+    """Return summary keys whose median wall time grew beyond threshold"""
+    regressions = []
+    for key, data in new['summary'].items():
+        base = old['summary'].get(key)
+        if base and base['wall'] > 0:
+            change = data['wall'] / base['wall'] - 1
+            if change > threshold:
+                regressions.append((key, base['wall'], data['wall'], change))
+    return regressions
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--topologies', nargs='+', default=list(TOPOLOGIES),
+                        choices=list(TOPOLOGIES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[4, 16, 64])
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--builder', action='store_true',
+                        help='bring networks up with topobuilder')
+    parser.add_argument('--proactive', action='store_true',
+                        help='preinstall flows and run without a controller')
+    parser.add_argument('-o', '--output', default='benchmark.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files and exit')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown reported as regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        regressions = compare(old, new, args.threshold)
+        for key, before, after, change in regressions:
+            print(f'REGRESSION {key}: {before:.3f}s -> {after:.3f}s '
+                  f'({change:+.0%})')
+        return 1 if regressions else 0
+
+    setLogLevel('info')
+    results = run_suite(args.topologies, sorted(args.sizes),
+                        args.repetitions, builder=args.builder,
+                        proactive=args.proactive)
+    report = {
+        'meta': {'time': time.time(), 'host': platform.node(),
+                 'kernel': platform.release(),
+                 'python': platform.python_version(),
+                 'cpus': os.cpu_count()},
+        'results': results,
+        'summary': summarize(results),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    info(f'*** Benchmark results saved to {args.output}\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Capacity-aware traffic matrix planner
+
+Predicts the throughput of every flow of a traffic matrix from the link
+capacities of the topology -- NetworkX edge `capacity` attributes as in
+iperf/graph.py, or the `bw=` values of TCLinks -- using max-min fair
+water-filling over the routes of a RoutingIndex.  The routing matrix is
+kept in sparse (link, flow, fraction) form and every filling step is a
+handful of NumPy operations, so planning thousands of flows stays cheap.
+
+Predictions are compared with measured iperf throughput to tell flows
+limited by the topology from flows limited by the emulation itself.
+All rates are in Mbit/s.
+"""
+
+from mininet.log import setLogLevel, info
+from routingindex import RoutingIndex
+from collections import namedtuple
+import json
+import math
+import numpy as np
+
+# Predicted rate of one flow; bottleneck is a (u, v) link, 'demand' when
+# the flow is limited by its own sending rate, or None if unreachable
+FlowPrediction = namedtuple('FlowPrediction', [
+    'src', 'dst', 'demand', 'rate', 'isolated_rate', 'bottleneck'])
+
+# Relative tolerance for floating point saturation tests
+EPSILON = 1e-9
+
+
+class CapacityPlanner:
+    """Max-min fair throughput prediction over a capacitated topology"""
+
+    def __init__(self, routes, capacity):
+        """routes: RoutingIndex
+           capacity: dict of undirected (u, v) -> Mbit/s (None: unlimited)"""
+        self.routes = routes
+        self._crossed = {}
+        self.links = []
+        self.link_index = {}
+        caps = []
+        for (a, b), cap in capacity.items():
+            cap = math.inf if cap is None else float(cap)
+            for link in ((a, b), (b, a)):
+                if link in self.link_index:
+                    # Parallel links add up, as the index merges them
+                    caps[self.link_index[link]] += cap
+                    continue
+                self.link_index[link] = len(self.links)
+                self.links.append(link)
+                caps.append(cap)
+        self.capacity = np.array(caps, dtype=float)
+
+    @classmethod
+    def from_graph(cls, g, attr='capacity', transit=None):
+        """Plan over a NetworkX graph whose edges carry capacities"""
+        return cls(RoutingIndex.from_graph(g, transit=transit),
+                   {(a, b): data.get(attr)
+                    for a, b, data in g.edges(data=True)})
+
+    @classmethod
+    def from_node_link(cls, data, attr='capacity', transit=None):
+        """Plan over a json_graph.node_link_data() dump"""
+        from networkx.readwrite import json_graph
+        return cls.from_graph(json_graph.node_link_graph(data), attr, transit)
+
+    @classmethod
+    def from_topo(cls, topo):
+        """Plan over a Topo using its links' bw parameters"""
+        return cls(RoutingIndex.from_topo(topo),
+                   {(a, b): info.get('bw')
+                    for a, b, info in topo.links(withInfo=True)})
+
+    @classmethod
+    def from_net(cls, net):
+        """Plan over a running network using its TCLinks' bw parameters
+
+        Each direction of a TCLink is shaped at the sending interface, so
+        the smaller of the two ends' bw values is used.  Parallel links
+        add up; an unshaped one makes the pair unlimited.
+        """
+        capacity = {}
+        for link in net.links:
+            bws = [intf.params.get('bw') for intf in (link.intf1, link.intf2)]
+            bws = [bw for bw in bws if bw]
+            bw = min(bws) if bws else None
+            pair = (link.intf1.node.name, link.intf2.node.name)
+            if pair in capacity:
+                bw = None if bw is None or capacity[pair] is None else \
+                    capacity[pair] + bw
+            capacity[pair] = bw
+        nodes = [node.name for node in net.hosts + net.switches]
+        routes = RoutingIndex(nodes, list(capacity),
+                              transit=[sw.name for sw in net.switches])
+        return cls(routes, capacity)
+
+    def routing_matrix(self, flows):
+        """Return the sparse routing matrix of flows as three arrays
+
+        Entry k says that flow flow_idx[k] sends fraction[k] of its rate
+        over link link_idx[k] (ECMP splits a flow across several links).
+        The fourth value flags flows with no route.
+        """
+        link_idx, flow_idx, fraction = [], [], []
+        unreachable = np.zeros(len(flows), dtype=bool)
+        for f, (src, dst) in enumerate(flows):
+            crossed = self._crossed.get((src, dst))
+            if crossed is None:
+                # Routes never change, so each pair is resolved only once
+                crossed = [(self.link_index[link], share) for link, share
+                           in self.routes.links_for(src, dst,
+                                                    ecmp=True).items()]
+                self._crossed[(src, dst)] = crossed
+            if not crossed and src != dst:
+                unreachable[f] = True
+            for link, share in crossed:
+                link_idx.append(link)
+                flow_idx.append(f)
+                fraction.append(share)
+        return (np.array(link_idx, dtype=np.intp),
+                np.array(flow_idx, dtype=np.intp),
+                np.array(fraction, dtype=float), unreachable)
+
+    def predict(self, flows, demands=None):
+        """Predict max-min fair rates for flows running concurrently
+
+        flows: list of (src, dst) pairs
+        demands: optional per-flow sending rate caps (None: unlimited)
+        returns: list of FlowPrediction in flow order
+        """
+        n_links, n_flows = len(self.links), len(flows)
+        demand = np.array([math.inf if d is None else d
+                           for d in (demands or [None] * n_flows)],
+                          dtype=float)
+        link_idx, flow_idx, fraction, unreachable = \
+            self.routing_matrix(flows)
+        cap = self.capacity
+
+        rate = np.zeros(n_flows)
+        bottleneck = np.full(n_flows, -1, dtype=np.intp)
+        active = ~unreachable
+        demand_limited = np.zeros(n_flows, dtype=bool)
+        while active.any():
+            # Load so far and total fraction of still-growing flows
+            load = np.bincount(link_idx, weights=fraction * rate[flow_idx],
+                               minlength=n_links)
+            weight = np.bincount(link_idx,
+                                 weights=fraction * active[flow_idx],
+                                 minlength=n_links)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                headroom = np.where(weight > 0, (cap - load) / weight,
+                                    math.inf)
+            step = min(headroom.min(initial=math.inf),
+                       (demand[active] - rate[active]).min())
+            if not math.isfinite(step):
+                # Nothing limits the remaining flows
+                rate[active] = math.inf
+                break
+            rate[active] += step
+
+            saturated = (weight > 0) & (headroom <= step * (1 + EPSILON))
+            entries = saturated[link_idx] & active[flow_idx]
+            hit = np.zeros(n_flows, dtype=bool)
+            hit[flow_idx[entries]] = True
+            bottleneck[flow_idx[entries]] = link_idx[entries]
+            met = active & ~hit & (rate >= demand * (1 - EPSILON))
+            demand_limited |= met
+            active &= ~(hit | met)
+
+        # Rate each flow would get alone: its tightest link or its demand
+        isolated = np.full(n_flows, math.inf)
+        np.minimum.at(isolated, flow_idx, cap[link_idx] / fraction)
+        isolated = np.minimum(isolated, demand)
+        isolated[unreachable] = 0.0
+
+        predictions = []
+        for f, (src, dst) in enumerate(flows):
+            if unreachable[f]:
+                limit = None
+            elif demand_limited[f]:
+                limit = 'demand'
+            elif bottleneck[f] >= 0:
+                limit = self.links[bottleneck[f]]
+            else:
+                limit = None
+            predictions.append(FlowPrediction(
+                src, dst, None if math.isinf(demand[f]) else float(demand[f]),
+                float(rate[f]), float(isolated[f]), limit))
+        return predictions
+
+
+def compare(predictions, measured, tolerance=0.15, isolated=False):
+    """Compare predicted with measured rates and flag deviations
+
+    measured: per-flow measured Mbit/s, in prediction order (None for
+              flows that produced no result)
+    isolated: compare against each flow's stand-alone rate, for flows
+              that were measured one at a time
+    returns: list of dicts with prediction, measurement, relative
+             deviation and a verdict:
+             'topology-limited' / 'demand-limited' -- as predicted;
+             'below prediction' -- the emulation (CPU, tc, queues)
+             delivered less than the topology allows;
+             'above prediction' -- shaping is not being enforced
+    """
+    expected = np.array([p.isolated_rate if isolated else p.rate
+                         for p in predictions], dtype=float)
+    actual = np.array([math.nan if m is None else m for m in measured],
+                      dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation = (actual - expected) / expected
+    results = []
+    for p, exp, act, dev in zip(predictions, expected, actual, deviation):
+        if math.isnan(act) or not math.isfinite(exp) or p.bottleneck is None:
+            verdict = 'unknown'
+        elif dev < -tolerance:
+            verdict = 'below prediction'
+        elif dev > tolerance:
+            verdict = 'above prediction'
+        elif p.bottleneck == 'demand':
+            verdict = 'demand-limited'
+        else:
+            verdict = 'topology-limited'
+        results.append({
+            'src': p.src, 'dst': p.dst,
+            'predicted': float(exp) if math.isfinite(exp) else None,
+            'measured': None if math.isnan(act) else float(act),
+            'deviation': float(dev) if math.isfinite(dev) else None,
+            'bottleneck': (list(p.bottleneck)
+                           if isinstance(p.bottleneck, tuple)
+                           else p.bottleneck),
+            'verdict': verdict,
+        })
+    return results
+
+
+if __name__ == '__main__':
+    import networkx as nx
+    from networkx.readwrite import json_graph
+    setLogLevel('info')
+    # The capacitated triangle of iperf/graph.py
+    g = nx.Graph()
+    g.add_edge(1, 2, capacity=10)
+    g.add_edge(1, 3, capacity=10)
+    g.add_edge(2, 3, capacity=15)
+    planner = CapacityPlanner.from_node_link(
+        json.loads(json.dumps(json_graph.node_link_data(g))))
+    flows = [(1, 2), (1, 3), (2, 3), (3, 2)]
+    for p in planner.predict(flows):
+        info(f'*** {p.src} -> {p.dst}: {p.rate:.2f} Mbit/s '
+             f'(alone {p.isolated_rate:.2f}, bottleneck {p.bottleneck})\n')
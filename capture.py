@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Streaming packet capture with ring-buffer files and flow summaries
+
+Capture runs tcpdump on chosen interfaces with a ring of fixed-size
+files (-C/-W), so a long run on a fast link never uses more than
+files x file_mb of disk.  tcpdump reports every file it closes (-z), and
+the closed file is read right away, record by record, without loading
+it.  Packets are folded into per-flow 5-tuple summaries (bytes,
+packets, duration, SYN/FIN/RST counts) held in a FlowTable of bounded
+size: idle or least recently seen flows are evicted and handed to a
+callback, such as a RunStore.
+
+Captures already on disk can be summarized offline:
+
+    python3 capture.py ring.pcap0 ring.pcap1 ...
+"""
+
+from mininet.log import setLogLevel, info, warn
+from collections import OrderedDict, namedtuple
+import glob
+import ipaddress
+import os
+import shlex
+import struct
+import subprocess
+import sys
+import threading
+
+# pcap magic numbers: microsecond and nanosecond timestamps
+PCAP_MAGIC = {0xa1b2c3d4: 1e-6, 0xa1b23c4d: 1e-9}
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LINUX_SLL = 113
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86dd
+ETH_P_8021Q = 0x8100
+
+TCP, UDP = 6, 17
+
+# Largest frame a pcap record may hold; longer records are corrupt
+MAX_SNAPLEN = 262144
+
+FIN, SYN, RST, PSH, ACK = 0x01, 0x02, 0x04, 0x08, 0x10
+
+# One decoded packet; payload is the transport payload length and seq,
+# ack, window and flags are None for non-TCP packets
+Packet = namedtuple('Packet', [
+    'time', 'proto', 'src', 'sport', 'dst', 'dport', 'length', 'payload',
+    'flags', 'seq', 'ack', 'window'])
+
+# Summary of one flow; the key is the 5-tuple as first seen
+FlowSummary = namedtuple('FlowSummary', [
+    'proto', 'src', 'sport', 'dst', 'dport', 'first', 'last', 'packets',
+    'bytes', 'syn', 'fin', 'rst'])
+
+
+def read_pcap(path):
+    """Yield (timestamp, original length, link type, frame bytes)
+
+    The file is read record by record with buffered reads rather than
+    memory-mapped: tcpdump truncates a ring file when it wraps around to
+    it, and touching a truncated mapping kills the process with SIGBUS.
+    A record torn by truncation or by a capture still being written
+    ends the iteration.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(24)
+        if len(header) < 24:
+            return None
+        magic = struct.unpack_from('<I', header)[0]
+        if magic in PCAP_MAGIC:
+            order = '<'
+        else:
+            order = '>'
+            magic = struct.unpack_from('>I', header)[0]
+            if magic not in PCAP_MAGIC:
+                raise ValueError(f'{path} is not a pcap file')
+        scale = PCAP_MAGIC[magic]
+        snaplen, linktype = struct.unpack_from(order + 'II', header, 16)
+        record = struct.Struct(order + 'IIII')
+        while True:
+            data = f.read(record.size)
+            if len(data) < record.size:
+                break
+            sec, frac, caplen, wirelen = record.unpack(data)
+            if caplen > max(snaplen, MAX_SNAPLEN):
+                # Overwritten while being read
+                break
+            frame = f.read(caplen)
+            if len(frame) < caplen:
+                break
+            yield sec + frac * scale, wirelen, linktype, frame
+
+
+def decode(timestamp, wirelen, linktype, frame):
+    """Decode an Ethernet or cooked frame into a Packet, or None"""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(frame) < 14:
+            return None
+        ethertype, offset = struct.unpack_from('!H', frame, 12)[0], 14
+        while ethertype == ETH_P_8021Q and len(frame) >= offset + 4:
+            ethertype = struct.unpack_from('!H', frame, offset + 2)[0]
+            offset += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if len(frame) < 16:
+            return None
+        ethertype, offset = struct.unpack_from('!H', frame, 14)[0], 16
+    else:
+        return None
+    if ethertype == ETH_P_IP and len(frame) >= offset + 20:
+        ihl = (frame[offset] & 0x0f) * 4
+        total = struct.unpack_from('!H', frame, offset + 2)[0]
+        proto = frame[offset + 9]
+        src = str(ipaddress.IPv4Address(frame[offset + 12:offset + 16]))
+        dst = str(ipaddress.IPv4Address(frame[offset + 16:offset + 20]))
+        length, offset = total, offset + ihl
+        payload = total - ihl
+    elif ethertype == ETH_P_IPV6 and len(frame) >= offset + 40:
+        payload = struct.unpack_from('!H', frame, offset + 4)[0]
+        proto = frame[offset + 6]
+        src = str(ipaddress.IPv6Address(frame[offset + 8:offset + 24]))
+        dst = str(ipaddress.IPv6Address(frame[offset + 24:offset + 40]))
+        length, offset = payload + 40, offset + 40
+    else:
+        return None
+    if proto == TCP and len(frame) >= offset + 20:
+        sport, dport, seq, ack, off_flags, window = struct.unpack_from(
+            '!HHIIHH', frame, offset)
+        header = (off_flags >> 12) * 4
+        return Packet(timestamp, proto, src, sport, dst, dport, length,
+                      payload - header, off_flags & 0x3f, seq, ack, window)
+    if proto == UDP and len(frame) >= offset + 8:
+        sport, dport = struct.unpack_from('!HH', frame, offset)
+        return Packet(timestamp, proto, src, sport, dst, dport, length,
+                      payload - 8, None, None, None, None)
+    return Packet(timestamp, proto, src, 0, dst, 0, length, payload,
+                  None, None, None, None)
+
+
+def packets(path):
+    """Yield the decodable Packets of a pcap file"""
+    for record in read_pcap(path):
+        packet = decode(*record)
+        if packet is not None:
+            yield packet
+
+
+def flow_key(packet):
+    """Direction-independent 5-tuple of a packet"""
+    a, b = (packet.src, packet.sport), (packet.dst, packet.dport)
+    return (packet.proto,) + (a + b if a <= b else b + a)
+
+
+class FlowTable:
+    """Per-flow summaries with bounded memory
+
+    At most max_flows flows are kept; the least recently seen one is
+    evicted to make room, and flows idle for idle_timeout seconds of
+    capture time are evicted as packets arrive.  Evicted summaries go to
+    on_evict (default: kept in self.evicted, itself bounded).
+    """
+
+    def __init__(self, max_flows=65536, idle_timeout=120, on_evict=None,
+                 keep_evicted=65536):
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self.flows = OrderedDict()
+        self.evicted = OrderedDict() if on_evict is None else None
+        self.keep_evicted = keep_evicted
+        self.packets = 0
+
+    def add(self, packet):
+        """Account one packet to its flow; returns the flow's state"""
+        self.packets += 1
+        key = flow_key(packet)
+        flow = self.flows.get(key)
+        if flow is None:
+            if len(self.flows) >= self.max_flows:
+                self._evict(next(iter(self.flows)))
+            flow = self.flows[key] = {
+                'proto': packet.proto, 'src': packet.src,
+                'sport': packet.sport, 'dst': packet.dst,
+                'dport': packet.dport, 'first': packet.time,
+                'last': packet.time, 'packets': 0, 'bytes': 0,
+                'syn': 0, 'fin': 0, 'rst': 0}
+        else:
+            self.flows.move_to_end(key)
+        flow['last'] = max(flow['last'], packet.time)
+        flow['packets'] += 1
+        flow['bytes'] += packet.length
+        if packet.flags is not None:
+            flow['syn'] += bool(packet.flags & SYN)
+            flow['fin'] += bool(packet.flags & FIN)
+            flow['rst'] += bool(packet.flags & RST)
+        # The oldest entry is the least recently seen one
+        while self.flows and self.idle_timeout:
+            oldest = next(iter(self.flows))
+            if packet.time - self.flows[oldest]['last'] < self.idle_timeout:
+                break
+            self._evict(oldest)
+        return flow
+
+    def _evict(self, key):
+        summary = FlowSummary(**self.flows.pop(key))
+        if self.on_evict is not None:
+            self.on_evict(summary)
+            return
+        self.evicted[key] = summary
+        if len(self.evicted) > self.keep_evicted:
+            self.evicted.popitem(last=False)
+
+    def summaries(self):
+        """Summaries of all flows still in memory and kept evictions"""
+        active = [FlowSummary(**flow) for flow in self.flows.values()]
+        return list((self.evicted or {}).values()) + active
+
+    def flush(self):
+        """Evict every flow"""
+        while self.flows:
+            self._evict(next(iter(self.flows)))
+
+    def read(self, path):
+        """Account every packet of a pcap file"""
+        for packet in packets(path):
+            self.add(packet)
+
+
+class Capture:
+    """Ring-buffer tcpdump captures whose closed files feed a FlowTable"""
+
+    def __init__(self, targets, directory='/tmp/mininet_capture',
+                 file_mb=10, files=8, snaplen=128, bpf='', table=None,
+                 sinks=()):
+        """targets: list of (node, interface name) pairs
+           file_mb, files: size and number of ring files per interface
+           snaplen: bytes kept per packet; headers are enough for flows
+           bpf: optional capture filter expression
+           sinks: extra objects whose add() receives every packet, in
+           the same pass that feeds the flow table"""
+        self.targets = targets
+        self.directory = directory
+        self.file_mb = file_mb
+        self.files = files
+        self.snaplen = snaplen
+        self.bpf = bpf
+        self.table = table if table is not None else FlowTable()
+        self.sinks = list(sinks)
+        self.procs = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self.files_read = 0
+
+    def _path(self, node, intf):
+        return os.path.join(self.directory, f'{node.name}-{intf}.pcap')
+
+    def start(self):
+        """Start one tcpdump per target"""
+        os.makedirs(self.directory, exist_ok=True)
+        for node, intf in self.targets:
+            # -z echo prints each file name once tcpdump closes it
+            cmd = (f'exec tcpdump -n -i {shlex.quote(intf)} -s {self.snaplen} '
+                   f'-C {self.file_mb} -W {self.files} -Z root -z echo '
+                   f'-w {shlex.quote(self._path(node, intf))} '
+                   f'{shlex.quote(self.bpf) if self.bpf else ""}')
+            proc = node.popen(cmd, shell=True, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL,
+                              universal_newlines=True)
+            self.procs[(node, intf)] = proc
+            thread = threading.Thread(target=self._follow, args=(proc,),
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        info(f'*** Capturing on {len(self.targets)} interfaces into '
+             f'{self.directory}\n')
+
+    def _follow(self, proc):
+        """Read each file tcpdump reports closed"""
+        for line in proc.stdout:
+            self._consume(line.strip())
+
+    def _consume(self, path):
+        """Fold one closed ring file into the flow table"""
+        if not path:
+            return
+        try:
+            with self._lock:
+                for packet in packets(path):
+                    self.table.add(packet)
+                    for sink in self.sinks:
+                        sink.add(packet)
+                self.files_read += 1
+        except (OSError, ValueError) as e:
+            warn(f'*** Could not read {path}: {e}\n')
+
+    def _current(self, node, intf):
+        """The ring file tcpdump was writing when it stopped"""
+        names = glob.glob(glob.escape(self._path(node, intf)) + '[0-9]*')
+        return max(names, key=os.path.getmtime) if names else None
+
+    def stop(self):
+        """Stop capturing and read the files still open"""
+        for proc in self.procs.values():
+            proc.terminate()
+        for proc in self.procs.values():
+            proc.wait()
+        for thread in self._threads:
+            thread.join()
+        for node, intf in self.procs:
+            self._consume(self._current(node, intf))
+        self.procs, self._threads = {}, []
+
+    def summaries(self):
+        """Flow summaries collected so far"""
+        with self._lock:
+            return self.table.summaries()
+
+
+def report(summaries, top=20):
+    """Log the largest flows"""
+    flows = sorted(summaries, key=lambda f: -f.bytes)
+    info(f'*** {len(flows)} flows\n')
+    for flow in flows[:top]:
+        proto = {TCP: 'tcp', UDP: 'udp'}.get(flow.proto, str(flow.proto))
+        info(f'    {proto} {flow.src}:{flow.sport} -> {flow.dst}:'
+             f'{flow.dport}  {flow.packets} pkts {flow.bytes} B '
+             f'{flow.last - flow.first:.2f}s  syn {flow.syn} fin '
+             f'{flow.fin} rst {flow.rst}\n')
+
+
+if __name__ == '__main__':
+    setLogLevel('info')
+    table = FlowTable()
+    for path in sys.argv[1:]:
+        table.read(path)
+    report(table.summaries())
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+CPU placement of emulated hosts and CPU-bound measurement detection
+
+place_hosts() spreads hosts over dedicated cores, away from the cores
+kept for ovs-vswitchd.  CPULimitedHost hosts get a cpuset through their
+cgroup; other hosts have every process in their network namespace
+pinned with sched_setaffinity, including processes started later with
+popen(), which do not inherit the host shell's affinity.
+
+CpuWatchdog samples per-core utilization from /proc/stat, per-host CPU
+time of the processes in each host's namespace and cgroup throttling
+while a test runs.  verdict() then tells whether a result was limited
+by CPU rather than by the link: a saturated core or a throttled host
+makes a 100 Mbit link look like a 40 Mbit one.
+"""
+
+from mininet.node import CPULimitedHost
+from mininet.log import info, warn
+from mininet.util import numCores
+from netpool import namespace_processes
+from collections import deque, namedtuple
+import os
+import threading
+import time
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+# One watchdog sample: wall-clock time, busy fraction per core, CPU
+# seconds used per host since the last sample, throttled seconds per host
+CpuSample = namedtuple('CpuSample', ['time', 'cores', 'hosts', 'throttled'])
+
+
+def pin(pid, cpus):
+    """Pin every thread of a process to cpus; False if it is gone"""
+    try:
+        tids = os.listdir(f'/proc/{pid}/task')
+    except OSError:
+        return False
+    for tid in tids:
+        try:
+            os.sched_setaffinity(int(tid), cpus)
+        except OSError:
+            pass
+    return True
+
+
+def ovs_pids():
+    """Pids of the running Open vSwitch daemons"""
+    pids = []
+    for name in ('ovs-vswitchd', 'ovsdb-server'):
+        try:
+            with open(f'/var/run/openvswitch/{name}.pid') as f:
+                pids.append(int(f.read().strip()))
+        except (OSError, ValueError):
+            pass
+    return pids
+
+
+class Placement:
+    """Assignment of hosts to cores"""
+
+    def __init__(self, hosts, cpus=None, ovs_cores=1, per_host=1):
+        """cpus: cores to use (default: this process's affinity)
+           ovs_cores: cores reserved for ovs-vswitchd and the kernel
+           per_host: cores given to each host"""
+        cpus = sorted(cpus if cpus is not None else os.sched_getaffinity(0))
+        if len(cpus) <= ovs_cores:
+            warn(f'*** Only {len(cpus)} cores; hosts share them with OVS\n')
+            ovs_cores = 0
+        self.ovs = cpus[:ovs_cores]
+        usable = cpus[ovs_cores:]
+        self.hosts = {}
+        slots = max(1, len(usable) // per_host)
+        for i, host in enumerate(hosts):
+            start = i % slots * per_host
+            self.hosts[host] = usable[start:start + per_host]
+        if len(hosts) > slots:
+            warn(f'*** {len(hosts)} hosts on {slots} core slots; '
+                 'hosts share cores\n')
+
+    def cores(self, host):
+        """Cores a host was placed on"""
+        return self.hosts.get(host, [])
+
+    def apply(self):
+        """Give CPULimitedHost cgroups their cpusets and pin the rest"""
+        for host, cores in self.hosts.items():
+            if isinstance(host, CPULimitedHost):
+                host.setCPUs(cores)
+        self.repin()
+
+    def repin(self):
+        """Pin OVS and every process in the namespaces of plain hosts
+
+        CPULimitedHost processes stay in their cgroup's cpuset; others
+        have to be pinned again after new processes were started.
+        """
+        if self.ovs:
+            for pid in ovs_pids():
+                pin(pid, self.ovs)
+        plain = {host.pid: cores for host, cores in self.hosts.items()
+                 if not isinstance(host, CPULimitedHost)}
+        for shell, pids in namespace_processes(list(plain)).items():
+            for pid in [shell] + pids:
+                pin(pid, plain[shell])
+
+
+def place_hosts(net, cpus=None, ovs_cores=1, per_host=1):
+    """Place every host of net on its own cores; returns the Placement"""
+    placement = Placement(net.hosts, cpus, ovs_cores, per_host)
+    placement.apply()
+    info(f'*** Placed {len(net.hosts)} hosts on cores '
+         f'{sorted(set(c for cs in placement.hosts.values() for c in cs))}'
+         f', OVS on {placement.ovs}\n')
+    return placement
+
+
+def read_core_times():
+    """Return {core: (busy ticks, total ticks)} from /proc/stat"""
+    times = {}
+    with open('/proc/stat') as f:
+        for line in f:
+            if not line.startswith('cpu') or line.startswith('cpu '):
+                continue
+            fields = line.split()
+            values = [int(v) for v in fields[1:]]
+            # idle and iowait are not busy time
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            times[int(fields[0][3:])] = (sum(values) - idle, sum(values))
+    return times
+
+
+def process_ticks(pid):
+    """User plus system clock ticks of a process, 0 if it is gone"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # The command name may contain spaces; fields follow ')'
+            fields = f.read().rsplit(')', 1)[1].split()
+    except (OSError, IndexError):
+        return 0
+    return int(fields[11]) + int(fields[12])
+
+
+def throttled_seconds(host):
+    """Total time a CPULimitedHost's cgroup was throttled, or None"""
+    if not isinstance(host, CPULimitedHost):
+        return None
+    for path, field, scale in (
+            (f'/sys/fs/cgroup/cpu,cpuacct/{host.name}/cpu.stat',
+             'throttled_time', 1e-9),
+            (f'/sys/fs/cgroup/cpu/{host.name}/cpu.stat',
+             'throttled_time', 1e-9),
+            (f'/sys/fs/cgroup/{host.name}/cpu.stat',
+             'throttled_usec', 1e-6)):
+        try:
+            with open(path) as f:
+                for line in f:
+                    key, value = line.split()
+                    if key == field:
+                        return int(value) * scale
+        except OSError:
+            continue
+    return None
+
+
+class CpuWatchdog:
+    """Background sampler of core, per-host and throttling CPU figures"""
+
+    def __init__(self, net, interval=0.5, window=7200, placement=None,
+                 threshold=0.9):
+        """window: samples kept
+           placement: Placement whose pins are renewed every sample,
+           so processes started during the test are pinned too
+           threshold: busy fraction counted as saturated"""
+        self.net = net
+        self.interval = interval
+        self.placement = placement
+        self.threshold = threshold
+        self.samples = deque(maxlen=window)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _host_ticks(self, hosts):
+        """Clock ticks used by all processes in each host's namespace"""
+        shells = {host.pid: host for host in hosts}
+        ticks = {}
+        for shell, pids in namespace_processes(list(shells)).items():
+            ticks[shells[shell]] = sum(process_ticks(pid)
+                                       for pid in [shell] + pids)
+        return ticks
+
+    def _run(self):
+        hosts = list(self.net.hosts)
+        cores = read_core_times()
+        ticks = self._host_ticks(hosts)
+        throttled = {host: throttled_seconds(host) for host in hosts}
+        while not self._stop.wait(self.interval):
+            if self.placement:
+                self.placement.repin()
+            now = time.time()
+            new_cores = read_core_times()
+            busy = {}
+            for core, (used, total) in new_cores.items():
+                old_used, old_total = cores.get(core, (used, total))
+                if total > old_total:
+                    busy[core] = (used - old_used) / (total - old_total)
+            new_ticks = self._host_ticks(hosts)
+            # Exited processes make the sum drop; clamp at zero
+            used = {host.name: max(0, new_ticks.get(host, 0) -
+                                   ticks.get(host, 0)) / CLOCK_TICKS
+                    for host in hosts}
+            new_throttled = {host: throttled_seconds(host) for host in hosts}
+            stalls = {host.name: new_throttled[host] - throttled[host]
+                      for host in hosts if new_throttled[host] is not None
+                      and throttled[host] is not None}
+            self.samples.append(CpuSample(now, busy, used, stalls))
+            cores, ticks, throttled = new_cores, new_ticks, new_throttled
+
+    def start(self):
+        """Start sampling in a daemon thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def verdict(self, hosts, start, end=None):
+        """Tell whether a test between hosts was CPU-bound
+
+        hosts: names of the hosts involved
+        start, end: wall-clock window of the test
+        returns: dict with cpu_bound, the reasons, the busiest relevant
+        core's mean utilization and each host's CPU use in cores
+        """
+        end = end if end is not None else time.time()
+        window = [s for s in self.samples if start <= s.time <= end]
+        result = {'cpu_bound': False, 'reasons': [], 'samples': len(window),
+                  'core_busy': None, 'host_cpu': {}}
+        if not window:
+            return result
+        # Cores the hosts were placed on, or every core if unplaced
+        placed = {host.name: cores for host, cores in
+                  (self.placement.hosts.items() if self.placement else ())}
+        cores = set(c for name in hosts for c in placed.get(name, ()))
+        if not cores:
+            cores = set(window[0].cores)
+        elapsed = max(end - start, self.interval)
+        for core in sorted(cores):
+            values = [s.cores[core] for s in window if core in s.cores]
+            mean = sum(values) / len(values) if values else 0.0
+            if result['core_busy'] is None or mean > result['core_busy']:
+                result['core_busy'] = mean
+            if mean >= self.threshold:
+                result['reasons'].append(f'core {core} {mean:.0%} busy')
+        for name in hosts:
+            seconds = sum(s.hosts.get(name, 0.0) for s in window)
+            result['host_cpu'][name] = seconds / elapsed
+            limit = self._limit(name)
+            if limit and seconds / elapsed >= self.threshold * limit:
+                result['reasons'].append(
+                    f'{name} used {seconds / elapsed:.2f} of its '
+                    f'{limit:.2f} cores')
+            stalled = sum(s.throttled.get(name, 0.0) for s in window)
+            if stalled > 0.05 * elapsed:
+                result['reasons'].append(
+                    f'{name} throttled {stalled / elapsed:.0%} of the time')
+        result['cpu_bound'] = bool(result['reasons'])
+        return result
+
+    def _limit(self, name):
+        """Cores a host may use: its cpu fraction or placement"""
+        host = self.net[name]
+        fraction = host.params.get('cpu', -1) \
+            if isinstance(host, CPULimitedHost) else -1
+        if fraction and fraction > 0:
+            return fraction * numCores()
+        if self.placement and self.placement.cores(host):
+            return len(self.placement.cores(host))
+        return None
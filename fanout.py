@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Parallel fan-out command execution on Mininet nodes
+
+Sends a command (or one command per node) to many node shells at once and
+multiplexes their output with poll(), so a sweep over hundreds of hosts
+costs one round-trip instead of one per host.
+"""
+
+from mininet.log import warn
+from collections import namedtuple
+import select
+import time
+
+# Output of one node's command; elapsed is in seconds
+FanoutResult = namedtuple('FanoutResult', ['output', 'elapsed', 'timed_out'])
+
+# poll() events after which a shell's output will not resume
+HANGUP = select.POLLHUP | select.POLLERR | select.POLLNVAL
+
+
+def fanout(commands, timeout=None):
+    """Run commands on several nodes concurrently
+
+    commands: dict of node -> shell command string
+    timeout: seconds to wait for all nodes (None waits indefinitely);
+             commands still running are interrupted with ^C
+    returns: dict of node -> FanoutResult; timed_out is also set when
+             a node's shell closed before its command finished
+    """
+    poller = select.poll()
+    fd_to_node = {}
+    started = {}
+    outputs = {}
+    results = {}
+
+    for node, cmd in commands.items():
+        if node.waiting:
+            raise RuntimeError(f'{node.name} is already running a command')
+        node.sendCmd(cmd)
+        fd = node.stdout.fileno()
+        fd_to_node[fd] = node
+        poller.register(fd, select.POLLIN)
+        started[node] = time.monotonic()
+        outputs[node] = []
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while fd_to_node:
+        # Checked on every pass: a node that keeps printing never
+        # leaves poll() without events
+        if deadline is None:
+            wait_ms = None
+        else:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_ms = max(1, int(remaining * 1000))
+        for fd, event in poller.poll(wait_ms):
+            node = fd_to_node[fd]
+            data = node.monitor(timeoutms=0) if event & select.POLLIN \
+                else ''
+            outputs[node].append(data)
+            if node.waiting and (data or not event & HANGUP):
+                continue
+            poller.unregister(fd)
+            del fd_to_node[fd]
+            if node.waiting:
+                # The shell hung up; its command will never finish
+                warn(f'*** {node.name}: shell closed before the command '
+                     'finished\n')
+            results[node] = FanoutResult(
+                ''.join(outputs[node]), time.monotonic() - started[node],
+                node.waiting)
+
+    # Interrupt stragglers so their shells are usable again
+    for node in fd_to_node.values():
+        warn(f'*** {node.name}: command timed out after {timeout}s\n')
+        node.sendInt()
+        outputs[node].append(node.waitOutput())
+        results[node] = FanoutResult(
+            ''.join(outputs[node]), time.monotonic() - started[node], True)
+
+    return results
+
+
+def fanout_all(nodes, cmd, timeout=None):
+    """Run the same command, or cmd(node) if it is callable, on all nodes"""
+    if callable(cmd):
+        return fanout({node: cmd(node) for node in nodes}, timeout)
+    return fanout({node: cmd for node in nodes}, timeout)
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Concurrent HTTP load generation with latency percentiles
+
+run_load() starts an asyncio load generator on every client host at
+once (through fanout()) against a web server in the network and reports
+requests/s, throughput and p50/p95/p99/p999 latency per client and
+overall.  Each generator keeps `concurrency` connections busy, with or
+without keep-alive, either as fast as responses come back or at a fixed
+request rate.  At a fixed rate, latency is measured from when a request
+was due rather than when it was sent, so a stalled server cannot hide
+the requests it delayed.
+
+Latencies go into logarithmic histograms (1% wide buckets), which stay
+small however many requests are made and merge exactly across clients.
+
+start_server() replaces the single-threaded `python3 -m http.server`
+with several worker processes sharing the port through SO_REUSEPORT, so
+the network rather than the server is measured.  It answers
+GET /size/N with N bytes; any other path gets a short response.  Other
+servers (traffic.py, lab3_topology.py) can be loaded with path='/'.
+
+From the Mininet CLI:
+
+    mininet> py __import__('httpload').run_load(net, server, [cust1, cust2])
+
+Stand-alone on a star topology, with h1 serving the other hosts:
+
+    sudo python3 httpload.py --hosts 4 --concurrency 16 --sizes 1024 65536
+"""
+
+from mininet.log import setLogLevel, info, warn
+from fanout import fanout
+from topobuilder import StarTopo, build_network
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+SCRIPT = os.path.abspath(__file__)
+
+# Width of a latency histogram bucket: 1% of its value
+BUCKET_STEP = math.log(1.01)
+
+PERCENTILES = (50, 95, 99, 99.9)
+
+CHUNK = b'x' * 65536
+
+
+def bucket(seconds):
+    """Histogram bucket of a latency"""
+    return int(math.log(max(seconds, 1e-6) * 1e6) / BUCKET_STEP)
+
+
+def bucket_value(index):
+    """Latency in milliseconds at the middle of a bucket"""
+    return math.exp((index + 0.5) * BUCKET_STEP) / 1000
+
+
+def merge(histograms):
+    """Sum histograms of {bucket: count}"""
+    merged = {}
+    for histogram in histograms:
+        for index, count in histogram.items():
+            merged[int(index)] = merged.get(int(index), 0) + count
+    return merged
+
+
+def histogram_percentiles(histogram, percentiles=PERCENTILES):
+    """Return {'p50': ms, ...} of a histogram (None when empty)"""
+    total = sum(histogram.values())
+    result = {}
+    for q in percentiles:
+        key = f'p{q:g}'.replace('.', '')
+        result[key] = None
+        if not total:
+            continue
+        rank, seen = max(math.ceil(q / 100.0 * total), 1), 0
+        for index in sorted(histogram):
+            seen += histogram[index]
+            if seen >= rank:
+                result[key] = bucket_value(index)
+                break
+    return result
+
+
+# Server side: runs inside the server host
+
+async def _handle(reader, writer):
+    """Serve requests on one connection until it is closed"""
+    try:
+        while True:
+            request = await reader.readline()
+            if not request:
+                break
+            keepalive = request.rstrip().endswith(b'HTTP/1.1')
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                if line.lower().startswith(b'connection:'):
+                    keepalive = b'close' not in line.lower()
+            parts = request.split()
+            path = parts[1].decode() if len(parts) > 1 else '/'
+            size = 2
+            if path.startswith('/size/'):
+                try:
+                    size = int(path[6:])
+                except ValueError:
+                    pass
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n'
+                         b'Connection: %s\r\n\r\n' %
+                         (size, b'keep-alive' if keepalive else b'close'))
+            while size > 0:
+                writer.write(CHUNK[:size])
+                size -= len(CHUNK)
+                await writer.drain()
+            if not keepalive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve_worker(sock):
+    server = await asyncio.start_server(_handle, sock=sock)
+    async with server:
+        await server.serve_forever()
+
+
+def serve(port=80, workers=4):
+    """Serve on port from several processes sharing it; never returns"""
+    children = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            children = []
+            break
+        children.append(pid)
+
+    def stop(*args, status=0):
+        # The first process takes its workers down with it
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        os._exit(status)
+
+    signal.signal(signal.SIGTERM, stop)
+    # Every worker gets its own socket; the kernel spreads connections
+    # over them
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    try:
+        sock.bind(('0.0.0.0', port))
+    except OSError:
+        # Another server holds the port; no worker may keep running
+        stop(status=1)
+    sock.listen(1024)
+    asyncio.run(_serve_worker(sock))
+
+
+# Client side: runs inside each client host
+
+async def fetch(conn, host, path, keepalive):
+    """Send one request over conn ([reader, writer] or [None, None])"""
+    if conn[0] is None:
+        conn[0], conn[1] = await asyncio.open_connection(host[0], host[1])
+    reader, writer = conn
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host[0]}\r\n'
+                 f'Connection: {"keep-alive" if keepalive else "close"}'
+                 '\r\n\r\n'.encode())
+    status = await reader.readline()
+    if not status.startswith(b'HTTP/'):
+        raise ConnectionError('connection closed by server')
+    # HTTP/1.0 servers such as http.server close after each response
+    length, close = None, not keepalive or status.startswith(b'HTTP/1.0')
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'connection' and b'close' in value.lower():
+            close = True
+    received = 0
+    if length is None:
+        # No length: the body ends with the connection
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            received += len(data)
+        close = True
+    else:
+        while received < length:
+            data = await reader.read(min(65536, length - received))
+            if not data:
+                raise ConnectionError('short response body')
+            received += len(data)
+    if close:
+        writer.close()
+        conn[0] = conn[1] = None
+    return int(status.split()[1]), received
+
+
+async def _generate(host, paths, concurrency, duration, rate, keepalive):
+    """Load host for duration seconds; returns the client's result"""
+    loop = asyncio.get_running_loop()
+    result = {'requests': 0, 'errors': 0, 'bytes': 0, 'histogram': {}}
+    histogram = result['histogram']
+    start = loop.time()
+    end = start + duration
+    due = asyncio.Queue()
+
+    async def schedule():
+        # Poisson arrivals at rate requests/s, queued with their due time
+        when = start
+        while when < end:
+            await asyncio.sleep(max(0, when - loop.time()))
+            due.put_nowait(when)
+            when += random.expovariate(rate)
+        for _ in range(concurrency):
+            due.put_nowait(None)
+
+    async def worker():
+        conn = [None, None]
+        while True:
+            if rate:
+                sent = await due.get()
+                if sent is None:
+                    break
+            else:
+                sent = loop.time()
+                if sent >= end:
+                    break
+            try:
+                status, size = await fetch(conn, host,
+                                           random.choice(paths),
+                                           keepalive)
+            except (OSError, ValueError, asyncio.IncompleteReadError):
+                result['errors'] += 1
+                if conn[1] is not None:
+                    conn[1].close()
+                conn[0] = conn[1] = None
+                continue
+            if status >= 400:
+                result['errors'] += 1
+            index = bucket(loop.time() - sent)
+            histogram[index] = histogram.get(index, 0) + 1
+            result['requests'] += 1
+            result['bytes'] += size
+        if conn[1] is not None:
+            conn[1].close()
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    if rate:
+        tasks.append(asyncio.ensure_future(schedule()))
+    await asyncio.gather(*tasks)
+    result['elapsed'] = loop.time() - start
+    return result
+
+
+def client(host, port, paths, concurrency=8, duration=10, rate=None,
+           keepalive=True):
+    """Run a load generator and print its result as JSON"""
+    result = asyncio.run(_generate((host, port), paths, concurrency,
+                                   duration, rate, keepalive))
+    print(json.dumps(result))
+
+
+# Orchestration: runs in the Mininet process
+
+def _paths(sizes, path):
+    if path is not None:
+        return [path]
+    return [f'/size/{size}' for size in sizes]
+
+
+def listening(host, port):
+    """Whether something listens on a host's TCP port"""
+    return bool(host.cmd(f'ss -Hltn "sport = :{port}"').strip())
+
+
+def wait_listening(host, port, timeout=10, proc=None):
+    """Wait until something listens on a host's TCP port
+
+    proc: the server process; False is returned as soon as it exits
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            return False
+        if listening(host, port):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def start_server(host, port=80, workers=4):
+    """Start a multi-worker server on host; returns its process
+
+    Raises RuntimeError when the port is taken or the server exits.
+    """
+    if listening(host, port):
+        # e.g. traffic.py's http.server, which would keep serving alone
+        raise RuntimeError(f'{host.name}:{port} is already in use')
+    proc = host.popen(['python3', SCRIPT, 'serve', '--port', str(port),
+                       '--workers', str(workers)],
+                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_listening(host, port, proc=proc):
+        proc.terminate()
+        raise RuntimeError(f'HTTP server on {host.name}:{port} did not start')
+    info(f'*** HTTP server with {workers} workers on {host.name}:{port}\n')
+    return proc
+
+
+def stop_server(proc):
+    """Stop a server started by start_server and all its workers"""
+    proc.terminate()
+    proc.wait()
+
+
+def summarize(result):
+    """Add rates and latency percentiles to a client or overall result"""
+    elapsed = result['elapsed'] or 1e-9
+    summary = {key: result[key] for key in ('requests', 'errors', 'bytes',
+                                            'elapsed')}
+    summary['requests_per_second'] = result['requests'] / elapsed
+    summary['bits_per_second'] = result['bytes'] * 8 / elapsed
+    summary['latency_ms'] = histogram_percentiles(result['histogram'])
+    return summary
+
+
+def run_load(net, server, clients, port=80, concurrency=8, duration=10,
+             rate=None, sizes=(1024,), keepalive=True, path=None,
+             workers=4, timeout=None):
+    """Load server from every client at once
+
+    server, clients: Mininet hosts
+    concurrency: connections per client
+    rate: requests/s per client (None: as fast as responses return)
+    sizes: response sizes requested from our server, picked at random
+    path: request this path instead, e.g. '/' on another web server
+    workers: server processes to start (0 uses a server already running)
+    returns: {'clients': {name: summary}, 'overall': summary}
+    """
+    proc = start_server(server, port, workers) if workers else None
+    args = ['python3', SCRIPT, 'client', server.IP(), '--port', str(port),
+            '--concurrency', str(concurrency), '--duration', str(duration),
+            '--paths'] + _paths(sizes, path)
+    if rate:
+        args += ['--rate', str(rate)]
+    if not keepalive:
+        args.append('--no-keepalive')
+    info(f'*** Loading {server.name}:{port} from {len(clients)} clients, '
+         f'{concurrency} connections each, for {duration}s\n')
+    try:
+        results = fanout({host: shlex.join(args) for host in clients},
+                         timeout or duration + 30)
+    finally:
+        if proc:
+            stop_server(proc)
+    per_client, raw = {}, []
+    for host, output in results.items():
+        try:
+            result = json.loads(output.output.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            warn(f'*** {host.name}: no load result: {output.output}\n')
+            continue
+        # JSON turned the bucket numbers into strings
+        result['histogram'] = merge([result['histogram']])
+        raw.append(result)
+        per_client[host.name] = summarize(result)
+    overall = {'requests': sum(r['requests'] for r in raw),
+               'errors': sum(r['errors'] for r in raw),
+               'bytes': sum(r['bytes'] for r in raw),
+               'elapsed': max((r['elapsed'] for r in raw), default=0),
+               'histogram': merge(r['histogram'] for r in raw)}
+    return {'clients': per_client, 'overall': summarize(overall)}
+
+
+def report(results):
+    """Log per-client and overall load results"""
+    rows = list(results['clients'].items()) + [('overall',
+                                                results['overall'])]
+    info(f'{"client":>10} {"req/s":>10} {"Mbit/s":>9} {"errors":>7} '
+         f'{"p50":>8} {"p95":>8} {"p99":>8} {"p999":>8} (ms)\n')
+    for name, s in rows:
+        latency = ' '.join('     n/a' if v is None else f'{v:8.2f}'
+                           for v in s['latency_ms'].values())
+        info(f'{name:>10} {s["requests_per_second"]:10.1f} '
+             f'{s["bits_per_second"] / 1e6:9.2f} {s["errors"]:7d} '
+             f'{latency}\n')
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command')
+    server = commands.add_parser('serve', help='run the HTTP server')
+    server.add_argument('--port', type=int, default=80)
+    server.add_argument('--workers', type=int, default=4)
+    load = commands.add_parser('client', help='run one load generator')
+    load.add_argument('host')
+    load.add_argument('--paths', nargs='+', default=['/'])
+    for p in (parser, load):
+        p.add_argument('--port', type=int, default=80)
+        p.add_argument('--concurrency', type=int, default=8,
+                       help='connections per client')
+        p.add_argument('--duration', type=float, default=10)
+        p.add_argument('--rate', type=float,
+                       help='requests/s per client (default: closed loop)')
+        p.add_argument('--no-keepalive', dest='keepalive',
+                       action='store_false')
+    parser.add_argument('--hosts', type=int, default=4,
+                        help='star topology size; h1 serves the others')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1024])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--bw', type=float, help='host link Mbit/s')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.port, args.workers)
+        return 0
+    if args.command == 'client':
+        client(args.host, args.port, args.paths, args.concurrency,
+               args.duration, args.rate, args.keepalive)
+        return 0
+
+    setLogLevel('info')
+    host_link = {'bw': args.bw} if args.bw else None
+    net, _ = build_network(StarTopo(n=args.hosts, host_link=host_link))
+    try:
+        results = run_load(net, net.hosts[0], net.hosts[1:], args.port,
+                           args.concurrency, args.duration, args.rate,
+                           args.sizes, args.keepalive,
+                           workers=args.workers)
+        report(results)
+    finally:
+        net.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+High-frequency interface counter sampler
+
+Reads the byte counters of every interface of every node (hosts and
+switches) straight from /proc/<pid>/net/dev, one read per network
+namespace per sample, so sampling never forks a shell.  Samples go into
+a fixed-size ring buffer per interface from which rates are computed as
+NumPy arrays; metricsstore.stats() summarizes them.
+"""
+
+from mininet.log import info
+from array import array
+import math
+import numpy as np
+import os
+import threading
+import time
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile (q in 0..100) of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class CounterRing:
+    """Fixed-size ring of (timestamp, rx_bytes, tx_bytes) samples"""
+
+    def __init__(self, size):
+        self.size = size
+        self.times = array('d', bytes(8 * size))
+        self.rx = array('Q', bytes(8 * size))
+        self.tx = array('Q', bytes(8 * size))
+        self.count = 0
+
+    def append(self, timestamp, rx_bytes, tx_bytes):
+        """Store one sample, overwriting the oldest when full"""
+        slot = self.count % self.size
+        self.times[slot] = timestamp
+        self.rx[slot] = rx_bytes
+        self.tx[slot] = tx_bytes
+        self.count += 1
+
+    def arrays(self):
+        """Return (times, rx_bytes, tx_bytes) NumPy arrays, oldest first"""
+        n = min(self.count, self.size)
+        order = (np.arange(self.count - n, self.count) % self.size
+                 if n else np.empty(0, dtype=int))
+        return (np.frombuffer(self.times, dtype='f8')[order],
+                np.frombuffer(self.rx, dtype='u8')[order].astype('f8'),
+                np.frombuffer(self.tx, dtype='u8')[order].astype('f8'))
+
+    def rate_arrays(self):
+        """Return (times, rx_bps, tx_bps) arrays between samples"""
+        times, rx, tx = self.arrays()
+        dt = np.diff(times)
+        valid = dt > 0
+        dt = dt[valid]
+        return (times[1:][valid], np.diff(rx)[valid] * 8 / dt,
+                np.diff(tx)[valid] * 8 / dt)
+
+    def latest_rate(self):
+        """Return (timestamp, rx_bps, tx_bps) of the newest interval
+
+        Reads only the last two samples, so the cost does not depend on
+        how much has been buffered; None until two samples exist.
+        """
+        count = self.count
+        if count < 2:
+            return None
+        i, j = (count - 2) % self.size, (count - 1) % self.size
+        dt = self.times[j] - self.times[i]
+        if dt <= 0:
+            return None
+        return (self.times[j], (self.rx[j] - self.rx[i]) * 8 / dt,
+                (self.tx[j] - self.tx[i]) * 8 / dt)
+
+
+class InterfaceSampler:
+    """Sample all interface counters of a network at a fixed rate"""
+
+    def __init__(self, net, rate=50, window=1000, nodes=None):
+        self.period = 1.0 / rate
+        self.window = window
+        nodes = nodes if nodes is not None else net.hosts + net.switches
+        self.rings = {}
+        self.capacity = {}
+        self._sources = self._open_sources(nodes)
+        self._thread = None
+        self._running = threading.Event()
+
+    def _open_sources(self, nodes):
+        """Open one /proc/<pid>/net/dev per network namespace
+
+        Switches that are not in their own namespace all share the root
+        namespace, so their interfaces are read with a single file.
+        """
+        sources = {}
+        for node in nodes:
+            ns = os.stat(f'/proc/{node.pid}/ns/net').st_ino
+            if ns not in sources:
+                fd = os.open(f'/proc/{node.pid}/net/dev', os.O_RDONLY)
+                sources[ns] = (fd, {})
+            wanted = sources[ns][1]
+            for intf in node.intfList():
+                if intf.name == 'lo':
+                    continue
+                key = (node.name, intf.name)
+                wanted[intf.name] = key
+                self.rings[key] = CounterRing(self.window)
+                bw = intf.params.get('bw')
+                self.capacity[key] = bw * 1e6 if bw else None
+        return list(sources.values())
+
+    def sample_once(self):
+        """Read every namespace's counters once into the ring buffers"""
+        for fd, wanted in self._sources:
+            os.lseek(fd, 0, os.SEEK_SET)
+            data = b''
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                data += chunk
+            now = time.monotonic()
+            # Skip the two header lines of /proc/net/dev
+            for line in data.decode().split('\n')[2:]:
+                name, _, counters = line.partition(':')
+                key = wanted.get(name.strip())
+                if key is None:
+                    continue
+                fields = counters.split()
+                self.rings[key].append(now, int(fields[0]), int(fields[8]))
+
+    def _run(self):
+        """Sampling loop with drift-free scheduling"""
+        deadline = time.monotonic()
+        while self._running.is_set():
+            self.sample_once()
+            deadline += self.period
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind: resynchronize instead of bursting
+                deadline = time.monotonic()
+
+    def start(self):
+        """Start sampling in a background thread"""
+        info(f'*** Sampling {len(self.rings)} interfaces at '
+             f'{1 / self.period:.0f} Hz\n')
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling; buffered samples stay available"""
+        self._running.clear()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Stop sampling and release the /proc file descriptors"""
+        self.stop()
+        for fd, _ in self._sources:
+            os.close(fd)
+        self._sources = []
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Structured iperf/iperf3 output parser
+
+Turns client output (plain text, iperf2 '-y C' CSV and iperf3 '-J' or
+'--json-stream' JSON) into typed interval records plus a final summary.
+Output can be fed incrementally while the client is still running.
+"""
+
+from collections import namedtuple
+import json
+import re
+
+# One iperf report line. Rates are always bits/s, sizes always bytes.
+# retransmits, jitter_ms, lost and packets are None when not reported.
+IperfRecord = namedtuple('IperfRecord', [
+    'stream', 'start', 'end', 'bytes', 'bits_per_second',
+    'retransmits', 'jitter_ms', 'lost', 'packets', 'role', 'is_summary'])
+
+BYTE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3,
+              'T': 1024 ** 4}
+BIT_UNITS = {'': 1, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+
+TEXT_LINE = re.compile(
+    r'\[\s*(?P<stream>\d+|SUM)\]\s+'
+    r'(?P<start>\d+(?:\.\d+)?)\s*-\s*(?P<end>\d+(?:\.\d+)?)\s+sec\s+'
+    r'(?P<size>\d+(?:\.\d+)?)\s+(?P<size_unit>[KMGT]?)Bytes\s+'
+    r'(?P<rate>\d+(?:\.\d+)?)\s+(?P<rate_unit>[KMGT]?)bits/sec'
+    r'(?P<rest>.*)')
+JITTER_LOSS = re.compile(
+    r'(?P<jitter>\d+(?:\.\d+)?)\s+ms\s+(?P<lost>\d+)\s*/\s*(?P<packets>\d+)')
+RETR_CWND = re.compile(r'^\s*(?P<retr>\d+)\s+\d+(?:\.\d+)?\s+[KMGT]?Bytes')
+RETR_ROLE = re.compile(r'^\s*(?P<retr>\d+)\s+(?:sender|receiver)')
+DATAGRAMS = re.compile(r'^\s*(?P<packets>\d+)\s*$')
+CSV_LINE = re.compile(r'^\d{14}(?:\.\d+)?,')
+
+
+class IperfResult:
+    """Parsed iperf run: per-interval time series plus a final summary"""
+
+    def __init__(self, fmt, intervals, summaries):
+        self.format = fmt
+        self.intervals = intervals
+        self.summaries = summaries
+        self.summary = self._pick_summary(summaries)
+
+    @staticmethod
+    def _pick_summary(summaries):
+        """Prefer the aggregate, receiver-side (or server report) summary
+
+        Only iperf3's sender summary counts retransmits, so they are
+        taken over from the sender summary of the same stream.
+        """
+        if not summaries:
+            return None
+
+        def rank(record):
+            return (record.stream == 'SUM', record.role == 'receiver',
+                    record.jitter_ms is not None, record.end - record.start)
+        summary = max(summaries, key=rank)
+        if summary.retransmits is None:
+            retransmits = [r.retransmits for r in summaries
+                           if r.role == 'sender' and
+                           r.stream == summary.stream and
+                           r.retransmits is not None]
+            if retransmits:
+                summary = summary._replace(retransmits=retransmits[-1])
+        return summary
+
+    def series(self, stream=None):
+        """Return the interval records for one stream in time order
+
+        With stream=None the aggregate stream is used when iperf reported
+        one ('[SUM]' lines for parallel clients), otherwise the first one.
+        """
+        if stream is None:
+            streams = [r.stream for r in self.intervals]
+            stream = 'SUM' if 'SUM' in streams else (
+                streams[0] if streams else None)
+        return [r for r in self.intervals if r.stream == stream]
+
+    def to_dict(self):
+        """Return a JSON-serializable view for reports"""
+        return {
+            'format': self.format,
+            'summary': self.summary._asdict() if self.summary else None,
+            'intervals': [r._asdict() for r in self.series()],
+        }
+
+
+class IperfParser:
+    """Incremental parser for iperf client output
+
+    feed() accepts arbitrary chunks and returns the records completed by
+    that chunk; close() flushes the last partial line and returns the
+    IperfResult.  The output format is detected from the first line.
+    """
+
+    def __init__(self):
+        self.format = None
+        self._buffer = ''
+        self._json_lines = []
+        self._records = []
+        self._interval = None
+        self._server_report = False
+
+    def feed(self, data):
+        """Consume a chunk of output and return newly parsed records"""
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split('\n')
+        records = []
+        for line in lines:
+            records.extend(self._parse_line(line))
+        return records
+
+    def close(self):
+        """Finish parsing and return the IperfResult"""
+        self._parse_line(self._buffer)
+        self._buffer = ''
+        if self.format == 'json' and self._json_lines:
+            self._parse_json_document('\n'.join(self._json_lines))
+        intervals = [r for r in self._records if not r.is_summary]
+        summaries = [r for r in self._records if r.is_summary]
+        if not summaries and intervals:
+            # A run shorter than one report interval prints only one line
+            whole = max(intervals, key=lambda r: (r.end - r.start, r.end))
+            summaries = [whole._replace(is_summary=True)]
+        return IperfResult(self.format or 'text', intervals, summaries)
+
+    def _parse_line(self, line):
+        """Dispatch one complete line to the parser for its format"""
+        line = line.strip()
+        if not line:
+            return []
+        if self.format is None:
+            if line.startswith('{'):
+                self.format = 'json'
+            elif CSV_LINE.match(line):
+                self.format = 'csv'
+            else:
+                self.format = 'text'
+        if self.format == 'json':
+            return self._parse_json_line(line)
+        if self.format == 'csv':
+            record = self._parse_csv_line(line)
+        else:
+            record = self._parse_text_line(line)
+        if record is None:
+            return []
+        self._records.append(record)
+        return [record]
+
+    def _is_summary(self, start, end):
+        """Tell the end-of-test line apart from per-interval reports"""
+        length = end - start
+        if self._interval is None:
+            self._interval = length
+            return False
+        return start == 0 and length > self._interval * 1.5
+
+    def _parse_text_line(self, line):
+        """Parse one human-readable iperf or iperf3 report line"""
+        if 'Server Report' in line:
+            self._server_report = True
+            return None
+        match = TEXT_LINE.search(line)
+        if not match:
+            return None
+        start, end = float(match['start']), float(match['end'])
+        rest = match['rest']
+        retransmits = jitter = lost = packets = None
+        role = next((r for r in ('sender', 'receiver') if r in rest), None)
+        jitter_loss = JITTER_LOSS.search(rest)
+        retr = RETR_CWND.match(rest) or RETR_ROLE.match(rest)
+        datagrams = DATAGRAMS.match(rest)
+        if jitter_loss:
+            jitter = float(jitter_loss['jitter'])
+            lost = int(jitter_loss['lost'])
+            packets = int(jitter_loss['packets'])
+        elif retr:
+            retransmits = int(retr['retr'])
+        elif datagrams:
+            packets = int(datagrams['packets'])
+        is_summary = (role is not None or self._server_report or
+                      self._is_summary(start, end))
+        stream = match['stream']
+        size = float(match['size']) * BYTE_UNITS[match['size_unit']]
+        rate = float(match['rate']) * BIT_UNITS[match['rate_unit']]
+        return IperfRecord(
+            stream=stream if stream == 'SUM' else int(stream),
+            start=start, end=end, bytes=int(size), bits_per_second=rate,
+            retransmits=retransmits, jitter_ms=jitter, lost=lost,
+            packets=packets, role=role, is_summary=is_summary)
+
+    def _parse_csv_line(self, line):
+        """Parse one iperf2 '-y C' line (UDP server reports have 14 fields)"""
+        fields = line.split(',')
+        if len(fields) < 9:
+            return None
+        start, end = (float(x) for x in fields[6].split('-'))
+        jitter = lost = packets = None
+        server_report = len(fields) >= 14
+        if server_report:
+            jitter = float(fields[9])
+            lost, packets = int(fields[10]), int(fields[11])
+        stream = int(fields[5])
+        return IperfRecord(
+            stream='SUM' if stream < 0 else stream, start=start, end=end,
+            bytes=int(fields[7]), bits_per_second=float(fields[8]),
+            retransmits=None, jitter_ms=jitter, lost=lost, packets=packets,
+            role='receiver' if server_report else None,
+            is_summary=server_report or self._is_summary(start, end))
+
+    def _parse_json_line(self, line):
+        """Handle '--json-stream' events; buffer a '-J' document otherwise"""
+        if not self._json_lines:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                event = None
+            if isinstance(event, dict) and 'event' in event:
+                records = self._json_event(event)
+                self._records.extend(records)
+                return records
+        self._json_lines.append(line)
+        return []
+
+    def _parse_json_document(self, document):
+        """Parse a complete iperf3 '-J' document"""
+        try:
+            data = json.loads(document)
+        except ValueError:
+            return []
+        records = []
+        for interval in data.get('intervals', []):
+            records.append(self._json_sum(interval['sum'], 'SUM', None,
+                                          False))
+        records.extend(self._json_end(data.get('end', {})))
+        self._records.extend(records)
+        return records
+
+    def _json_event(self, event):
+        """Convert one '--json-stream' event into records"""
+        if event['event'] == 'interval':
+            return [self._json_sum(event['data']['sum'], 'SUM', None, False)]
+        if event['event'] == 'end':
+            return self._json_end(event['data'])
+        return []
+
+    def _json_end(self, end):
+        """Convert the 'end' section of iperf3 JSON into summaries"""
+        records = []
+        for key, role in (('sum_sent', 'sender'),
+                          ('sum_received', 'receiver'), ('sum', None)):
+            if key in end:
+                records.append(self._json_sum(end[key], 'SUM', role, True))
+        return records
+
+    @staticmethod
+    def _json_sum(data, stream, role, is_summary):
+        """Build a record from an iperf3 JSON 'sum' object"""
+        return IperfRecord(
+            stream=stream, start=float(data['start']),
+            end=float(data['end']), bytes=int(data['bytes']),
+            bits_per_second=float(data['bits_per_second']),
+            retransmits=data.get('retransmits'),
+            jitter_ms=data.get('jitter_ms'),
+            lost=data.get('lost_packets'), packets=data.get('packets'),
+            role=role, is_summary=is_summary)
+
+
+def parse_iperf(output):
+    """Parse a complete iperf/iperf3 output string into an IperfResult"""
+    parser = IperfParser()
+    parser.feed(output)
+    return parser.close()
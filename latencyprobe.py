@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Concurrent all-pairs latency probing
+
+Unlike net.pingAll(), which pings one pair at a time and only reports a
+drop percentage, probe() starts a probe train from every host to every
+other host at once.  Each host runs a single `xargs -P` pipeline so at
+most per_host pings leave it concurrently, all hosts run in parallel
+through fanout(), and every echo reply is kept so that per-pair
+min/avg/p99/max RTT, loss and RTT histograms can be computed.
+"""
+
+from mininet.topo import Topo
+from mininet.link import TCLink
+from mininet.log import setLogLevel, info
+from fanout import fanout
+from ifsampler import percentile
+from topobuilder import build_network
+from array import array
+import math
+import re
+import shlex
+import numpy as np
+
+RTT_LINE = re.compile(r'bytes from (?P<ip>\S+?): .*time[=<](?P<rtt>[\d.]+) ms')
+
+
+class LatencyMatrix:
+    """Per-pair RTT samples and their statistics for a set of hosts"""
+
+    STATS = ('min', 'avg', 'p99', 'max', 'loss')
+
+    def __init__(self, names, count):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.count = count
+        self.samples = {}
+        n = len(self.names)
+        # Per-pair statistics in milliseconds; NaN where nothing came back
+        for stat in self.STATS:
+            setattr(self, stat, np.full((n, n), np.nan))
+
+    def add(self, src, dst, rtt):
+        """Record one echo reply from src to dst (names), rtt in ms"""
+        key = (self.index[src], self.index[dst])
+        self.samples.setdefault(key, array('d')).append(rtt)
+
+    def finalize(self, pairs):
+        """Compute the statistics matrices for the probed pairs"""
+        for key in pairs:
+            rtts = sorted(self.samples.get(key, ()))
+            self.loss[key] = 1.0 - min(len(rtts), self.count) / self.count
+            if rtts:
+                self.min[key] = rtts[0]
+                self.avg[key] = sum(rtts) / len(rtts)
+                self.p99[key] = percentile(rtts, 99)
+                self.max[key] = rtts[-1]
+        return self
+
+    def pair(self, src, dst):
+        """Return the statistics of one pair as a dict"""
+        key = (self.index[src], self.index[dst])
+        return {stat: _value(getattr(self, stat)[key])
+                for stat in self.STATS}
+
+    def histogram(self, bins=None, src=None, dst=None):
+        """Histogram of RTTs (ms), optionally for one source/destination
+
+        bins defaults to log-spaced edges covering the observed range,
+        which keeps sub-millisecond and 100 ms links readable together.
+        returns: (counts, edges)
+        """
+        i = None if src is None else self.index[src]
+        j = None if dst is None else self.index[dst]
+        values = np.concatenate([
+            np.frombuffer(rtts, dtype=float)
+            for (a, b), rtts in self.samples.items()
+            if (i is None or a == i) and (j is None or b == j)] or
+            [np.empty(0)])
+        if bins is None:
+            if not values.size:
+                return np.zeros(0, dtype=int), np.zeros(0)
+            low = max(values.min(), 0.001)
+            high = max(values.max(), low * 1.01)
+            bins = np.geomspace(low, high, 21)
+        return np.histogram(values, bins=bins)
+
+    def to_dict(self):
+        """Return a JSON-serializable view for reports"""
+        counts, edges = self.histogram()
+        return {
+            'hosts': self.names,
+            'count': self.count,
+            **{stat: [[_value(v) for v in row]
+                      for row in getattr(self, stat)]
+               for stat in self.STATS},
+            'histogram': {'counts': counts.tolist(),
+                          'edges_ms': edges.tolist()},
+        }
+
+
+def _value(v):
+    """NaN -> None for JSON output"""
+    return None if math.isnan(v) else float(v)
+
+
+def probe_command(targets, count, interval, per_host, timeout):
+    """Shell pipeline pinging targets with at most per_host in flight"""
+    ips = ' '.join(shlex.quote(ip) for ip in targets)
+    return (f"printf '%s\\n' {ips} | xargs -P {per_host} -I{{}} "
+            f'ping -n -c {count} -i {interval} -W {timeout} {{}} '
+            '2>/dev/null')
+
+
+def probe(net, hosts=None, count=5, interval=0.05, per_host=32,
+          timeout=1, max_hosts=None):
+    """Probe every ordered pair of hosts concurrently
+
+    count, interval: size and spacing (seconds) of each probe train
+    per_host: pings in flight per source host at any time
+    timeout: seconds to wait for the last reply of a train
+    max_hosts: number of source hosts probing at once (default: all)
+    returns: LatencyMatrix
+    """
+    hosts = hosts if hosts is not None else net.hosts
+    ip_to_host = {host.IP(): host.name for host in hosts if host.IP()}
+    matrix = LatencyMatrix([host.name for host in hosts], count)
+    sources = [host for host in hosts if host.IP()]
+    targets = {host: [ip for ip, name in ip_to_host.items()
+                      if name != host.name] for host in sources}
+    rounds = math.ceil((len(ip_to_host) - 1) / per_host)
+    deadline = rounds * (count * interval + timeout + 1) + 5
+    max_hosts = max_hosts or len(sources)
+    info(f'*** Probing {sum(len(t) for t in targets.values())} pairs, '
+         f'{count} probes each\n')
+
+    for start in range(0, len(sources), max_hosts):
+        wave = sources[start:start + max_hosts]
+        commands = {host: probe_command(targets[host], count, interval,
+                                        per_host, timeout)
+                    for host in wave}
+        for host, result in fanout(commands, deadline).items():
+            for line in result.output.splitlines():
+                if 'DUP!' in line:
+                    continue
+                match = RTT_LINE.search(line)
+                if match and match['ip'] in ip_to_host:
+                    matrix.add(host.name, ip_to_host[match['ip']],
+                               float(match['rtt']))
+
+    pairs = [(matrix.index[host.name], matrix.index[ip_to_host[ip]])
+             for host in sources for ip in targets[host]]
+    return matrix.finalize(pairs)
+
+
+def report(matrix, top=10):
+    """Log the slowest and lossiest pairs and the RTT histogram"""
+    n = len(matrix.names)
+    pairs = [(i, j) for i in range(n) for j in range(n)
+             if not math.isnan(matrix.loss[i, j])]
+    info(f'*** Latency over {len(pairs)} pairs\n')
+    worst = sorted(pairs, key=lambda p: (-matrix.loss[p],
+                                         -np.nan_to_num(matrix.p99[p])))
+    for i, j in worst[:top]:
+        stats = matrix.pair(matrix.names[i], matrix.names[j])
+        if stats['min'] is None:
+            info(f'    {matrix.names[i]} -> {matrix.names[j]}: '
+                 'no replies\n')
+            continue
+        info(f'    {matrix.names[i]} -> {matrix.names[j]}: '
+             f'min {stats["min"]:.2f} avg {stats["avg"]:.2f} '
+             f'p99 {stats["p99"]:.2f} max {stats["max"]:.2f} ms, '
+             f'loss {stats["loss"]:.0%}\n')
+    counts, edges = matrix.histogram()
+    if counts.size:
+        info('*** RTT histogram (ms)\n')
+        peak = counts.max()
+        for count, low, high in zip(counts, edges, edges[1:]):
+            bar = '#' * int(round(40 * count / peak)) if peak else ''
+            info(f'    {low:9.2f} - {high:9.2f} {count:7d} {bar}\n')
+
+
+class DelayLossTopo(Topo):
+    """delay_lost_test.py: normal, slow, lossy and small-queue links"""
+
+    def build(self):
+        switch = self.addSwitch('s1')
+        for name, params in (
+                ('h1', dict(bw=10, delay='5ms')),
+                ('h2', dict(bw=10, delay='100ms')),
+                ('h3', dict(bw=10, delay='5ms', loss=10)),
+                ('h4', dict(bw=10, delay='5ms', max_queue_size=10))):
+            self.addLink(self.addHost(name), switch, **params)
+
+
+if __name__ == '__main__':
+    setLogLevel('info')
+    net, _ = build_network(DelayLossTopo(), link=TCLink)
+    try:
+        report(probe(net, count=20))
+    finally:
+        net.stop()
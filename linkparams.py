@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Live link parameter changes and parameter sweeps
+
+TCLink shaping (bw, delay, jitter, loss, max_queue_size) is normally
+fixed when a link is created.  change_links() reshapes running links in
+place: when the qdisc layout stays the same it rewrites the existing
+htb class and netem qdisc with `tc class change` / `tc qdisc change`,
+batched into one shell command per node, and only falls back to a full
+TCIntf.config() when a qdisc has to be added or removed.  No packets
+are lost to a torn-down qdisc and nothing is rebuilt.
+
+sweep() walks a parameter grid over live links, measures throughput and
+RTT at each point and returns a results table:
+
+    sudo python3 linkparams.py --link h3 s1 --pair h1 h3 \\
+        --grid loss=0,1,2,5,10
+"""
+
+from mininet.link import TCIntf, TCLink
+from mininet.log import setLogLevel, info, error
+from fanout import fanout
+from iperfparser import parse_iperf
+from latencyprobe import probe, DelayLossTopo
+from topobuilder import build_network
+from itertools import product
+import argparse
+import csv
+import subprocess
+import sys
+import time
+
+SHAPING = ('bw', 'delay', 'jitter', 'loss', 'max_queue_size')
+
+# Options whose qdisc layout the in-place path does not reproduce
+UNSUPPORTED = ('use_hfsc', 'use_tbf', 'enable_ecn', 'enable_red', 'speedup')
+
+
+def shaping(intf):
+    """Return the current shaping parameters of an interface"""
+    return {key: intf.params.get(key) for key in SHAPING
+            if intf.params.get(key) is not None}
+
+
+def _validate(intf, params):
+    """Raise ValueError for unknown or out of range parameters"""
+    unknown = set(params) - set(SHAPING)
+    if unknown:
+        raise ValueError(f'{intf}: cannot change {", ".join(sorted(unknown))}')
+    bw, loss = params.get('bw'), params.get('loss')
+    if bw is not None and not 0 < bw <= TCIntf.bwParamMax:
+        raise ValueError(f'{intf}: bw {bw} outside 0..{TCIntf.bwParamMax}')
+    if loss is not None and not 0 <= loss <= 100:
+        raise ValueError(f'{intf}: loss {loss} outside 0..100')
+
+
+def _has_netem(params):
+    """Whether TCIntf.config() would add a netem qdisc for params"""
+    return (params.get('delay') is not None or
+            params.get('jitter') is not None or
+            bool(params.get('loss')) or
+            params.get('max_queue_size') is not None)
+
+
+def change_commands(intf, old, new):
+    """tc commands changing intf from old to new shaping in place
+
+    returns: list of commands, or None when the qdisc layout differs
+    and the interface has to be reconfigured from scratch
+    """
+    if any(intf.params.get(key) for key in UNSUPPORTED):
+        return None
+    if (old.get('bw') is None) != (new.get('bw') is None):
+        return None
+    if _has_netem(old) != _has_netem(new):
+        return None
+    cmds = []
+    if new.get('bw') is not None and new['bw'] != old.get('bw'):
+        cmds.append(f'tc class change dev {intf} parent 5:0 classid 5:1 '
+                    f'htb rate {new["bw"]:f}Mbit burst 15k')
+    if _has_netem(new) and any(new.get(key) != old.get(key)
+                               for key in SHAPING if key != 'bw'):
+        parent = 'parent 5:1' if new.get('bw') is not None else 'root'
+        # netem change replaces every option, so pass the full set
+        cmds.append(f'tc qdisc change dev {intf} {parent} handle 10: netem '
+                    + _netem_args(new))
+    return cmds
+
+
+def _netem_args(params):
+    """netem options for params, formatted as TCIntf.delayCmds() does"""
+    args = []
+    if params.get('delay') is not None:
+        args.append(f'delay {params["delay"]}')
+        if params.get('jitter') is not None:
+            args.append(str(params['jitter']))
+    if params.get('loss'):
+        args.append(f'loss {params["loss"]:.5f}')
+    if params.get('max_queue_size') is not None:
+        args.append(f'limit {int(params["max_queue_size"])}')
+    return ' '.join(args)
+
+
+def _intfs(net, link):
+    """TC interfaces of the links between a (node, node) name pair"""
+    a, b = link
+    links = net.linksBetween(net[a], net[b])
+    if not links:
+        raise ValueError(f'no link between {a} and {b}')
+    return [intf for found in links for intf in (found.intf1, found.intf2)
+            if isinstance(intf, TCIntf)]
+
+
+def _apply(targets, timeout=None):
+    """Bring each interface of {intf: shaping} to that shaping"""
+    commands, rebuild = {}, []
+    for intf, new in targets.items():
+        cmds = change_commands(intf, shaping(intf), new)
+        if cmds is None:
+            rebuild.append((intf, new))
+        elif cmds:
+            commands.setdefault(intf.node, []).extend(cmds)
+        for key in SHAPING:
+            intf.params.pop(key, None)
+        intf.params.update(new)
+    if commands:
+        for node, result in fanout(
+                {node: ' ; '.join(cmds) for node, cmds in commands.items()},
+                timeout).items():
+            if result.output.strip():
+                error(f'*** tc on {node.name}: {result.output}')
+    for intf, new in rebuild:
+        # The qdisc layout changes; rebuild it the way TCIntf does
+        intf.cmd(f'tc qdisc del dev {intf} root 2>/dev/null')
+        TCIntf.config(intf, **new)
+    return len(rebuild)
+
+
+def change_links(net, changes, timeout=None):
+    """Change shaping of live links in place
+
+    changes: list of ((node, node), {param: value}) applied to both ends
+        of every link between the two nodes; a value of None removes
+        that parameter
+    returns: {intf: previous shaping} for restore_links()
+    """
+    previous, targets = {}, {}
+    for link, params in changes:
+        for intf in _intfs(net, link):
+            _validate(intf, params)
+            current = targets.get(intf, shaping(intf))
+            previous.setdefault(intf, shaping(intf))
+            targets[intf] = {key: value for key, value
+                             in dict(current, **params).items()
+                             if value is not None}
+    rebuilt = _apply(targets, timeout)
+    info(f'*** Changed {len(targets) - rebuilt} interfaces in place'
+         f'{f", rebuilt {rebuilt}" if rebuilt else ""}\n')
+    return previous
+
+
+def restore_links(previous, timeout=None):
+    """Undo change_links() given the shaping it returned"""
+    _apply(previous, timeout)
+
+
+def measure_pair(net, src, dst, duration=5, pings=10, port=5201):
+    """Measure TCP throughput and RTT from src to dst (node names)
+
+    returns: dict of throughput_mbps, retransmits, rtt_avg_ms,
+    rtt_p99_ms and ping_loss
+    """
+    src, dst = net[src], net[dst]
+    matrix = probe(net, hosts=[src, dst], count=pings, interval=0.02)
+    rtt = matrix.pair(src.name, dst.name)
+    server = dst.popen(['iperf', '-s', '-p', str(port)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(0.5)
+        output = src.popen(
+            ['iperf', '-c', dst.IP(), '-p', str(port), '-t', str(duration)],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True).communicate()[0]
+    finally:
+        server.terminate()
+        server.wait()
+    summary = parse_iperf(output).summary
+    bps = summary.bits_per_second if summary else None
+    return {'throughput_mbps': bps / 1e6 if bps is not None else None,
+            'retransmits': summary.retransmits if summary else None,
+            'rtt_avg_ms': rtt['avg'], 'rtt_p99_ms': rtt['p99'],
+            'ping_loss': rtt['loss']}
+
+
+def grid_points(grid):
+    """Every combination of a {param: [values]} grid, in order"""
+    names = list(grid)
+    return [dict(zip(names, values))
+            for values in product(*(grid[name] for name in names))]
+
+
+def sweep(net, links, grid, measure, settle=0.5, store=None):
+    """Measure at every point of a parameter grid over live links
+
+    links: (node, node) pairs whose links get each point's parameters
+    grid: {param: [values]}
+    measure: function(net) -> dict of measurements
+    returns: list of rows, each the point's parameters plus measurements;
+    the links get their original shaping back afterwards
+    """
+    rows, previous = [], {}
+    try:
+        for point in grid_points(grid):
+            info(f'*** Sweep point {point}\n')
+            changed = change_links(net, [(link, point) for link in links])
+            for intf, params in changed.items():
+                previous.setdefault(intf, params)
+            time.sleep(settle)
+            row = dict(point, **measure(net))
+            rows.append(row)
+            if store:
+                store.event('sweep_point', links=links, **row)
+    finally:
+        restore_links(previous)
+    return rows
+
+
+def format_table(rows):
+    """Render sweep rows as an aligned text table"""
+    if not rows:
+        return ''
+    columns = list(rows[0])
+
+    def cell(value):
+        if value is None:
+            return '-'
+        return f'{value:.3f}' if isinstance(value, float) else str(value)
+
+    cells = [[cell(row.get(col)) for col in columns] for row in rows]
+    widths = [max(len(col), *(len(r[i]) for r in cells))
+              for i, col in enumerate(columns)]
+    lines = ['  '.join(col.rjust(w) for col, w in zip(columns, widths))]
+    lines += ['  '.join(c.rjust(w) for c, w in zip(r, widths))
+              for r in cells]
+    return '\n'.join(lines) + '\n'
+
+
+def _parse_grid(items):
+    """Parse name=v1,v2,... arguments into a grid"""
+    grid = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        grid[name] = [value if name in ('delay', 'jitter') else
+                      float(value) if name in ('bw', 'loss') else
+                      int(value) for value in values.split(',')]
+    return grid
+
+
+def main():
+    """Command line entry point: sweep delay_lost_test.py's network"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--link', nargs=2, action='append',
+                        metavar=('NODE1', 'NODE2'),
+                        help='link to reshape (repeatable)')
+    parser.add_argument('--pair', nargs=2, default=['h1', 'h3'],
+                        metavar=('SRC', 'DST'))
+    parser.add_argument('--grid', nargs='+', default=['loss=0,1,2,5,10'],
+                        help='param=v1,v2,... (delay/jitter take units)')
+    parser.add_argument('--duration', type=int, default=5)
+    parser.add_argument('-o', '--output', help='write the table as CSV')
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    net, _ = build_network(DelayLossTopo(), link=TCLink)
+    try:
+        rows = sweep(net, [tuple(link) for link in args.link or
+                           [('h3', 's1')]], _parse_grid(args.grid),
+                     lambda net: measure_pair(net, *args.pair,
+                                              duration=args.duration))
+    finally:
+        net.stop()
+    info(format_table(rows))
+    if args.output and rows:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
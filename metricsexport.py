@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Live metrics export for running experiments
+
+MetricsExporter serves the current state of an experiment over HTTP
+from a background thread:
+
+    /metrics        Prometheus text exposition format
+    /metrics.json   the same values as JSON
+
+Values are either set by the experiment (counters of test progress,
+gauges of RTTs) or read on demand from attached InterfaceSampler and
+QdiscCollector objects, which only looks at their newest samples.  A
+scrape therefore costs the same however long the experiment has been
+running, and the sampling threads are never paused or locked by it.
+Counters are exported with Prometheus' `_total` suffix.
+"""
+
+from mininet.log import info
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+PREFIX = 'mininet_'
+
+# Cumulative qdisc counters; backlog_packets is a gauge
+TC_COUNTERS = ('tc_sent_bytes', 'tc_sent_packets', 'tc_dropped',
+               'tc_overlimits')
+
+
+class MetricsExporter:
+    """Background HTTP endpoint exposing gauges and live counters"""
+
+    def __init__(self, host='127.0.0.1', port=9105):
+        self.host = host
+        self.port = port
+        self._gauges = {}
+        self._help = {}
+        self._counters = set(TC_COUNTERS)
+        self._lock = threading.Lock()
+        self._samplers = []
+        self._collectors = []
+        self._server = None
+        self._thread = None
+
+    def set(self, name, value, help=None, **labels):
+        """Set a gauge; labels distinguish its series"""
+        with self._lock:
+            if help:
+                self._help[name] = help
+            self._gauges.setdefault(name, {})[
+                tuple(sorted(labels.items()))] = value
+
+    def inc(self, name, amount=1, help=None, **labels):
+        """Add amount to a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if help:
+                self._help[name] = help
+            self._counters.add(name)
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def replace(self, name, series, help=None):
+        """Atomically replace all series of a gauge with
+        [(labels dict, value)], so scrapes never see it half-updated"""
+        values = {tuple(sorted(labels.items())): value
+                  for labels, value in series}
+        with self._lock:
+            if help:
+                self._help[name] = help
+            self._gauges[name] = values
+
+    def clear(self, name):
+        """Remove every series of a gauge"""
+        with self._lock:
+            self._gauges.pop(name, None)
+
+    def attach_sampler(self, sampler):
+        """Expose an InterfaceSampler's newest rates, replacing any
+        sampler attached before"""
+        self._samplers = [sampler]
+
+    def attach_collector(self, collector):
+        """Expose a QdiscCollector's newest counters, replacing any
+        collector attached before"""
+        self._collectors = [collector]
+
+    def detach(self, source):
+        """Stop exposing a sampler or collector, e.g. once it stopped,
+        so its last values are not reported as live"""
+        self._samplers = [s for s in self._samplers if s is not source]
+        self._collectors = [c for c in self._collectors if c is not source]
+
+    def snapshot(self):
+        """Return {name: [(labels dict, value)]} of all current values"""
+        with self._lock:
+            values = {name: [(dict(key), value)
+                             for key, value in series.items()]
+                      for name, series in self._gauges.items()}
+        for sampler in self._samplers:
+            rx, tx, rx_util, tx_util = [], [], [], []
+            for (node, intf), ring in list(sampler.rings.items()):
+                latest = ring.latest_rate()
+                if latest is None:
+                    continue
+                labels = {'node': node, 'intf': intf}
+                rx.append((labels, latest[1]))
+                tx.append((labels, latest[2]))
+                capacity = sampler.capacity.get((node, intf))
+                if capacity:
+                    rx_util.append((labels, latest[1] / capacity))
+                    tx_util.append((labels, latest[2] / capacity))
+            values['interface_rx_bps'] = rx
+            values['interface_tx_bps'] = tx
+            values['interface_rx_utilization'] = rx_util
+            values['interface_tx_utilization'] = tx_util
+        for collector in self._collectors:
+            for field in ('sent_bytes', 'sent_packets', 'dropped',
+                          'overlimits', 'backlog_packets'):
+                values[f'tc_{field}'] = []
+            for (dev, what, kind, handle), samples in list(
+                    collector.series.items()):
+                if not samples:
+                    continue
+                last = samples[-1]
+                labels = {'intf': dev, 'type': what, 'kind': kind,
+                          'handle': handle}
+                for field in ('sent_bytes', 'sent_packets', 'dropped',
+                              'overlimits', 'backlog_packets'):
+                    values[f'tc_{field}'].append(
+                        (labels, getattr(last, field)))
+        return values
+
+    def render_prometheus(self):
+        """Render the snapshot in Prometheus text exposition format"""
+        lines = []
+        for name, series in sorted(self.snapshot().items()):
+            kind = 'counter' if name in self._counters else 'gauge'
+            metric = PREFIX + name + ('_total' if kind == 'counter' else '')
+            if name in self._help:
+                lines.append(f'# HELP {metric} {self._help[name]}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for labels, value in series:
+                if value is None:
+                    continue
+                text = ','.join(f'{key}="{_escape(val)}"'
+                                for key, val in sorted(labels.items()))
+                lines.append(f'{metric}{{{text}}} {float(value)!r}'
+                             if text else f'{metric} {float(value)!r}')
+        return '\n'.join(lines) + '\n'
+
+    def render_json(self):
+        """Render the snapshot as JSON"""
+        return json.dumps({
+            'time': time.time(),
+            'metrics': {name: [{'labels': labels, 'value': value}
+                               for labels, value in series]
+                        for name, series in self.snapshot().items()}})
+
+    def start(self):
+        """Start serving in a daemon thread; returns the bound port"""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = exporter.render_prometheus()
+                    ctype = 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body = exporter.render_json()
+                    ctype = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        info(f'*** Serving live metrics on '
+             f'http://{self.host}:{self.port}/metrics\n')
+        return self.port
+
+    def stop(self):
+        """Stop serving"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = self._thread = None
+
+
+def _escape(value):
+    """Escape a Prometheus label value"""
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Compact array-backed metrics store
+
+Time series are kept as NumPy structured arrays of (time, value) per
+(metric, node, interface) series, and traffic test results as rows of
+one structured table with interned node and type names, instead of
+lists of dicts.  Aggregates -- per series, per host, per pair and per
+time window -- are computed with vectorized NumPy operations, so
+reporting over millions of samples stays fast.
+"""
+
+import numpy as np
+
+SAMPLE_DTYPE = np.dtype([('time', 'f8'), ('value', 'f8')])
+
+TEST_DTYPE = np.dtype([
+    ('time', 'f8'), ('src', 'i4'), ('dst', 'i4'), ('type', 'i4'),
+    ('wave', 'i4'), ('bps', 'f8'), ('retransmits', 'f8'),
+    ('jitter_ms', 'f8'), ('lost', 'f8'), ('packets', 'f8')])
+
+PERCENTILES = (50, 95, 99)
+
+
+class Series:
+    """Growable (time, value) array; keeps the newest limit samples"""
+
+    __slots__ = ('data', 'size', 'limit')
+
+    def __init__(self, limit=None, capacity=1024):
+        self.data = np.empty(capacity, dtype=SAMPLE_DTYPE)
+        self.size = 0
+        self.limit = limit
+
+    def append(self, times, values):
+        """Append arrays of timestamps and values"""
+        times = np.asarray(times, dtype='f8')
+        n = len(times)
+        if self.limit and n > self.limit:
+            times, values, n = times[-self.limit:], \
+                np.asarray(values)[-self.limit:], self.limit
+        needed = self.size + n
+        if self.limit and needed > self.limit:
+            # Drop the oldest samples to stay within the limit
+            keep = self.limit - n
+            self.data[:keep] = self.data[self.size - keep:self.size]
+            self.size = keep
+            needed = self.limit
+        if needed > len(self.data):
+            grown = np.empty(max(needed, 2 * len(self.data)),
+                             dtype=SAMPLE_DTYPE)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data['time'][self.size:needed] = times
+        self.data['value'][self.size:needed] = values
+        self.size = needed
+
+    def view(self, start=None, end=None):
+        """Samples with start <= time <= end (a view, not a copy)"""
+        data = self.data[:self.size]
+        first = 0 if start is None else np.searchsorted(
+            data['time'], start, 'left')
+        last = self.size if end is None else np.searchsorted(
+            data['time'], end, 'right')
+        return data[first:last]
+
+
+def stats(values, percentiles=PERCENTILES):
+    """Return count, mean, min, max and percentiles of an array
+
+    Percentiles use the nearest-rank definition, as ifsampler does.
+    """
+    values = np.asarray(values, dtype='f8')
+    if not values.size:
+        return None
+    result = {'count': int(values.size), 'mean': float(values.mean()),
+              'min': float(values.min()), 'peak': float(values.max())}
+    for q, v in zip(percentiles, np.percentile(values, percentiles,
+                                               method='inverted_cdf')):
+        result[f'p{q}'] = float(v)
+    return result
+
+
+class MetricsStore:
+    """In-memory time series and test results with vectorized queries"""
+
+    KEY_FIELDS = ('metric', 'node', 'intf')
+
+    def __init__(self, limit=None):
+        """limit: newest samples kept per series (None keeps all)"""
+        self.limit = limit
+        self.series = {}
+        self.names = []
+        self._name_index = {}
+        self._tests = np.empty(64, dtype=TEST_DTYPE)
+        self._test_count = 0
+
+    def intern(self, name):
+        """Return the integer id of a node or type name"""
+        index = self._name_index.get(name)
+        if index is None:
+            index = self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def append(self, metric, node, intf, times, values):
+        """Append samples to the (metric, node, intf) series"""
+        key = (metric, node, intf)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = Series(self.limit)
+        series.append(times, values)
+
+    def keys(self, metric=None, node=None, intf=None):
+        """Series keys matching the given fields"""
+        return [key for key in self.series
+                if (metric is None or key[0] == metric) and
+                (node is None or key[1] == node) and
+                (intf is None or key[2] == intf)]
+
+    def window(self, metric, node, intf, start=None, end=None):
+        """Samples of one series within a time window"""
+        series = self.series.get((metric, node, intf))
+        if series is None:
+            return np.empty(0, dtype=SAMPLE_DTYPE)
+        return series.view(start, end)
+
+    def aggregate(self, metric, by=('node', 'intf'), start=None, end=None,
+                  percentiles=PERCENTILES, **match):
+        """Aggregate a metric's samples grouped by key fields
+
+        by: key fields to group on, e.g. ('node',) for per-host figures
+            or () for one network-wide aggregate
+        match: optional node=/intf= filters
+        returns: dict of group tuple -> stats() result
+        """
+        positions = [self.KEY_FIELDS.index(field) for field in by]
+        groups = {}
+        for key in self.keys(metric, **match):
+            values = self.series[key].view(start, end)['value']
+            if values.size:
+                group = tuple(key[i] for i in positions)
+                groups.setdefault(group, []).append(values)
+        return {group: stats(np.concatenate(parts), percentiles)
+                for group, parts in sorted(groups.items())}
+
+    def add_test(self, timestamp, src, dst, traffic_type, summary,
+                 wave=None):
+        """Record one traffic test; summary is an IperfRecord dict"""
+        if self._test_count == len(self._tests):
+            self._tests = np.resize(self._tests, 2 * len(self._tests))
+        summary = summary or {}
+
+        def number(field):
+            value = summary.get(field)
+            return np.nan if value is None else value
+
+        self._tests[self._test_count] = (
+            timestamp, self.intern(src), self.intern(dst),
+            self.intern(traffic_type), -1 if wave is None else wave,
+            number('bits_per_second'), number('retransmits'),
+            number('jitter_ms'), number('lost'), number('packets'))
+        self._test_count += 1
+
+    @property
+    def tests(self):
+        """Structured array of all recorded tests"""
+        return self._tests[:self._test_count]
+
+    def pair_aggregate(self, field='bps', traffic_type=None):
+        """Aggregate a test field per (src, dst) pair, vectorized
+
+        returns: dict of (src, dst) -> {'count', 'mean', 'min', 'max'}
+        """
+        tests = self.tests
+        if traffic_type is not None:
+            tests = tests[tests['type'] == self._name_index.get(
+                traffic_type, -1)]
+        values = tests[field]
+        valid = ~np.isnan(values)
+        tests, values = tests[valid], values[valid]
+        if not values.size:
+            return {}
+        pairs, inverse = np.unique(
+            np.stack([tests['src'], tests['dst']], axis=1), axis=0,
+            return_inverse=True)
+        inverse = inverse.ravel()
+        counts = np.bincount(inverse)
+        sums = np.bincount(inverse, weights=values)
+        mins = np.full(len(pairs), np.inf)
+        maxs = np.full(len(pairs), -np.inf)
+        np.minimum.at(mins, inverse, values)
+        np.maximum.at(maxs, inverse, values)
+        return {(self.names[src], self.names[dst]): {
+                    'count': int(count), 'mean': float(total / count),
+                    'min': float(low), 'max': float(high)}
+                for (src, dst), count, total, low, high
+                in zip(pairs, counts, sums, mins, maxs)}
+
+    def nbytes(self):
+        """Memory held by sample and test arrays"""
+        return (sum(s.data.nbytes for s in self.series.values()) +
+                self._tests.nbytes)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Warm pool of pre-built networks
+
+Building a network dominates the run time of short tests.  NetworkPool
+keeps started networks of the requested shapes warm; a test leases one,
+and on release the network is reset to a clean state instead of being
+stopped:
+
+  - every process left in a host's network namespace is killed (stray
+    `iperf -s`, `python3 -m http.server`, tcpdump, ...)
+  - neighbor (ARP) caches are flushed, except permanent entries
+  - every TCLink qdisc is rebuilt with its original shaping, which also
+    zeroes the qdisc counters (interface byte counters cannot be reset
+    on Linux; rate measurements use deltas and are unaffected)
+  - switch flow tables are cleared when a controller relearns them
+
+Several networks of one shape run side by side, so every pooled network
+gets a name prefix (p0h1, p0s1, ...), its own dpids and its own
+controller port.  Leases map the topology's names to the prefixed ones:
+
+    pool = NetworkPool()
+    pool.warm(StarTopo, n=2, count=2)
+    with pool.lease(StarTopo, n=2) as lease:
+        lease.net.ping([lease['h1'], lease['h2']])
+"""
+
+from mininet.topo import Topo
+from mininet.node import Controller
+from mininet.link import TCIntf
+from mininet.log import setLogLevel, info, warn, error
+from fanout import fanout
+from linkparams import SHAPING, shaping
+from projectloader import IFNAMSIZ
+from topobuilder import BatchTCIntf, StarTopo, build_network
+from collections import OrderedDict
+import json
+import os
+import re
+import threading
+import time
+
+BASE_CONTROLLER_PORT = 6653
+
+# Job notices ("[1]+  Killed  iperf -s") that host shells print once
+# their background jobs have been killed
+JOB_NOTICE = re.compile(r'\[\d+\][+-]?\s+(Killed|Done|Terminated|Exit)')
+
+
+class PrefixedTopo(Topo):
+    """Copy of a topology with prefixed node names and distinct dpids"""
+
+    def build(self, topo, prefix, index):
+        dpids = 0
+        for name in topo.nodes():
+            params = dict(topo.nodeInfo(name))
+            if params.pop('isSwitch', False):
+                dpids += 1
+                dpid = int(params.get('dpid') or '0', 16) or dpids
+                # The pool index in the top 16 bits keeps dpids unique
+                params['dpid'] = '%016x' % ((index + 1) << 48 |
+                                            dpid & (1 << 48) - 1)
+                self.addSwitch(prefix + name, **params)
+            else:
+                self.addHost(prefix + name, **params)
+        for node1, node2, opts in topo.links(sort=True, withInfo=True):
+            opts = dict(opts)
+            port1, port2 = opts.pop('port1'), opts.pop('port2')
+            del opts['node1'], opts['node2']
+            for key in ('intfName1', 'intfName2'):
+                if key in opts:
+                    opts[key] = prefix + opts[key]
+            self.addLink(prefix + node1, prefix + node2, port1, port2,
+                         **opts)
+
+
+def namespace_processes(pids):
+    """Map each host shell pid to the other pids in its network namespace
+
+    One pass over /proc: a pid belongs to a host when its net namespace
+    inode equals that of the host's shell.
+    """
+    def netns(pid):
+        try:
+            return os.stat(f'/proc/{pid}/ns/net').st_ino
+        except OSError:
+            return None
+
+    owners = {netns(pid): pid for pid in pids}
+    owners.pop(None, None)
+    found = {pid: [] for pid in pids}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        owner = owners.get(netns(pid))
+        if owner is not None and pid != owner:
+            found[owner].append(pid)
+    return found
+
+
+class Lease:
+    """A network handed out by a NetworkPool"""
+
+    def __init__(self, pool, entry):
+        self.pool = pool
+        self.entry = entry
+        self.net = entry['net']
+        self.prefix = entry['prefix']
+
+    def name(self, name):
+        """The prefixed name of a topology node"""
+        return self.prefix + name
+
+    def __getitem__(self, name):
+        return self.net[self.prefix + name]
+
+    def release(self):
+        """Reset the network and return it to the pool"""
+        if self.entry is not None:
+            self.pool.release(self.entry)
+            self.entry = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class NetworkPool:
+    """Keep started networks of several shapes ready for reuse"""
+
+    def __init__(self, max_idle=4, base_port=BASE_CONTROLLER_PORT,
+                 **build_opts):
+        """max_idle: idle networks kept per shape; extra ones are stopped
+           build_opts: passed to topobuilder.build_network()"""
+        self.max_idle = max_idle
+        self.base_port = base_port
+        self.build_opts = build_opts
+        self.idle = OrderedDict()
+        self.leased = set()
+        self._next = 0
+        self._lock = threading.Lock()
+        self.stats = {'builds': 0, 'reuses': 0, 'resets': 0,
+                      'build_time': 0.0, 'reset_time': 0.0}
+
+    @staticmethod
+    def shape(cls, *args, **kwargs):
+        """Key identifying networks built from cls(*args, **kwargs)"""
+        return json.dumps({'class': f'{cls.__module__}:{cls.__qualname__}',
+                           'args': args, 'kwargs': kwargs},
+                          sort_keys=True, default=repr)
+
+    def _build(self, key, cls, args, kwargs):
+        """Build and start one prefixed network of a shape"""
+        with self._lock:
+            index = self._next
+            self._next += 1
+        prefix = f'p{index}'
+        topo = PrefixedTopo(cls(*args, **kwargs), prefix, index)
+        for name in topo.switches():
+            last = max(topo.ports.get(name, {0: None}))
+            if len(f'{name}-eth{last}') > IFNAMSIZ:
+                warn(f'*** {name}: interface names exceed {IFNAMSIZ} '
+                     'characters\n')
+                break
+        opts = dict(self.build_opts)
+        if opts.get('controller', Controller) and 'controllers' not in opts:
+            opts['controllers'] = [{'name': f'{prefix}c0',
+                                    'port': self.base_port + index}]
+        net, timings = build_network(topo, **opts)
+        intfs = [intf for link in net.links
+                 for intf in (link.intf1, link.intf2)
+                 if isinstance(intf, TCIntf)]
+        self.stats['builds'] += 1
+        self.stats['build_time'] += timings['total']
+        info(f'*** Pool built {prefix} in {timings["total"]:.2f}s\n')
+        return {'key': key, 'net': net, 'prefix': prefix,
+                'shaping': {intf: shaping(intf) for intf in intfs}}
+
+    def warm(self, cls, *args, count=1, **kwargs):
+        """Build networks of a shape until count of them are idle"""
+        key = self.shape(cls, *args, **kwargs)
+        while len(self.idle.get(key, ())) < count:
+            entry = self._build(key, cls, args, kwargs)
+            with self._lock:
+                self.idle.setdefault(key, []).append(entry)
+
+    def lease(self, cls, *args, **kwargs):
+        """Return a Lease on a clean network of the requested shape"""
+        key = self.shape(cls, *args, **kwargs)
+        with self._lock:
+            idle = self.idle.get(key)
+            entry = idle.pop() if idle else None
+        if entry is None:
+            entry = self._build(key, cls, args, kwargs)
+        else:
+            self.stats['reuses'] += 1
+        with self._lock:
+            self.leased.add(id(entry))
+        return Lease(self, entry)
+
+    def release(self, entry):
+        """Reset a leased network and make it idle again"""
+        with self._lock:
+            self.leased.discard(id(entry))
+        start = time.monotonic()
+        try:
+            self.reset(entry)
+        except Exception as e:
+            error(f'*** Reset of {entry["prefix"]} failed ({e}); '
+                  'discarding it\n')
+            entry['net'].stop()
+            return
+        self.stats['resets'] += 1
+        self.stats['reset_time'] += time.monotonic() - start
+        with self._lock:
+            idle = self.idle.setdefault(entry['key'], [])
+            if len(idle) < self.max_idle:
+                idle.append(entry)
+                return
+        entry['net'].stop()
+
+    def reset(self, entry, timeout=30):
+        """Bring a used network back to its just-built state"""
+        net = entry['net']
+        for node in net.hosts + net.switches:
+            if node.waiting:
+                # A command was left running in the foreground
+                node.sendInt()
+                node.waitOutput()
+        # Kill everything started in the hosts, however it was started
+        for pids in namespace_processes(
+                [host.pid for host in net.hosts]).values():
+            for pid in pids:
+                try:
+                    os.kill(pid, 9)
+                except ProcessLookupError:
+                    pass
+        # Restore original shaping; rebuilding the qdiscs zeroes them
+        commands = {}
+        for intf, params in entry['shaping'].items():
+            for key in SHAPING:
+                intf.params.pop(key, None)
+            intf.params.update(params)
+            if isinstance(intf, BatchTCIntf):
+                commands.setdefault(intf.node, []).extend(
+                    intf.tcCommands())
+            else:
+                intf.cmd(f'tc qdisc del dev {intf} root 2>/dev/null')
+                TCIntf.config(intf, **params)
+        for host in net.hosts:
+            commands.setdefault(host, []).append(
+                'ip neigh flush all 2>/dev/null')
+        if net.controllers:
+            for sw in net.switches:
+                if hasattr(sw, 'dpctl'):
+                    commands.setdefault(sw, []).append(
+                        f'ovs-ofctl del-flows {sw.name} 2>/dev/null')
+        for node, result in fanout(
+                {node: ' ; '.join(cmds) for node, cmds in commands.items()},
+                timeout).items():
+            if result.timed_out:
+                raise RuntimeError(f'{node.name} did not respond')
+            output = '\n'.join(line for line in result.output.splitlines()
+                               if not JOB_NOTICE.match(line))
+            if output.strip():
+                warn(f'*** reset on {node.name}: {output}\n')
+
+    def close(self):
+        """Stop every idle network"""
+        with self._lock:
+            entries = [e for idle in self.idle.values() for e in idle]
+            self.idle.clear()
+        for entry in entries:
+            entry['net'].stop()
+        if self.leased:
+            warn(f'*** {len(self.leased)} leased networks were not '
+                 'released\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    setLogLevel('info')
+    with NetworkPool() as pool:
+        pool.warm(StarTopo, n=2, count=2)
+        for i in range(10):
+            with pool.lease(StarTopo, n=2) as lease:
+                lease['h1'].cmd('iperf -s &')
+                lease.net.ping([lease['h1'], lease['h2']])
+        stats = pool.stats
+        info(f'*** {stats["builds"]} builds ({stats["build_time"]:.2f}s), '
+             f'{stats["reuses"]} reuses, {stats["resets"]} resets '
+             f'({stats["reset_time"]:.2f}s)\n')
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Loader for exported Mininet project files
+
+Project files (such as "Mininet network - Medium with 1 controller.json")
+describe a network as a flat list of items -- host, switch, controller,
+port, link, association and dummy -- wired together by `from`/`to` id
+references.  load_project() resolves that graph with id indexes in a
+single pass over the items, validates it, and returns a Project whose
+Topo keeps the exported interface names and `ips` addresses.
+
+    sudo python3 projectloader.py project.json
+"""
+
+from mininet.node import (Controller, OVSController, RemoteController,
+                          OVSSwitch, OVSKernelSwitch, OVSBridge, UserSwitch)
+from mininet.nodelib import LinuxBridge
+from mininet.link import TCLink
+from mininet.topo import Topo
+from mininet.cli import CLI
+from mininet.log import setLogLevel, info, error
+from topobuilder import build_network, report_timings
+from collections import namedtuple
+import ipaddress
+import json
+import re
+import sys
+import tempfile
+import time
+
+SWITCH_TYPES = {cls.__name__: cls for cls in (
+    OVSSwitch, OVSKernelSwitch, OVSBridge, UserSwitch, LinuxBridge)}
+CONTROLLER_TYPES = {cls.__name__: cls for cls in (
+    Controller, OVSController, RemoteController)}
+
+# Project link attribute -> TCLink parameter
+LINK_PARAMS = {'bandwidth': 'bw', 'delay': 'delay', 'jitter': 'jitter',
+               'loss': 'loss', 'maxQueueSize': 'max_queue_size'}
+
+# Linux limits interface names to 15 characters
+IFNAMSIZ = 15
+
+# One port resolved to its owning node; number is its Mininet port
+Port = namedtuple('Port', ['id', 'node', 'name', 'number', 'ips'])
+
+
+class ProjectError(ValueError):
+    """Raised when a project file has dangling or invalid references"""
+
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__('invalid project:\n  ' + '\n  '.join(problems))
+
+
+def _first_ipv4(ips):
+    """Return the first IPv4 address of a port's `ips`, or None"""
+    return next((ip for ip in ips if ':' not in ip), None)
+
+
+def _natural_key(name):
+    """Sort key placing eth2 before eth10"""
+    return [int(part) if part.isdigit() else part
+            for part in re.split(r'(\d+)', name)]
+
+
+class Project:
+    """A resolved project: its Topo, controllers and start script"""
+
+    def __init__(self, name, topo, controllers, start_script):
+        self.name = name
+        self.topo = topo
+        self.controllers = controllers
+        self.start_script = start_script
+
+    def build(self, link=TCLink, **opts):
+        """Build and start the network; returns (net, timings)
+
+        Addresses beyond the first IPv4 of each interface (including all
+        IPv6 addresses) are added once the network is up.
+        """
+        net, timings = build_network(self.topo, link=link,
+                                     controllers=self.controllers, **opts)
+        for name in self.topo.hosts():
+            host = net[name]
+            for intf, addrs in self.topo.nodeInfo(name)['extra_ips']:
+                for addr in addrs:
+                    family = '-6' if ':' in addr else '-4'
+                    host.cmd(f'ip {family} addr add {addr} dev {intf}')
+        return net, timings
+
+    def run_start_script(self, net):
+        """Run the project's startScript through the Mininet CLI"""
+        lines = [line.strip() for line in self.start_script.splitlines()]
+        lines = [line for line in lines if line and not line.startswith('#')]
+        if not lines:
+            return
+        with tempfile.NamedTemporaryFile('w', suffix='.mn') as script:
+            script.write('\n'.join(lines) + '\n')
+            script.flush()
+            CLI(net, script=script.name)
+
+
+def parse_project(data):
+    """Resolve a decoded project document into a Project
+
+    Every item is visited a constant number of times: one pass builds
+    the id index, one pass resolves associations and links against it.
+    Raises ProjectError listing every problem found.
+    """
+    problems = []
+    index = {}
+    by_type = {}
+    for item in data.get('items', ()):
+        item_id = item.get('id')
+        if item_id in index:
+            problems.append(f'duplicate id {item_id}')
+        index[item_id] = item
+        by_type.setdefault(item.get('type'), []).append(item)
+
+    def describe(item):
+        return f'{item.get("type")} {item.get("hostname") or item["id"]}'
+
+    names = {}
+    for kind in ('host', 'switch', 'controller'):
+        for item in by_type.get(kind, ()):
+            name = item.get('hostname')
+            if not name:
+                problems.append(f'{kind} {item["id"]} has no hostname')
+            elif name in names:
+                problems.append(f'duplicate node name {name}')
+            names[name] = item
+
+    owner = {}
+    controllers_of = {}
+    for assoc in by_type.get('association', ()):
+        ends = [index.get(assoc.get(key)) for key in ('from', 'to')]
+        for key, end in zip(('from', 'to'), ends):
+            if end is None:
+                problems.append(f'association {assoc["id"]} has dangling '
+                                f'{key!r} reference {assoc.get(key)}')
+        if None in ends:
+            continue
+        types = {end['type']: end for end in ends}
+        if 'dummy' in types:
+            continue  # Annotation only
+        if 'port' in types and len(types) == 2:
+            port = types['port']
+            node = next(end for end in ends if end is not port)
+            if node['type'] not in ('host', 'switch'):
+                problems.append(f'{describe(port)} ({port["id"]}) is '
+                                f'attached to {describe(node)}')
+            elif port['id'] in owner:
+                problems.append(f'{describe(port)} ({port["id"]}) belongs to '
+                                f'both {owner[port["id"]]["hostname"]} and '
+                                f'{node["hostname"]}')
+            else:
+                owner[port['id']] = node
+        elif set(types) == {'controller', 'switch'}:
+            controllers_of.setdefault(types['switch']['hostname'], []).append(
+                types['controller']['hostname'])
+        else:
+            problems.append(f'association {assoc["id"]} between '
+                            f'{describe(ends[0])} and {describe(ends[1])} '
+                            'is not supported')
+
+    # Number each node's ports in name order, as Mininet would
+    ports = {}
+    owned = {}
+    for port_id, node in owner.items():
+        owned.setdefault(node['hostname'], []).append(index[port_id])
+    for name, items in owned.items():
+        base = 1 if names[name]['type'] == 'switch' else 0
+        items.sort(key=lambda item: _natural_key(item.get('hostname', '')))
+        for number, item in enumerate(items, base):
+            port_name = f'{name}-{item.get("hostname") or number}'
+            if len(port_name) > IFNAMSIZ:
+                problems.append(f'interface name {port_name} is longer than '
+                                f'{IFNAMSIZ} characters')
+            ips = item.get('ips') or []
+            for addr in ips:
+                try:
+                    ipaddress.ip_interface(addr)
+                except ValueError:
+                    problems.append(f'{port_name} has invalid address {addr}')
+            ports[item['id']] = Port(item['id'], name, port_name, number, ips)
+
+    links = []
+    linked = set()
+    for link in by_type.get('link', ()):
+        ends = []
+        for key in ('from', 'to'):
+            ref = link.get(key)
+            if ref not in index:
+                problems.append(f'link {link["id"]} has dangling {key!r} '
+                                f'reference {ref}')
+            elif index[ref].get('type') != 'port':
+                problems.append(f'link {link["id"]} {key!r} end is a '
+                                f'{index[ref].get("type")}, not a port')
+            elif ref not in ports:
+                problems.append(f'link {link["id"]} uses '
+                                f'{describe(index[ref])} ({ref}) which '
+                                'belongs to no host or switch')
+            elif ref in linked:
+                problems.append(f'{ports[ref].name} is used by more than '
+                                'one link')
+            else:
+                ends.append(ports[ref])
+        if len(ends) != 2:
+            continue
+        if ends[0].node == ends[1].node:
+            problems.append(f'link {link["id"]} connects {ends[0].node} '
+                            'to itself')
+            continue
+        linked.update(port.id for port in ends)
+        params = {LINK_PARAMS[key]: value for key, value in link.items()
+                  if key in LINK_PARAMS and value not in (None, '')}
+        links.append((ends, params))
+
+    for item in by_type.get('controller', ()):
+        kind = item.get('controllerType', 'Controller')
+        if kind not in CONTROLLER_TYPES:
+            problems.append(f'controller {item["hostname"]} has unsupported '
+                            f'type {kind}')
+    for item in by_type.get('switch', ()):
+        kind = item.get('switchType', 'OVSSwitch')
+        if kind not in SWITCH_TYPES:
+            problems.append(f'switch {item["hostname"]} has unsupported '
+                            f'type {kind}')
+
+    if problems:
+        raise ProjectError(problems)
+
+    topo = Topo()
+    for item in by_type.get('host', ()):
+        name = item['hostname']
+        linked_ports = sorted((p for p in (ports[i['id']]
+                                           for i in owned.get(name, ()))
+                               if p.id in linked),
+                              key=lambda p: p.number)
+        # The lowest-numbered port becomes the host's default interface
+        default = _first_ipv4(linked_ports[0].ips) if linked_ports else None
+        extra = [(p.name, [ip for ip in p.ips if ip != _first_ipv4(p.ips)])
+                 for p in linked_ports]
+        opts = {'ip': default, 'extra_ips': [e for e in extra if e[1]]}
+        if item.get('defaultRoute'):
+            opts['defaultRoute'] = f'via {item["defaultRoute"]}'
+        topo.addHost(name, **opts)
+    for item in by_type.get('switch', ()):
+        name = item['hostname']
+        opts = {'cls': SWITCH_TYPES[item.get('switchType', 'OVSSwitch')]}
+        if name in controllers_of:
+            opts['controllers'] = controllers_of[name]
+        topo.addSwitch(name, **opts)
+    for (port1, port2), params in links:
+        # The first IPv4 address of each end is set when the link is made
+        params1 = {'ip': _first_ipv4(port1.ips)} if _first_ipv4(
+            port1.ips) else {}
+        params2 = {'ip': _first_ipv4(port2.ips)} if _first_ipv4(
+            port2.ips) else {}
+        topo.addLink(port1.node, port2.node, port1.number, port2.number,
+                     intfName1=port1.name, intfName2=port2.name,
+                     params1=params1, params2=params2, **params)
+
+    controllers = []
+    for item in by_type.get('controller', ()):
+        params = {'name': item['hostname'],
+                  'controller': CONTROLLER_TYPES[
+                      item.get('controllerType', 'Controller')]}
+        if item.get('ip'):
+            params['ip'] = item['ip']
+        if item.get('port'):
+            params['port'] = int(item['port'])
+        controllers.append(params)
+
+    return Project(data.get('projectName', ''), topo, controllers,
+                   data.get('startScript', ''))
+
+
+def load_project(path):
+    """Load and resolve a project file"""
+    with open(path) as f:
+        return parse_project(json.load(f))
+
+
+if __name__ == '__main__':
+    setLogLevel('info')
+    path = (sys.argv[1] if len(sys.argv) > 1
+            else 'Mininet network - Medium with 1 controller.json')
+    start = time.monotonic()
+    try:
+        project = load_project(path)
+    except ProjectError as e:
+        error(f'*** {e}\n')
+        sys.exit(1)
+    info(f'*** Loaded {project.name!r} in '
+         f'{(time.monotonic() - start) * 1000:.1f} ms\n')
+    net, timings = project.build()
+    report_timings(timings)
+    project.run_start_script(net)
+    CLI(net)
+    net.stop()
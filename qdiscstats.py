@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Per-link queue and shaping statistics from TCLink qdiscs
+
+Periodically pulls `tc -s qdisc` / `tc -s class` counters (sent bytes,
+drops, overlimits, backlog, requeues) for every TCLink endpoint and keeps
+them as a time series, so a throughput dip can be attributed to queue
+overflow, configured netem loss or HTB/TBF shaping.
+"""
+
+from mininet.log import info
+from mininet.link import TCIntf
+from collections import deque, namedtuple
+import re
+import subprocess
+import threading
+import time
+
+# Cumulative counters of one qdisc or class at one point in time
+QdiscSample = namedtuple('QdiscSample', [
+    'time', 'sent_bytes', 'sent_packets', 'dropped', 'overlimits',
+    'requeues', 'backlog_bytes', 'backlog_packets'])
+
+QDISC_HEAD = re.compile(
+    r'^qdisc (?P<kind>\S+) (?P<handle>\S+) dev (?P<dev>\S+) ')
+CLASS_HEAD = re.compile(r'^class (?P<kind>\S+) (?P<handle>\S+) ')
+SENT = re.compile(
+    r'Sent (?P<bytes>\d+) bytes (?P<packets>\d+) pkt '
+    r'\(dropped (?P<dropped>\d+), overlimits (?P<overlimits>\d+) '
+    r'requeues (?P<requeues>\d+)\)')
+BACKLOG = re.compile(
+    r'backlog (?P<size>\d+)(?P<unit>[KMG]?)b (?P<packets>\d+)p')
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_tc_stats(output, timestamp):
+    """Parse `tc -s qdisc show` / `tc -s class show` output
+
+    Class listings do not name their device, so they must be preceded by
+    a 'dev <name>' marker line.  Returns {(dev, 'qdisc'|'class', kind,
+    handle): QdiscSample}.
+    """
+    samples = {}
+    key = dev = None
+    sent = None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith('dev '):
+            dev = line.split()[1]
+            continue
+        head = QDISC_HEAD.match(line)
+        if head:
+            key = (head['dev'], 'qdisc', head['kind'], head['handle'])
+            continue
+        head = CLASS_HEAD.match(line)
+        if head:
+            key = (dev, 'class', head['kind'], head['handle'])
+            continue
+        match = SENT.search(line)
+        if match and key:
+            sent = match
+            continue
+        match = BACKLOG.search(line)
+        if match and key and sent:
+            samples[key] = QdiscSample(
+                time=timestamp,
+                sent_bytes=int(sent['bytes']),
+                sent_packets=int(sent['packets']),
+                dropped=int(sent['dropped']),
+                overlimits=int(sent['overlimits']),
+                requeues=int(sent['requeues']),
+                backlog_bytes=int(match['size']) * SIZE_UNITS[match['unit']],
+                backlog_packets=int(match['packets']))
+            key = sent = None
+    return samples
+
+
+class QdiscCollector:
+    """Collect tc qdisc/class statistics for every TCLink endpoint"""
+
+    def __init__(self, net, interval=0.5, window=7200):
+        self.interval = interval
+        self.series = {}
+        self.window = window
+        self.params = {}
+        self._groups = self._group_by_namespace(net)
+        self._thread = None
+        self._running = threading.Event()
+
+    def _group_by_namespace(self, net):
+        """Map one representative node per namespace to its TC intfs
+
+        Root-namespace switches share a single `tc` invocation.
+        """
+        groups = {}
+        for link in net.links:
+            for intf in (link.intf1, link.intf2):
+                if not isinstance(intf, TCIntf):
+                    continue
+                node = intf.node
+                key = node.name if node.inNamespace else None
+                _, intfs = groups.setdefault(key, (node, []))
+                intfs.append(intf.name)
+                self.params[intf.name] = (node.name, dict(intf.params))
+        return list(groups.values())
+
+    @staticmethod
+    def _script(intfs):
+        """Shell script printing qdisc stats and per-device class stats"""
+        classes = ' '.join(intfs)
+        return ('tc -s qdisc show; '
+                f'for i in {classes}; do echo "dev $i"; '
+                'tc -s class show dev $i; done')
+
+    def sample_once(self):
+        """Collect one snapshot from every namespace in parallel"""
+        procs = [node.popen(['sh', '-c', self._script(intfs)],
+                            stderr=subprocess.DEVNULL)
+                 for node, intfs in self._groups]
+        for proc, (node, intfs) in zip(procs, self._groups):
+            output, _ = proc.communicate()
+            now = time.monotonic()
+            wanted = set(intfs)
+            for key, sample in parse_tc_stats(output.decode(), now).items():
+                if key[0] in wanted:
+                    self.series.setdefault(
+                        key, deque(maxlen=self.window)).append(sample)
+
+    def _run(self):
+        """Collection loop"""
+        deadline = time.monotonic()
+        while self._running.is_set():
+            self.sample_once()
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind: resynchronize instead of bursting
+                deadline = time.monotonic()
+
+    def start(self):
+        """Start collecting in a background thread"""
+        info(f'*** Collecting qdisc stats for {len(self.params)} '
+             f'TCLink interfaces every {self.interval}s\n')
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop collecting; the collected series stay available"""
+        self._running.clear()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def deltas(self, key):
+        """Return per-interval counter deltas for one qdisc/class series
+
+        Each entry holds the interval end time, the counter increments
+        during the interval and the backlog observed at its end.
+        """
+        samples = list(self.series.get(key, ()))
+        deltas = []
+        for prev, cur in zip(samples, samples[1:]):
+            deltas.append({
+                'time': cur.time,
+                'sent_bytes': cur.sent_bytes - prev.sent_bytes,
+                'sent_packets': cur.sent_packets - prev.sent_packets,
+                'dropped': cur.dropped - prev.dropped,
+                'overlimits': cur.overlimits - prev.overlimits,
+                'requeues': cur.requeues - prev.requeues,
+                'backlog_bytes': cur.backlog_bytes,
+                'backlog_packets': cur.backlog_packets,
+            })
+        return deltas
+
+    def attribution(self, intf):
+        """Split an interface's losses into configured loss and overflow
+
+        netem counts both its random loss and tail drops at its `limit`
+        (max_queue_size) as 'dropped'; the configured loss percentage
+        gives the expected share of the former, and the remainder is
+        queue overflow.  HTB/TBF overlimits measure time spent shaped.
+        """
+        node, params = self.params[intf]
+        totals = {'netem_dropped': 0, 'netem_packets': 0,
+                  'shaper_overlimits': 0, 'shaper_dropped': 0,
+                  'peak_backlog_packets': 0}
+        for key, samples in self.series.items():
+            if key[0] != intf or len(samples) < 2:
+                continue
+            first, last = samples[0], samples[-1]
+            dropped = last.dropped - first.dropped
+            peak = max(s.backlog_packets for s in samples)
+            totals['peak_backlog_packets'] = max(
+                totals['peak_backlog_packets'], peak)
+            if key[2] == 'netem':
+                totals['netem_dropped'] += dropped
+                totals['netem_packets'] += (
+                    last.sent_packets - first.sent_packets + dropped)
+            elif key[1] == 'qdisc' and key[2] in ('htb', 'tbf', 'hfsc'):
+                totals['shaper_overlimits'] += (last.overlimits -
+                                                first.overlimits)
+                totals['shaper_dropped'] += dropped
+        loss = (params.get('loss') or 0) / 100.0
+        expected = totals['netem_packets'] * loss
+        totals.update({
+            'node': node,
+            'configured_loss': params.get('loss'),
+            'max_queue_size': params.get('max_queue_size'),
+            'expected_loss_drops': expected,
+            'queue_overflow_drops': max(0, totals['netem_dropped'] - expected),
+        })
+        return totals
+
+    def summary(self):
+        """Return attribution() for every TCLink interface"""
+        return {intf: self.attribution(intf) for intf in sorted(self.params)}
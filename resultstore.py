@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Append-only, per-run result store
+
+Each run gets its own directory under the store's base directory:
+
+    <base>/<run id>/meta.json          run metadata, written once
+    <base>/<run id>/events.jsonl       one JSON object per line
+    <base>/<run id>/series/<metric>    packed little-endian (time, value)
+                                       float64 pairs in time order
+
+Events and samples go to disk as they are produced, so memory stays
+bounded and a crashed run keeps everything written before the crash (a
+torn last line or record is ignored on read).  RunReader loads a single
+metric, or just a time window of it by binary search over the
+fixed-size records, without touching the rest of the run.
+"""
+
+from mininet.log import info, warn
+from array import array
+from urllib.parse import quote, unquote
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+DEFAULT_BASE = '/tmp/mininet_runs'
+
+# One time series sample: wall-clock time (s) and value
+SAMPLE = struct.Struct('<dd')
+
+
+class RunStore:
+    """Writer for one run's events and time series"""
+
+    def __init__(self, base=DEFAULT_BASE, run_id=None, meta=None,
+                 fsync=False, buffer=256):
+        """fsync: force every event to stable storage (slower)
+           buffer: samples held per series before they are written"""
+        self.run_id = run_id or (time.strftime('%Y%m%d-%H%M%S') +
+                                 f'-{os.getpid()}')
+        self.path = os.path.join(base, self.run_id)
+        os.makedirs(os.path.join(self.path, 'series'), exist_ok=True)
+        self.fsync = fsync
+        self.buffer = buffer
+        self._lock = threading.Lock()
+        self._series = {}
+        meta_path = os.path.join(self.path, 'meta.json')
+        if not os.path.exists(meta_path):
+            tmp = meta_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'run_id': self.run_id, 'started': time.time(),
+                           **(meta or {})}, f, indent=2)
+            os.replace(tmp, meta_path)
+        events = os.path.join(self.path, 'events.jsonl')
+        self._events = open(events, 'a')
+        if self._events.tell() and not _ends_with_newline(events):
+            # Terminate a line torn by a crash so new events stay parsable
+            self._events.write('\n')
+        info(f'*** Storing results in {self.path}\n')
+
+    def event(self, kind, **fields):
+        """Append one event record; returns it"""
+        record = {'time': time.time(), 'type': kind, **fields}
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            self._events.write(line)
+            self._events.flush()
+            if self.fsync:
+                os.fsync(self._events.fileno())
+        return record
+
+    def sample(self, metric, timestamp, value):
+        """Append one sample to a metric's series"""
+        self.samples(metric, ((timestamp, value),))
+
+    def samples(self, metric, samples):
+        """Append (timestamp, value) pairs, oldest first, to a series
+
+        Timestamps must not go backwards within a series, which is what
+        lets readers binary-search a time window; older samples than the
+        newest one stored are dropped with a warning.
+        """
+        with self._lock:
+            series = self._series.get(metric)
+            if series is None:
+                path = os.path.join(self.path, 'series',
+                                    quote(metric, safe=''))
+                series = self._series[metric] = {
+                    'last': _repair_series(path), 'path': path,
+                    'pending': array('d')}
+            pending = series['pending']
+            dropped = 0
+            for timestamp, value in samples:
+                if timestamp < series['last']:
+                    dropped += 1
+                    continue
+                series['last'] = timestamp
+                pending.append(timestamp)
+                pending.append(value)
+            if dropped:
+                warn(f'*** {metric}: dropped {dropped} samples older than '
+                     f'ones already stored\n')
+            if len(pending) >= 2 * self.buffer:
+                self._write(series)
+
+    def _write(self, series):
+        """Write a series' pending samples (lock held)
+
+        The file is only open while writing, so a run with thousands of
+        series never runs out of file descriptors.
+        """
+        if series['pending']:
+            if sys.byteorder == 'big':
+                series['pending'].byteswap()
+            with open(series['path'], 'ab') as f:
+                f.write(series['pending'].tobytes())
+            del series['pending'][:]
+
+    def flush(self):
+        """Write all buffered samples"""
+        with self._lock:
+            for series in self._series.values():
+                self._write(series)
+
+    def close(self):
+        """Flush and close every file of the run"""
+        self.flush()
+        with self._lock:
+            self._series = {}
+            self._events.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _ends_with_newline(path):
+    """Whether a non-empty file's last byte is a newline"""
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def _repair_series(path):
+    """Drop a torn trailing record; return the last timestamp stored"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return float('-inf')
+    whole = size // SAMPLE.size * SAMPLE.size
+    if whole != size:
+        os.truncate(path, whole)
+    if not whole:
+        return float('-inf')
+    with open(path, 'rb') as f:
+        f.seek(whole - SAMPLE.size)
+        return SAMPLE.unpack(f.read(SAMPLE.size))[0]
+
+
+class RunReader:
+    """Read back one run directory written by RunStore"""
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def meta(self):
+        """The run's metadata"""
+        with open(os.path.join(self.path, 'meta.json')) as f:
+            return json.load(f)
+
+    def metrics(self):
+        """Return the names of all recorded series"""
+        return sorted(unquote(name) for name in
+                      os.listdir(os.path.join(self.path, 'series')))
+
+    def events(self, kind=None, start=None, end=None):
+        """Yield events, optionally of one type and within a time window
+
+        Events are read line by line; a torn last line is skipped.
+        """
+        with open(os.path.join(self.path, 'events.jsonl')) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if kind is not None and record.get('type') != kind:
+                    continue
+                if start is not None and record['time'] < start:
+                    continue
+                if end is not None and record['time'] > end:
+                    continue
+                yield record
+
+    def series(self, metric, start=None, end=None):
+        """Return (times, values) arrays of one metric within [start, end]
+
+        Only the records inside the window are read: its bounds are
+        found by binary search over the memory-mapped file.
+        """
+        path = os.path.join(self.path, 'series', quote(metric, safe=''))
+        size = os.path.getsize(path)
+        count = size // SAMPLE.size
+        times, values = array('d'), array('d')
+        if not count:
+            return times, values
+        with open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+            def time_at(i):
+                return SAMPLE.unpack_from(data, i * SAMPLE.size)[0]
+
+            def bound(t, right):
+                lo, hi = 0, count
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if time_at(mid) < t or (right and time_at(mid) == t):
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                return lo
+
+            first = 0 if start is None else bound(start, False)
+            last = count if end is None else bound(end, True)
+            if first < last:
+                records = array('d')
+                records.frombytes(
+                    data[first * SAMPLE.size:last * SAMPLE.size])
+                if sys.byteorder == 'big':
+                    records.byteswap()
+                times, values = records[0::2], records[1::2]
+        return times, values
+
+
+def list_runs(base=DEFAULT_BASE):
+    """Return the run ids under base, oldest first"""
+    if not os.path.isdir(base):
+        return []
+    return sorted(name for name in os.listdir(base)
+                  if os.path.exists(os.path.join(base, name, 'meta.json')))
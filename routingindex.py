@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Precomputed routing index for Mininet topologies
+
+Builds all-pairs shortest paths once from a Topo (or a NetworkX graph
+such as the ones in iperf/) and stores them compactly: a hop-count table
+and a first-next-hop table, both array-backed n*n tables indexed by node
+number, plus the adjacency in CSR form from which ECMP next-hop sets are
+derived.  Queries -- the path or ECMP path set of a flow, the links a
+flow or a whole traffic matrix loads, and bulk path validation in the
+style of iperf/simplegraph.py's path_valid() -- never touch NetworkX.
+
+Only switches forward traffic: hosts may start and end paths but are
+never used as transit nodes.
+"""
+
+from mininet.log import setLogLevel, info
+from topobuilder import LinearTopo
+from array import array
+from collections import deque
+import os
+import runpy
+
+UNREACHABLE = -1
+
+
+class RoutingIndex:
+    """All-pairs shortest paths with ECMP over an undirected graph"""
+
+    def __init__(self, nodes, edges, transit=None):
+        """nodes: node names; edges: (name, name) pairs
+           transit: names allowed to forward traffic (default: all)"""
+        self.nodes = list(nodes)
+        self.index = {name: i for i, name in enumerate(self.nodes)}
+        n = len(self.nodes)
+        self.size = n
+        transit = self.nodes if transit is None else transit
+        self.transit = array('b', bytes(n))
+        for name in transit:
+            self.transit[self.index[name]] = 1
+
+        # Adjacency in CSR form; parallel links collapse to one edge
+        neighbors = [set() for _ in range(n)]
+        for a, b in edges:
+            i, j = self.index[a], self.index[b]
+            if i != j:
+                neighbors[i].add(j)
+                neighbors[j].add(i)
+        self.offsets = array('l', [0])
+        self.adjacency = array('l')
+        for adj in neighbors:
+            self.adjacency.extend(sorted(adj))
+            self.offsets.append(len(self.adjacency))
+        self.edges = {i * n + j for i in range(n) for j in neighbors[i]}
+
+        self.dist = array('l', [UNREACHABLE]) * (n * n)
+        self.nexthop = array('l', [UNREACHABLE]) * (n * n)
+        for dst in range(n):
+            self._bfs(dst)
+
+    def _bfs(self, dst):
+        """Fill the dist/nexthop columns for one destination
+
+        The BFS runs backwards from dst; the node a vertex is discovered
+        from is its next hop towards dst.
+        """
+        n, dist, nexthop = self.size, self.dist, self.nexthop
+        adjacency, offsets, transit = self.adjacency, self.offsets, \
+            self.transit
+        dist[dst * n + dst] = 0
+        nexthop[dst * n + dst] = dst
+        queue = deque([dst])
+        while queue:
+            node = queue.popleft()
+            # Traffic may only pass through transit nodes on its way
+            if node != dst and not transit[node]:
+                continue
+            hops = dist[node * n + dst] + 1
+            for k in range(offsets[node], offsets[node + 1]):
+                peer = adjacency[k]
+                if dist[peer * n + dst] == UNREACHABLE:
+                    dist[peer * n + dst] = hops
+                    nexthop[peer * n + dst] = node
+                    queue.append(peer)
+
+    @classmethod
+    def from_topo(cls, topo):
+        """Index a Mininet Topo; only switches forward"""
+        return cls(topo.nodes(), [(a, b) for a, b in topo.links()],
+                   transit=topo.switches())
+
+    @classmethod
+    def from_graph(cls, g, transit=None):
+        """Index a NetworkX graph"""
+        return cls(g.nodes(), g.edges(), transit=transit)
+
+    def distance(self, src, dst):
+        """Hop count from src to dst, or None if unreachable"""
+        hops = self.dist[self.index[src] * self.size + self.index[dst]]
+        return None if hops == UNREACHABLE else hops
+
+    def _nexthops(self, node, dst):
+        """ECMP next hops (node numbers) from node towards dst"""
+        n = self.size
+        want = self.dist[node * n + dst] - 1
+        return [peer for peer in
+                self.adjacency[self.offsets[node]:self.offsets[node + 1]]
+                if self.dist[peer * n + dst] == want and
+                (peer == dst or self.transit[peer])]
+
+    def nexthops(self, src, dst):
+        """Return the ECMP next-hop names from src towards dst"""
+        i, j = self.index[src], self.index[dst]
+        if i == j or self.dist[i * self.size + j] == UNREACHABLE:
+            return []
+        return [self.nodes[k] for k in self._nexthops(i, j)]
+
+    def path(self, src, dst):
+        """Return the primary shortest path as a list of names, or None"""
+        n = self.size
+        i, j = self.index[src], self.index[dst]
+        if self.dist[i * n + j] == UNREACHABLE:
+            return None
+        path = [i]
+        while i != j:
+            i = self.nexthop[i * n + j]
+            path.append(i)
+        return [self.nodes[k] for k in path]
+
+    def ecmp_paths(self, src, dst, limit=None):
+        """Return up to limit equal-cost shortest paths from src to dst"""
+        i, j = self.index[src], self.index[dst]
+        if self.dist[i * self.size + j] == UNREACHABLE:
+            return []
+        paths = []
+        stack = [[i]]
+        while stack and (limit is None or len(paths) < limit):
+            path = stack.pop()
+            if path[-1] == j:
+                paths.append([self.nodes[k] for k in path])
+                continue
+            for peer in reversed(self._nexthops(path[-1], j)):
+                stack.append(path + [peer])
+        return paths
+
+    def ecmp_count(self, src, dst):
+        """Return the number of equal-cost shortest paths"""
+        i, j = self.index[src], self.index[dst]
+        n = self.size
+        if self.dist[i * n + j] == UNREACHABLE:
+            return 0
+        counts = {j: 1}
+        # Process nodes from closest to dst outwards
+        for node in sorted(self._dag(i, j),
+                           key=lambda k: self.dist[k * n + j]):
+            if node != j:
+                counts[node] = sum(counts[peer]
+                                   for peer in self._nexthops(node, j))
+        return counts[i]
+
+    def _dag(self, i, j):
+        """Nodes on any shortest path from i to j"""
+        seen = {i}
+        stack = [i]
+        while stack:
+            node = stack.pop()
+            if node == j:
+                continue
+            for peer in self._nexthops(node, j):
+                if peer not in seen:
+                    seen.add(peer)
+                    stack.append(peer)
+        return seen
+
+    def links_for(self, src, dst, ecmp=False):
+        """Return the directed links a src->dst flow traverses
+
+        Without ecmp, the links of the primary path in order.  With
+        ecmp, a dict of (u, v) -> fraction of the flow crossing that
+        link when every hop splits evenly across its next hops.
+        """
+        if not ecmp:
+            path = self.path(src, dst)
+            return list(zip(path, path[1:])) if path else []
+        i, j = self.index[src], self.index[dst]
+        n = self.size
+        if i == j or self.dist[i * n + j] == UNREACHABLE:
+            return {}
+        share = {i: 1.0}
+        fractions = {}
+        # Walk away from src so each node's inflow is complete
+        for node in sorted(self._dag(i, j),
+                           key=lambda k: -self.dist[k * n + j]):
+            if node == j or node not in share:
+                continue
+            hops = self._nexthops(node, j)
+            part = share[node] / len(hops)
+            for peer in hops:
+                link = (self.nodes[node], self.nodes[peer])
+                fractions[link] = fractions.get(link, 0.0) + part
+                share[peer] = share.get(peer, 0.0) + part
+        return fractions
+
+    def link_loads(self, flows, ecmp=True):
+        """Sum per-link load over flows of (src, dst, volume)"""
+        loads = {}
+        for src, dst, volume in flows:
+            if ecmp:
+                crossed = self.links_for(src, dst, ecmp=True).items()
+            else:
+                crossed = ((link, 1.0) for link in self.links_for(src, dst))
+            for link, fraction in crossed:
+                loads[link] = loads.get(link, 0.0) + volume * fraction
+        return loads
+
+    def validate(self, paths):
+        """Check many paths at once; returns one bool per path
+
+        A path is valid when every consecutive pair of nodes is linked,
+        the same test as iperf/simplegraph.py's path_valid().  Unknown
+        node names make a path invalid.
+        """
+        index, n, edges = self.index, self.size, self.edges
+        results = []
+        for path in paths:
+            try:
+                nums = [index[name] for name in path]
+            except KeyError:
+                results.append(False)
+                continue
+            results.append(all(a * n + b in edges
+                               for a, b in zip(nums, nums[1:])))
+        return results
+
+    def validate_shortest(self, paths):
+        """Like validate(), but also require each path to be shortest"""
+        valid = self.validate(paths)
+        n, dist, index = self.size, self.dist, self.index
+        return [ok and (len(path) < 2 or
+                        dist[index[path[0]] * n + index[path[-1]]] ==
+                        len(path) - 1)
+                for ok, path in zip(valid, paths)]
+
+
+if __name__ == '__main__':
+    setLogLevel('info')
+    # The shaped chain of topo1.py and MyTopo from topo-2sw-2host.py
+    here = os.path.dirname(os.path.abspath(__file__))
+    mytopo = runpy.run_path(os.path.join(here, 'topo-2sw-2host.py'))
+    for name, topo in (('chain', LinearTopo(k=4, n=1)),
+                       ('mytopo', mytopo['topos']['mytopo']())):
+        routes = RoutingIndex.from_topo(topo)
+        hosts = topo.hosts()
+        info(f'*** {name}: {len(routes.nodes)} nodes\n')
+        for src in hosts:
+            for dst in hosts:
+                if src != dst:
+                    info(f'    {src} -> {dst}: '
+                         f'{" ".join(routes.path(src, dst))}\n')
+        paths = [routes.path(a, b) for a in hosts for b in hosts]
+        info(f'    {sum(routes.validate(paths))}/{len(paths)} paths valid\n')
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Headless, declarative scenario runner
+
+Runs a batch of experiments described by a JSON spec without a CLI or
+any prompt, so suites can run unattended.  Scenarios with the same
+topology run one after another on a single network that is built once,
+instead of tearing it down and rebuilding it for every scenario.
+
+    {
+      "name": "nightly",
+      "defaults": {"duration": 5, "repetitions": 3},
+      "scenarios": [
+        {"name": "bulk",
+         "topology": {"type": "star", "args": {"n": 4,
+                      "host_link": {"bw": 10}}},
+         "traffic": [{"src": "h1", "dst": "h2", "type": "TCP Bulk"}],
+         "probes": {"bandwidth": {"rate": 50}, "latency": {"count": 5},
+                    "capacity": {"tolerance": 0.15}}}
+      ]
+    }
+
+A topology is one of
+    {"type": <topobuilder.topos name>, "args": {...}}
+    {"class": "module:Class", "args": {...}}
+    {"links": {"h1": {TCLink params}, ...}}   hosts on one switch
+    {"project": <project file>}
+with optional "proactive": true to preinstall flows instead of running
+a controller.  Traffic types are those of EnhancedTrafficAnalyzer.
+
+Link parameters that vary between scenarios do not need a new network:
+
+    "links": [{"between": ["h3", "s1"], "loss": 5}]
+
+reshapes the live links for one scenario (see linkparams), and
+
+    "sweep": {"between": [["h3", "s1"]], "grid": {"loss": [0, 1, 5]}}
+
+expands a scenario into one scenario per grid point.
+
+    sudo python3 scenariorunner.py scenarios.json
+"""
+
+from mininet.topo import Topo
+from mininet.link import TCLink
+from mininet.clean import cleanup
+from mininet.log import setLogLevel, info, error
+from topobuilder import topos, build_network, report_timings
+from topocache import TopoCache, load_class
+from projectloader import load_project
+from proactive import proactive_network
+from resultstore import RunStore, DEFAULT_BASE
+from trafficanalyzer import EnhancedTrafficAnalyzer
+from linkparams import change_links, restore_links, grid_points
+from netpool import PrefixedTopo
+from collections import OrderedDict
+import argparse
+import json
+import sys
+import threading
+import time
+
+SCENARIO_DEFAULTS = {'duration': 5, 'repetitions': 1, 'concurrent': True,
+                     'wave_size': None, 'base_port': 5001, 'probes': {},
+                     'traffic': [], 'links': []}
+
+TRAFFIC_TYPES = ('TCP Bulk', 'UDP Streaming', 'HTTP-like')
+
+PROBES = ('bandwidth', 'latency', 'capacity')
+
+
+class ScenarioError(ValueError):
+    """Raised when a scenario spec is invalid"""
+
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__('invalid scenario spec:\n  ' +
+                         '\n  '.join(problems))
+
+
+class LinksTopo(Topo):
+    """Hosts on one switch, each with its own link parameters"""
+
+    def build(self, links):
+        switch = self.addSwitch('s1')
+        for name, params in links.items():
+            self.addLink(self.addHost(name), switch, **(params or {}))
+
+
+def topology_key(topology):
+    """Canonical form of a topology spec; equal keys share a network"""
+    return json.dumps(topology, sort_keys=True)
+
+
+def expand_sweep(scenario):
+    """One scenario per grid point of a scenario's sweep"""
+    sweep = scenario.pop('sweep', None)
+    if not sweep:
+        return [scenario]
+    expanded = []
+    for point in grid_points(sweep['grid']):
+        label = ','.join(f'{key}={value}' for key, value in point.items())
+        expanded.append(dict(
+            scenario, name=f'{scenario["name"]}[{label}]',
+            links=scenario['links'] + [dict(point, between=between)
+                                       for between in sweep['between']]))
+    return expanded
+
+
+def load_spec(path):
+    """Read a spec file and return its list of validated scenarios"""
+    with open(path) as f:
+        spec = json.load(f)
+    defaults = dict(SCENARIO_DEFAULTS, **spec.get('defaults', {}))
+    scenarios, problems = [], []
+    for i, raw in enumerate(spec.get('scenarios', [])):
+        scenario = dict(defaults, **raw)
+        scenario.setdefault('name', f'scenario{i + 1}')
+        where = f'scenario {scenario["name"]}'
+        sweep = scenario.get('sweep')
+        if sweep and not (sweep.get('between') and sweep.get('grid')):
+            problems.append(f'{where}: sweep needs between and grid')
+        for link in scenario['links'] + [{'between': between} for between
+                                         in (sweep or {}).get('between',
+                                                              [])]:
+            if len(link.get('between', ())) != 2:
+                problems.append(f'{where}: links need between [a, b]')
+        topology = scenario.get('topology')
+        if not isinstance(topology, dict):
+            problems.append(f'{where}: missing topology')
+        elif not sum(key in topology for key in
+                     ('type', 'class', 'links', 'project')) == 1:
+            problems.append(f'{where}: topology needs exactly one of '
+                            'type, class, links or project')
+        elif 'type' in topology and topology['type'] not in topos:
+            problems.append(f'{where}: unknown topology type '
+                            f'{topology["type"]!r}')
+        for test in scenario['traffic']:
+            if 'src' not in test or 'dst' not in test:
+                problems.append(f'{where}: traffic needs src and dst')
+            if test.get('type', TRAFFIC_TYPES[0]) not in TRAFFIC_TYPES:
+                problems.append(f'{where}: unknown traffic type '
+                                f'{test["type"]!r}')
+        for probe in scenario['probes']:
+            if probe not in PROBES:
+                problems.append(f'{where}: unknown probe {probe!r}')
+        if scenario['repetitions'] < 1:
+            problems.append(f'{where}: repetitions must be at least 1')
+        scenarios.extend(expand_sweep(scenario))
+    if not scenarios:
+        problems.append('no scenarios')
+    if problems:
+        raise ScenarioError(problems)
+    return spec.get('name', ''), scenarios
+
+
+def group_scenarios(scenarios):
+    """Group scenarios by topology, in order of first appearance"""
+    groups = OrderedDict()
+    for scenario in scenarios:
+        groups.setdefault(topology_key(scenario['topology']),
+                          []).append(scenario)
+    return groups
+
+
+def build_topology(topology, cache=None, shard=None):
+    """Build and start the network of a topology spec
+
+    cache: TopoCache used to compile the topology, or None to
+    instantiate it directly
+    shard: optional sharding.Shard; node names get its prefix and the
+    controller listens on its port, so shards can run side by side
+    returns: (net, timings)
+    """
+    if 'project' in topology:
+        if shard:
+            raise ScenarioError([f'project {topology["project"]} brings '
+                                 'its own controllers and cannot be '
+                                 'sharded'])
+        project = (cache.project(topology['project']) if cache else
+                   load_project(topology['project']))
+        return project.build()
+    if 'links' in topology:
+        cls, args = LinksTopo, {'links': topology['links']}
+    elif 'class' in topology:
+        cls = load_class(topology['class'])
+        args = topology.get('args', {})
+    else:
+        cls, args = topos[topology['type']], topology.get('args', {})
+    topo = cache.topo(cls, **args) if cache else cls(**args)
+    opts = {}
+    if shard:
+        topo = PrefixedTopo(topo, shard.prefix, shard.index)
+        opts['ipBase'] = shard.ip_base
+        if not topology.get('proactive'):
+            opts['controllers'] = [{'name': f'{shard.prefix}c0',
+                                    'port': shard.controller_port}]
+    if topology.get('proactive'):
+        return proactive_network(topo, link=TCLink, **opts)
+    return build_network(topo, link=TCLink, **opts)
+
+
+def run_scenario(net, scenario, repetition, store=None, prefix=''):
+    """Run one repetition of a scenario on a started network
+
+    When a bandwidth probe is requested the interfaces are sampled
+    while the traffic runs; the other probes run afterwards.
+    prefix: prepended to the node names of the spec
+    returns: the analyzer's stats
+    """
+    analyzer = EnhancedTrafficAnalyzer(store=store)
+    pairs = [(net[prefix + test['src']], net[prefix + test['dst']],
+              test.get('type', TRAFFIC_TYPES[0]))
+             for test in scenario['traffic']]
+    probes = scenario['probes']
+    duration = scenario['duration']
+
+    failures = []
+
+    def traffic():
+        try:
+            analyzer.run_traffic(pairs, concurrent=scenario['concurrent'],
+                                 wave_size=scenario['wave_size'],
+                                 base_port=scenario['base_port'],
+                                 duration=duration)
+        except Exception as e:
+            # Handed to the caller after join()
+            failures.append(e)
+
+    started = time.time()
+    if 'bandwidth' in probes:
+        thread = threading.Thread(target=traffic, daemon=True)
+        thread.start()
+        try:
+            # iperf servers get one second to start before the clients
+            analyzer.monitor_bandwidth(net, duration=duration + 1,
+                                       **probes['bandwidth'])
+        finally:
+            thread.join()
+    else:
+        traffic()
+    if failures:
+        raise failures[0]
+    if 'latency' in probes:
+        analyzer.measure_latency(net, **probes['latency'])
+    if 'capacity' in probes and pairs:
+        analyzer.check_capacity(net, **probes['capacity'])
+    stats = dict(analyzer.stats,
+                 tests=[dict(test) for test in analyzer.traffic_log])
+    if store:
+        store.event('scenario', name=scenario['name'],
+                    repetition=repetition, started=started,
+                    elapsed=time.time() - started,
+                    topology=scenario['topology'],
+                    links=scenario['links'])
+    return stats
+
+
+def _run_repetitions(net, scenario, records, store=None, prefix=''):
+    """Run every repetition of a scenario, appending their records
+
+    The scenario's link changes are undone afterwards, even when a
+    repetition fails.
+    """
+    previous = change_links(net, [
+        (tuple(prefix + name for name in link['between']),
+         {param: value for param, value in link.items()
+          if param != 'between'})
+        for link in scenario['links']]) if scenario['links'] else {}
+    try:
+        for repetition in range(scenario['repetitions']):
+            info(f'\n*** Scenario {scenario["name"]} '
+                 f'({repetition + 1}/{scenario["repetitions"]})\n')
+            started = time.monotonic()
+            stats = run_scenario(net, scenario, repetition, store, prefix)
+            records.append({
+                'scenario': scenario['name'],
+                'repetition': repetition,
+                'elapsed': time.monotonic() - started,
+                'build': 0.0, 'stats': stats})
+    finally:
+        restore_links(previous)
+
+
+def run_batch(scenarios, store=None, cache=None, shard=None):
+    """Run every scenario, building each distinct topology once
+
+    A failed scenario is logged and recorded as a scenario_failed
+    event; the remaining scenarios still run.
+    shard: optional sharding.Shard the networks are isolated for
+    returns: list of per-repetition records; the build time of a
+    network is charged to the first repetition run on it
+    """
+    records = []
+    for key, group in group_scenarios(scenarios).items():
+        topology = group[0]['topology']
+        info(f'\n*** Building {key} for {len(group)} scenario(s)\n')
+        try:
+            net, timings = build_topology(topology, cache, shard)
+        except Exception as e:
+            error(f'*** Could not build {key}: {e}\n')
+            if store:
+                store.event('build_failed', topology=topology,
+                            error=str(e))
+            if not shard:
+                # Other shards' networks must survive a failed build
+                cleanup()
+            continue
+        report_timings(timings)
+        if store:
+            store.event('build', topology=topology, timings=timings)
+        prefix = shard.prefix if shard else ''
+        first = len(records)
+        try:
+            for scenario in group:
+                try:
+                    _run_repetitions(net, scenario, records, store, prefix)
+                except Exception as e:
+                    error(f'*** Scenario {scenario["name"]} failed: {e}\n')
+                    if store:
+                        store.event('scenario_failed',
+                                    name=scenario['name'], error=str(e))
+        finally:
+            net.stop()
+        if len(records) > first:
+            records[first]['build'] = timings['total']
+    return records
+
+
+def summarize(records):
+    """Log one line per scenario repetition"""
+    info('\n*** Scenario summary\n')
+    for record in records:
+        rates = [test['result']['summary']['bits_per_second']
+                 for test in record['stats']['tests']
+                 if test['result']['summary']]
+        mean = sum(rates) / len(rates) / 1e6 if rates else 0.0
+        info(f'    {record["scenario"]} #{record["repetition"] + 1}: '
+             f'{len(record["stats"]["tests"])} tests, '
+             f'mean {mean:.2f} Mbps, {record["elapsed"]:.1f}s '
+             f'(+{record["build"]:.1f}s build)\n')
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('spec', help='JSON scenario spec')
+    parser.add_argument('--store', default=DEFAULT_BASE,
+                        help='base directory for run results')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='compile topologies without the plan cache')
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    try:
+        name, scenarios = load_spec(args.spec)
+    except ScenarioError as e:
+        error(f'*** {e}\n')
+        return 1
+    cache = None if args.no_cache else TopoCache()
+    with RunStore(base=args.store, meta={'script': 'scenariorunner.py',
+                                         'spec': args.spec,
+                                         'name': name}) as store:
+        records = run_batch(scenarios, store, cache)
+        summarize(records)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
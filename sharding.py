@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Sharded parallel execution of independent scenarios
+
+Runs the scenarios of a scenariorunner spec as separate networks in
+parallel worker processes, one per shard.  Shards never collide: every
+shard's node names carry its prefix (w0h1, w1h1, ...), its hosts use
+their own IP range, its controller its own port and its switches their
+own dpids.  Each worker is pinned to dedicated cores, and everything it
+starts (host shells, iperf, ...) inherits that affinity.
+
+CPU contention silently corrupts bandwidth measurements, so plan_shards()
+refuses to place more shards than there are free cores, taking CPU
+affinity and cgroup CPU quotas into account.  Scenarios sharing a
+topology stay on one shard so they still reuse one network.
+
+    sudo python3 sharding.py scenarios.json --shards 4
+"""
+
+from mininet.log import setLogLevel, info, error
+from scenariorunner import (ScenarioError, load_spec, group_scenarios,
+                            run_batch, summarize)
+from resultstore import RunStore, DEFAULT_BASE
+from topocache import TopoCache
+from netpool import BASE_CONTROLLER_PORT
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+
+# Isolation parameters of one worker process
+Shard = namedtuple('Shard', ['index', 'prefix', 'ip_base',
+                             'controller_port', 'cpus'])
+
+
+class ShardError(ValueError):
+    """Raised when shards would oversubscribe the available cores"""
+
+
+def cgroup_cpu_limit(path='/sys/fs/cgroup/cpu.max'):
+    """CPUs allowed by a cgroup v2 quota, or None when unlimited"""
+    try:
+        with open(path) as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == 'max':
+        return None
+    return int(quota) / int(period)
+
+
+def available_cpus():
+    """Cores this process may run on, trimmed to the cgroup quota"""
+    cpus = sorted(os.sched_getaffinity(0))
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = cpus[:max(1, math.floor(limit))]
+    return cpus
+
+
+def plan_shards(shards=None, cpus_per_shard=1, reserve=1):
+    """Assign dedicated cores to each shard
+
+    reserve: cores left for this process, ovs-vswitchd and the kernel
+    shards: number of shards (default: as many as fit)
+    returns: list of Shard
+    """
+    cpus = available_cpus()
+    usable = cpus[reserve:]
+    fit = len(usable) // cpus_per_shard
+    if shards is None:
+        shards = fit
+    if shards < 1 or shards > fit:
+        raise ShardError(
+            f'{shards} shards of {cpus_per_shard} cores need '
+            f'{max(shards, 1) * cpus_per_shard + reserve} cores but only '
+            f'{len(cpus)} are available ({reserve} reserved)')
+    return [Shard(index=i, prefix=f'w{i}', ip_base=f'10.{i + 1}.0.0/16',
+                  controller_port=BASE_CONTROLLER_PORT + 100 + i,
+                  cpus=usable[i * cpus_per_shard:(i + 1) * cpus_per_shard])
+            for i in range(shards)]
+
+
+def assign(scenarios, count):
+    """Split scenarios into count lists, keeping topologies together
+
+    Topology groups are placed longest first on the least loaded shard,
+    with duration times repetitions as the cost of a scenario.
+    """
+    groups = sorted(group_scenarios(scenarios).values(), key=lambda g: -sum(
+        s['duration'] * s['repetitions'] for s in g))
+    loads = [0.0] * count
+    parts = [[] for _ in range(count)]
+    for group in groups:
+        i = loads.index(min(loads))
+        parts[i].extend(group)
+        loads[i] += sum(s['duration'] * s['repetitions'] for s in group)
+    return parts
+
+
+def _worker(shard, scenarios, store_path):
+    """Run a shard's scenarios in a worker process; returns records"""
+    os.sched_setaffinity(0, shard.cpus)
+    setLogLevel('info')
+    info(f'*** Shard {shard.index} on cores {shard.cpus}\n')
+    store = RunStore(base=store_path, run_id=f'shard{shard.index}',
+                     meta={'shard': shard._asdict()}) if store_path else None
+    try:
+        records = run_batch(scenarios, store,
+                            TopoCache(ipBase=shard.ip_base), shard)
+    finally:
+        if store:
+            store.close()
+    for record in records:
+        record['shard'] = shard.index
+    return records
+
+
+def run_sharded(scenarios, shards=None, cpus_per_shard=1, reserve=1,
+                store=None):
+    """Run scenarios on parallel shards and merge their records
+
+    Shard stores are written under the run directory of store; the
+    merged records come back in spec order.
+    """
+    plan = plan_shards(shards, cpus_per_shard, reserve)
+    parts = [part for part in assign(scenarios, len(plan)) if part]
+    plan = plan[:len(parts)]
+    for shard, part in zip(plan, parts):
+        info(f'*** Shard {shard.index}: {len(part)} scenarios on cores '
+             f'{shard.cpus}\n')
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(len(plan), mp_context=context) as executor:
+        futures = [executor.submit(_worker, shard, part,
+                                   store.path if store else None)
+                   for shard, part in zip(plan, parts)]
+        records = []
+        for shard, future in zip(plan, futures):
+            try:
+                records.extend(future.result())
+            except Exception as e:
+                error(f'*** Shard {shard.index} failed: {e}\n')
+                if store:
+                    store.event('shard_failed', shard=shard.index,
+                                error=str(e))
+    order = {scenario['name']: i for i, scenario in enumerate(scenarios)}
+    records.sort(key=lambda r: (order[r['scenario']], r['repetition']))
+    if store:
+        store.event('sharded', shards=[s._asdict() for s in plan],
+                    records=len(records))
+    return records
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('spec', help='JSON scenario spec')
+    parser.add_argument('--shards', type=int,
+                        help='worker processes (default: as many as fit)')
+    parser.add_argument('--cpus-per-shard', type=int, default=1)
+    parser.add_argument('--reserve', type=int, default=1,
+                        help='cores kept free for OVS and this process')
+    parser.add_argument('--store', default=DEFAULT_BASE,
+                        help='base directory for run results')
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    try:
+        name, scenarios = load_spec(args.spec)
+        plan_shards(args.shards, args.cpus_per_shard, args.reserve)
+    except (ScenarioError, ShardError) as e:
+        error(f'*** {e}\n')
+        return 1
+    with RunStore(base=args.store, meta={'script': 'sharding.py',
+                                         'spec': args.spec,
+                                         'name': name}) as store:
+        records = run_sharded(scenarios, args.shards, args.cpus_per_shard,
+                              args.reserve, store)
+        summarize(records)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
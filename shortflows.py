@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Short request/response flows and flow completion times
+
+Long iperf runs only show steady-state throughput.  This workload
+instead opens one connection per flow, requests a response whose size
+is drawn from a flow size distribution and records the flow completion
+time (FCT): from when the flow was due to start until its last byte
+arrived.  Flows start with Poisson (or evenly spaced) arrivals, either
+at a given rate or at the rate that offers a given load to a link.
+
+Size distributions are piecewise-linear CDFs of (bytes, probability)
+points.  Two heavy-tailed data-center mixes are built in: 'web-search'
+(most bytes in flows of 1-20 MB) and 'data-mining' (half the flows
+a single packet, most bytes in flows of hundreds of MB); others can be
+loaded from a JSON file of [[bytes, probability], ...] points.
+
+Responses come from httpload servers (GET /size/N).  Every client host
+runs a generator at once through fanout(), and FCTs are reported per
+size bucket, small flows first, since those carry latency SLOs:
+
+    sudo python3 shortflows.py --hosts 4 --cdf web-search --load 0.4
+"""
+
+from mininet.log import setLogLevel, info, warn
+from fanout import fanout
+from httpload import start_server, stop_server, fetch
+from iperfparser import IperfRecord
+from metricsstore import stats
+from topobuilder import StarTopo, build_network
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import shlex
+import sys
+
+SCRIPT = os.path.abspath(__file__)
+
+MSS = 1460
+
+# Flow size CDFs in packets of MSS bytes, as published with the DCTCP
+# (web search) and VL2 (data mining) measurements
+SIZE_CDFS = {
+    'web-search': [(1, 0.0), (6, 0.15), (13, 0.2), (19, 0.3), (33, 0.4),
+                   (53, 0.53), (133, 0.6), (667, 0.7), (1333, 0.8),
+                   (3333, 0.9), (6667, 0.97), (20000, 1.0)],
+    'data-mining': [(1, 0.0), (1, 0.5), (2, 0.6), (3, 0.7), (7, 0.8),
+                    (267, 0.9), (2107, 0.95), (66667, 0.99),
+                    (666667, 1.0)],
+}
+
+# Upper size bounds of the FCT report buckets
+SIZE_BUCKETS = ((10e3, '<10KB'), (100e3, '10KB-100KB'),
+                (1e6, '100KB-1MB'), (float('inf'), '>1MB'))
+
+
+class SizeDistribution:
+    """Flow sizes drawn from a piecewise-linear CDF"""
+
+    def __init__(self, points, max_size=None):
+        """points: (bytes, cumulative probability) pairs, ascending
+           max_size: cap on drawn sizes, for links too slow for the tail"""
+        points = sorted(points, key=lambda p: (p[1], p[0]))
+        if not points or points[-1][1] != 1.0:
+            raise ValueError('a size CDF must end at probability 1')
+        self.sizes = [float(size) for size, _ in points]
+        self.probabilities = [float(p) for _, p in points]
+        self.max_size = max_size
+
+    @classmethod
+    def named(cls, name, max_size=None):
+        """A built-in distribution or one loaded from a JSON file"""
+        if name in SIZE_CDFS:
+            return cls([(packets * MSS, p) for packets, p in SIZE_CDFS[name]],
+                       max_size)
+        if name.startswith('fixed:'):
+            return cls([(int(name[6:]), 1.0)], max_size)
+        with open(name) as f:
+            return cls(json.load(f), max_size)
+
+    def sample(self, rng=random):
+        """Draw one flow size in bytes"""
+        u = rng.random()
+        i = bisect.bisect_left(self.probabilities, u)
+        if i == 0:
+            size = self.sizes[0]
+        else:
+            low, high = self.probabilities[i - 1], self.probabilities[i]
+            fraction = (u - low) / (high - low) if high > low else 1.0
+            size = self.sizes[i - 1] + fraction * (self.sizes[i] -
+                                                   self.sizes[i - 1])
+        size = max(1, int(size))
+        return min(size, self.max_size) if self.max_size else size
+
+    def mean(self):
+        """Mean flow size in bytes, with the cap applied"""
+        total, last_size, last_p = 0.0, self.sizes[0], 0.0
+        cap = self.max_size or float('inf')
+        for size, p in zip(self.sizes, self.probabilities):
+            total += (p - last_p) * _capped_mean(last_size, size, cap)
+            last_size, last_p = size, p
+        return total
+
+
+def _capped_mean(low, high, cap):
+    """Mean of min(x, cap) for x uniform in [low, high]"""
+    if high <= cap:
+        return (low + high) / 2
+    if low >= cap:
+        return cap
+    # The part below the cap averages its midpoint, the rest is cap
+    below = (cap - low) / (high - low)
+    return below * (low + cap) / 2 + (1 - below) * cap
+
+
+def rate_for_load(distribution, load, link_bps):
+    """Flow arrivals per second that offer load (0..1) of a link"""
+    return load * link_bps / (8 * distribution.mean())
+
+
+# Client side: runs inside each client host
+
+async def _generate(targets, distribution, rate, duration, arrivals,
+                    max_inflight, grace):
+    """Start flows for duration seconds; returns the client's result"""
+    loop = asyncio.get_running_loop()
+    result = {'flows': [], 'errors': 0, 'skipped': 0, 'unfinished': 0}
+    inflight = set()
+
+    async def flow(due, target, size):
+        try:
+            status, received = await fetch([None, None], target,
+                                           f'/size/{size}', False)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            result['errors'] += 1
+            return
+        if status >= 400 or received != size:
+            result['errors'] += 1
+            return
+        result['flows'].append((size, (loop.time() - due) * 1000))
+
+    start = loop.time()
+    due = start
+    while due < start + duration:
+        await asyncio.sleep(max(0, due - loop.time()))
+        if len(inflight) >= max_inflight:
+            # The network cannot keep up; starting more would only
+            # measure the backlog
+            result['skipped'] += 1
+        else:
+            task = asyncio.ensure_future(flow(
+                due, random.choice(targets), distribution.sample()))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        due += random.expovariate(rate) if arrivals == 'poisson' \
+            else 1.0 / rate
+    if inflight:
+        done, pending = await asyncio.wait(list(inflight), timeout=grace)
+        for task in pending:
+            task.cancel()
+        result['unfinished'] = len(pending)
+    result['elapsed'] = loop.time() - start
+    return result
+
+
+def client(targets, cdf, rate, duration, arrivals='poisson', max_size=None,
+           max_inflight=1000, grace=10):
+    """Run a flow generator and print its result as JSON"""
+    distribution = SizeDistribution.named(cdf, max_size)
+    targets = [(ip, int(port)) for ip, port in
+               (target.rsplit(':', 1) for target in targets)]
+    result = asyncio.run(_generate(targets, distribution, rate, duration,
+                                   arrivals, max_inflight, grace))
+    print(json.dumps(result))
+
+
+def client_command(targets, cdf='web-search', rate=10, duration=10,
+                   arrivals='poisson', max_size=None):
+    """Argument list running a flow generator against ip:port targets
+
+    Node.popen() takes the list as is; join it with shlex.join() for
+    Node.cmd() or fanout().
+    """
+    args = ['python3', SCRIPT, 'client', '--cdf', cdf, '--rate', str(rate),
+            '--duration', str(duration), '--arrivals', arrivals,
+            '--targets'] + list(targets)
+    if max_size:
+        args += ['--max-size', str(max_size)]
+    return args
+
+
+# Results: runs in the Mininet process
+
+def fct_buckets(flows):
+    """FCT statistics (ms) per size bucket of (size, fct) pairs"""
+    buckets, lower = {}, 0
+    for limit, name in SIZE_BUCKETS:
+        buckets[name] = stats([fct for size, fct in flows
+                               if lower <= size < limit])
+        lower = limit
+    return buckets
+
+
+class FlowResult:
+    """Outcome of one flow generator, shaped like a parsed iperf result"""
+
+    def __init__(self, result, offered_bps=None):
+        self.flows = [tuple(flow) for flow in result.get('flows', ())]
+        self.errors = result.get('errors', 0)
+        self.skipped = result.get('skipped', 0)
+        self.unfinished = result.get('unfinished', 0)
+        self.elapsed = result.get('elapsed') or 0.0
+        self.offered_bps = offered_bps
+        size = sum(size for size, _ in self.flows)
+        # Goodput as a summary record, so reports and metrics that
+        # expect iperf results keep working; lost and packets count
+        # failed and attempted flows
+        self.summary = IperfRecord(
+            'SUM', 0.0, self.elapsed, size,
+            size * 8 / self.elapsed if self.elapsed else 0.0,
+            None, None, self.errors + self.unfinished + self.skipped,
+            len(self.flows) + self.errors + self.unfinished + self.skipped,
+            'receiver', True) if result else None
+
+    def to_dict(self):
+        """Return a JSON-serializable view for reports"""
+        return {
+            'format': 'shortflows',
+            'summary': self.summary._asdict() if self.summary else None,
+            'intervals': [],
+            'flows': len(self.flows),
+            'errors': self.errors,
+            'skipped': self.skipped,
+            'unfinished': self.unfinished,
+            'offered_bps': self.offered_bps,
+            'fct_ms': fct_buckets(self.flows),
+        }
+
+
+class FlowParser:
+    """Collects a flow generator's output, like iperfparser.IperfParser"""
+
+    def __init__(self, offered_bps=None):
+        self.offered_bps = offered_bps
+        self._buffer = ''
+
+    def feed(self, data):
+        """Accept a chunk of output"""
+        self._buffer += data
+        return []
+
+    def close(self):
+        """Return the FlowResult of the output fed so far"""
+        for line in reversed(self._buffer.strip().splitlines()):
+            try:
+                return FlowResult(json.loads(line), self.offered_bps)
+            except ValueError:
+                continue
+        return FlowResult({}, self.offered_bps)
+
+
+def run_workload(net, clients, servers, cdf='web-search', rate=None,
+                 load=None, link_bps=None, duration=10, arrivals='poisson',
+                 max_size=None, port=8080, workers=2):
+    """Run short flows from every client to random servers at once
+
+    rate: flow arrivals per second per client, or
+    load: fraction of link_bps (bits/s) each client offers
+    returns: {'clients': {name: FlowResult dict}, 'fct_ms': buckets}
+    Raises ValueError when a client has no server other than itself.
+    """
+    targets = {host: [f'{s.IP()}:{port}' for s in servers if s != host]
+               for host in clients}
+    for host, addresses in targets.items():
+        if not addresses:
+            raise ValueError(f'{host.name} has no server to send flows to')
+    distribution = SizeDistribution.named(cdf, max_size)
+    if rate is None:
+        rate = rate_for_load(distribution, load, link_bps)
+    offered = rate * distribution.mean() * 8
+    info(f'*** Short flows ({cdf}, mean {distribution.mean() / 1e3:.1f} KB)'
+         f' at {rate:.1f} flows/s per client, {offered / 1e6:.2f} '
+         f'Mbits/sec offered each\n')
+    procs = [start_server(server, port, workers) for server in servers]
+    try:
+        results = {}
+        for host, output in fanout({
+                host: shlex.join(client_command(addresses, cdf, rate,
+                                                duration, arrivals,
+                                                max_size))
+                for host, addresses in targets.items()},
+                duration + 60).items():
+            parser = FlowParser(offered)
+            parser.feed(output.output)
+            results[host.name] = parser.close()
+            if not results[host.name].flows:
+                warn(f'*** {host.name}: no flows completed\n')
+    finally:
+        for proc in procs:
+            stop_server(proc)
+    flows = [flow for result in results.values() for flow in result.flows]
+    return {'clients': {name: result.to_dict()
+                        for name, result in results.items()},
+            'fct_ms': fct_buckets(flows)}
+
+
+def report(buckets):
+    """Log FCT statistics per size bucket"""
+    info(f'{"flow size":>12} {"flows":>7} {"mean":>9} {"p50":>9} '
+         f'{"p95":>9} {"p99":>9} (ms)\n')
+    for name, data in buckets.items():
+        if data is None:
+            info(f'{name:>12} {0:7d}\n')
+            continue
+        info(f'{name:>12} {data["count"]:7d} {data["mean"]:9.2f} '
+             f'{data["p50"]:9.2f} {data["p95"]:9.2f} {data["p99"]:9.2f}\n')
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command')
+    gen = commands.add_parser('client', help='run one flow generator')
+    gen.add_argument('--targets', nargs='+', required=True,
+                     help='ip:port of httpload servers')
+    gen.add_argument('--rate', type=float, required=True)
+    for p in (parser, gen):
+        p.add_argument('--cdf', default='web-search',
+                       help=f'{", ".join(SIZE_CDFS)}, fixed:BYTES or a '
+                       'JSON file of [bytes, probability] points')
+        p.add_argument('--duration', type=float, default=10)
+        p.add_argument('--arrivals', choices=('poisson', 'constant'),
+                       default='poisson')
+        p.add_argument('--max-size', type=int,
+                       help='cap on flow sizes in bytes')
+    parser.add_argument('--hosts', type=int, default=4)
+    parser.add_argument('--bw', type=float, default=100,
+                        help='host link Mbit/s')
+    parser.add_argument('--load', type=float, default=0.3,
+                        help='fraction of the link each host offers')
+    args = parser.parse_args()
+
+    if args.command == 'client':
+        client(args.targets, args.cdf, args.rate, args.duration,
+               args.arrivals, args.max_size)
+        return 0
+
+    setLogLevel('info')
+    net, _ = build_network(StarTopo(n=args.hosts,
+                                    host_link={'bw': args.bw}))
+    try:
+        results = run_workload(net, net.hosts, net.hosts, args.cdf,
+                               load=args.load, link_bps=args.bw * 1e6,
+                               duration=args.duration,
+                               arrivals=args.arrivals,
+                               max_size=args.max_size)
+        report(results['fct_ms'])
+    finally:
+        net.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,12 +20,24 @@ def create_simple_network():
     net.start()
     return net
 
-def quick_test():
-    """Run a quick ping test"""
+def quick_test(pool=None):
+    """Run a quick ping test
+    
+    With a netpool.NetworkPool the test leases a warm two-host network
+    instead of building one.
+    """
     print("\n" + "="*40)
     print("Quick Ping Test")
     print("="*40)
     
+    if pool is not None:
+        from topobuilder import StarTopo
+        with pool.lease(StarTopo, n=2) as lease:
+            print("*** Testing ping from h1 to h2")
+            result = lease.net.ping([lease['h1'], lease['h2']])
+        print("✓ Ping successful!" if result == 0 else "✗ Ping failed")
+        return result
+    
     net = Mininet()
     
     # Add 2 hosts
@@ -45,6 +57,7 @@ def quick_test():
         print("✗ Ping failed")
     
     net.stop()
+    return result
 
 # Even simpler - one liner functions
 def run_mininet():
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+TCP performance analysis of captured traffic
+
+TcpAnalyzer follows the sequence and acknowledgment numbers of every
+TCP connection in one streaming pass over capture.Packet objects, so it
+can be given to capture.Capture as a sink.  For each direction of a
+connection it derives:
+
+  - RTT samples: time from a segment to the ACK that covers it, without
+    samples from retransmitted segments (Karn's rule)
+  - retransmissions: data overlapping what was already sent
+  - out-of-order segments: data filling a gap left by a later segment
+  - zero-window events: the receiver advertising a zero window
+  - goodput over time: newly acknowledged bytes per time bin
+
+Per-connection state is bounded (outstanding segments, gaps, RTT
+samples and goodput bins are capped), and so is the number of
+connections.  RTTs are those seen at the capture point, so captures are
+best taken on the host sending the data; HostCaptures does that for
+every host of a network.  attach_to_tests() adds the summaries to the
+test records of trafficanalyzer.EnhancedTrafficAnalyzer.
+
+Captures already on disk can be analyzed offline:
+
+    python3 tcpanalysis.py ring.pcap0 ring.pcap1 ...
+"""
+
+from mininet.log import setLogLevel, info
+from capture import TCP, SYN, FIN, RST, ACK, Capture, packets
+from ifsampler import percentile
+from collections import OrderedDict, deque
+import sys
+
+
+def unwrap(reference, value):
+    """The unwrapped sequence number closest to reference of a 32-bit one"""
+    delta = (value - reference + 0x80000000) % 0x100000000 - 0x80000000
+    return reference + delta
+
+
+class Direction:
+    """Sequence space state of the data one endpoint sends"""
+
+    __slots__ = ('next_seq', 'acked', 'outstanding', 'gaps', 'rtts',
+                 'segments', 'retransmits', 'out_of_order', 'zero_windows',
+                 'zero_window', 'bytes', 'goodput')
+
+    def __init__(self, max_samples):
+        self.next_seq = None
+        self.acked = None
+        # [end, send time, retransmitted] of unacknowledged segments
+        self.outstanding = deque()
+        # (start, end) sequence ranges skipped by later segments
+        self.gaps = deque()
+        self.rtts = deque(maxlen=max_samples)
+        self.segments = 0
+        self.retransmits = 0
+        self.out_of_order = 0
+        self.zero_windows = 0
+        self.zero_window = False
+        self.bytes = 0
+        self.goodput = OrderedDict()
+
+
+class TcpAnalyzer:
+    """Streaming per-connection TCP analysis with bounded state"""
+
+    def __init__(self, max_flows=16384, max_outstanding=4096,
+                 max_samples=4096, bin_size=1.0, max_bins=3600,
+                 on_finish=None, client=None):
+        """max_flows: connections tracked at once; the least recently
+           seen one is finished to make room
+           max_outstanding: unacknowledged segments (and gaps) tracked
+           per direction
+           max_samples: newest RTT samples kept per direction
+           bin_size, max_bins: goodput bin width (seconds) and the
+           number of newest bins kept
+           on_finish: called with the summary of every connection that
+           is closed or evicted (default: kept in self.finished)
+           client: only track connections opened by this IP address"""
+        self.max_flows = max_flows
+        self.max_outstanding = max_outstanding
+        self.max_samples = max_samples
+        self.bin_size = bin_size
+        self.max_bins = max_bins
+        self.on_finish = on_finish
+        self.client = client
+        self.flows = OrderedDict()
+        # Connections of other clients, so later packets are not taken
+        # to start a connection of their own
+        self.ignored = OrderedDict()
+        self.finished = []
+        self.packets = 0
+
+    def _flow(self, packet):
+        """Return (key, flow) for a packet, creating the flow if new;
+           flow is None for a connection that is not tracked"""
+        a, b = (packet.src, packet.sport), (packet.dst, packet.dport)
+        key = a + b if a <= b else b + a
+        flow = self.flows.get(key)
+        if flow is None:
+            syn = packet.flags & (SYN | ACK)
+            if key in self.ignored and syn != SYN:
+                return key, None
+            # The sender of a lone SYN is the client; otherwise assume
+            # the first packet seen came from it
+            client, server = (b, a) if syn == (SYN | ACK) else (a, b)
+            if self.client is not None and client[0] != self.client:
+                self.ignored[key] = True
+                if len(self.ignored) > self.max_flows:
+                    self.ignored.popitem(last=False)
+                return key, None
+            self.ignored.pop(key, None)
+            if len(self.flows) >= self.max_flows:
+                self._finish(next(iter(self.flows)))
+            flow = self.flows[key] = {
+                'client': client, 'server': server, 'first': packet.time,
+                'last': packet.time, 'fins': set(),
+                client: Direction(self.max_samples),
+                server: Direction(self.max_samples)}
+        else:
+            self.flows.move_to_end(key)
+        flow['last'] = max(flow['last'], packet.time)
+        return key, flow
+
+    def add(self, packet):
+        """Account one packet; non-TCP packets are ignored"""
+        if packet.proto != TCP or packet.seq is None:
+            return
+        key, flow = self._flow(packet)
+        if flow is None:
+            return
+        self.packets += 1
+        sender = flow[(packet.src, packet.sport)]
+        receiver = flow[(packet.dst, packet.dport)]
+        flags = packet.flags
+        self._segment(sender, packet)
+        if flags & ACK:
+            self._ack(receiver, packet)
+        # The window is the space the sender of this packet has left
+        if packet.window == 0 and not flags & (SYN | FIN | RST):
+            if not receiver.zero_window:
+                receiver.zero_windows += 1
+            receiver.zero_window = True
+        else:
+            receiver.zero_window = False
+        if flags & RST:
+            self._finish(key)
+        elif flags & FIN:
+            flow['fins'].add((packet.src, packet.sport))
+            if len(flow['fins']) == 2:
+                self._finish(key)
+
+    def _segment(self, sender, packet):
+        """Classify a segment against what its sender sent before"""
+        length = packet.payload + bool(packet.flags & SYN) + \
+            bool(packet.flags & FIN)
+        if sender.next_seq is None:
+            sender.next_seq = packet.seq
+            sender.acked = packet.seq
+        seq = unwrap(sender.next_seq, packet.seq)
+        if length <= 0:
+            return
+        end = seq + length
+        sender.segments += 1
+        if seq >= sender.next_seq:
+            if seq > sender.next_seq:
+                # Segments were lost before the capture point or are late
+                self._bounded(sender.gaps, (sender.next_seq, seq))
+            sender.next_seq = end
+            self._bounded(sender.outstanding, [end, packet.time, False])
+            return
+        for i, (start, stop) in enumerate(sender.gaps):
+            if start <= seq < stop:
+                sender.out_of_order += 1
+                # Keep the gaps sorted: what is left replaces this one
+                del sender.gaps[i]
+                if end < stop:
+                    sender.gaps.insert(i, (end, stop))
+                if start < seq:
+                    sender.gaps.insert(i, (start, seq))
+                return
+        sender.retransmits += 1
+        for segment in sender.outstanding:
+            if segment[0] > seq:
+                segment[2] = True
+                if segment[0] >= end:
+                    break
+
+    def _bounded(self, queue, item):
+        queue.append(item)
+        if len(queue) > self.max_outstanding:
+            queue.popleft()
+
+    def _ack(self, sender, packet):
+        """Apply an acknowledgment of data sent by sender"""
+        if sender.next_seq is None:
+            return
+        ack = unwrap(sender.next_seq, packet.ack)
+        if ack <= sender.acked:
+            return
+        sender.bytes += ack - sender.acked
+        index = int(packet.time // self.bin_size)
+        sender.goodput[index] = sender.goodput.get(index, 0) + \
+            ack - sender.acked
+        while len(sender.goodput) > self.max_bins:
+            sender.goodput.popitem(last=False)
+        sender.acked = ack
+        newest = None
+        while sender.outstanding and sender.outstanding[0][0] <= ack:
+            newest = sender.outstanding.popleft()
+        if newest is not None and not newest[2]:
+            sender.rtts.append((packet.time - newest[1]) * 1000)
+        while sender.gaps and sender.gaps[0][1] <= ack:
+            sender.gaps.popleft()
+
+    def _finish(self, key):
+        summary = self._summarize(self.flows.pop(key))
+        if self.on_finish is not None:
+            self.on_finish(summary)
+        else:
+            self.finished.append(summary)
+
+    def _summarize(self, flow):
+        """Summary dict of one connection, one entry per direction"""
+        elapsed = max(flow['last'] - flow['first'], 1e-6)
+        summary = {'client': list(flow['client']),
+                   'server': list(flow['server']),
+                   'first': flow['first'], 'last': flow['last']}
+        for role in ('client', 'server'):
+            state = flow[flow[role]]
+            rtts = sorted(state.rtts)
+            summary[f'{role}_data'] = {
+                'segments': state.segments,
+                'bytes_acked': state.bytes,
+                'goodput_bps': state.bytes * 8 / elapsed,
+                'retransmits': state.retransmits,
+                'out_of_order': state.out_of_order,
+                'zero_windows': state.zero_windows,
+                'rtt_ms': {
+                    'samples': len(rtts),
+                    'min': rtts[0] if rtts else None,
+                    'mean': sum(rtts) / len(rtts) if rtts else None,
+                    'p99': percentile(rtts, 99),
+                    'max': rtts[-1] if rtts else None},
+                'goodput_series': [
+                    (index * self.bin_size, nbytes * 8 / self.bin_size)
+                    for index, nbytes in state.goodput.items()]}
+        return summary
+
+    def summaries(self):
+        """Summaries of finished connections and of those still open"""
+        return self.finished + [self._summarize(flow)
+                                for flow in self.flows.values()]
+
+    def read(self, path):
+        """Analyze every packet of a pcap file"""
+        for packet in packets(path):
+            self.add(packet)
+
+
+def data_direction(summary):
+    """The direction of a connection that carried more data"""
+    client, server = summary['client_data'], summary['server_data']
+    return client if client['bytes_acked'] >= server['bytes_acked'] \
+        else server
+
+
+class HostCaptures:
+    """TCP analysis captured on every host's own interface
+
+    Each host gets its own Capture, filtered to its own TCP traffic,
+    and a TcpAnalyzer that only tracks the connections the host opened,
+    so every connection is analyzed once, from the client's side.
+    """
+
+    def __init__(self, hosts, bpf='tcp', **capture_opts):
+        """bpf: filter of the packets captured on each host
+           capture_opts: passed to capture.Capture"""
+        self.analyzers = {}
+        self.captures = []
+        for host in hosts:
+            ip = host.IP()
+            analyzer = self.analyzers[ip] = TcpAnalyzer(client=ip)
+            self.captures.append(Capture(
+                [(host, host.defaultIntf().name)], sinks=[analyzer],
+                bpf=f'({bpf}) and (src host {ip} or dst host {ip})',
+                **capture_opts))
+
+    def start(self):
+        """Start capturing on every host"""
+        for capture in self.captures:
+            capture.start()
+
+    def stop(self):
+        """Stop capturing and analyze what is left"""
+        for capture in self.captures:
+            capture.stop()
+
+    def summaries(self):
+        """Summaries of the connections each host opened"""
+        return [summary for analyzer in self.analyzers.values()
+                for summary in analyzer.summaries()]
+
+
+def attach_to_tests(tests, summaries, hosts):
+    """Add the connections of each traffic test to its record
+
+    tests: EnhancedTrafficAnalyzer.traffic_log entries
+    hosts: {host name: IP address}
+    A connection belongs to a test when it went from the test's source
+    to the test's destination port and overlapped the test in time.
+    Matches are stored in test['tcp']; returns the tests matched.
+    """
+    matched = []
+    for test in tests:
+        src, dst = hosts.get(test['source']), hosts.get(test['destination'])
+        start = test.get('started') or test['timestamp']
+        connections = [
+            s for s in summaries
+            if s['client'][0] == src and s['server'][0] == dst and
+            s['server'][1] == test.get('port', s['server'][1]) and
+            s['first'] <= test['timestamp'] and s['last'] >= start]
+        if connections:
+            test['tcp'] = connections
+            matched.append(test)
+    return matched
+
+
+def format_summary(summary):
+    """One-line explanation of a connection's data direction"""
+    data = data_direction(summary)
+    rtt = data['rtt_ms']
+    text = f'{data["goodput_bps"] / 1e6:.2f} Mbits/sec goodput'
+    if rtt['samples']:
+        text += f', rtt mean {rtt["mean"]:.2f} p99 {rtt["p99"]:.2f} ms'
+    return (text + f', {data["retransmits"]} retransmits, '
+            f'{data["out_of_order"]} out of order, '
+            f'{data["zero_windows"]} zero windows')
+
+
+def report(summaries, top=20):
+    """Log the slowest connections with what slowed them down"""
+    info(f'*** {len(summaries)} TCP connections\n')
+    slowest = sorted(summaries,
+                     key=lambda s: data_direction(s)['goodput_bps'])
+    for s in slowest[:top]:
+        info(f'    {s["client"][0]}:{s["client"][1]} -> '
+             f'{s["server"][0]}:{s["server"][1]}  {format_summary(s)}\n')
+
+
+if __name__ == '__main__':
+    setLogLevel('info')
+    analyzer = TcpAnalyzer()
+    for path in sys.argv[1:]:
+        analyzer.read(path)
+    report(analyzer.summaries())
@@ -0,0 +1,111 @@
+"""Tests of CapacityPlanner's max-min fair water-filling"""
+
+from capacityplanner import CapacityPlanner
+from routingindex import RoutingIndex
+import math
+
+import pytest
+
+
+def planner(capacity, hosts, switches):
+    routes = RoutingIndex(hosts + switches, list(capacity),
+                          transit=switches)
+    return CapacityPlanner(routes, capacity)
+
+
+@pytest.fixture
+def dumbbell():
+    # h1, h2 and h4 on s1; h3 on s2.  s1-s2 is 10 Mbit/s and h2's
+    # access link 12 Mbit/s; every other link is unlimited.
+    return planner({('h1', 's1'): None, ('h2', 's1'): 12,
+                    ('h4', 's1'): None, ('s1', 's2'): 10,
+                    ('s2', 'h3'): None},
+                   ['h1', 'h2', 'h3', 'h4'], ['s1', 's2'])
+
+
+def test_water_filling(dumbbell):
+    a, b, c = dumbbell.predict([('h1', 'h3'), ('h2', 'h3'), ('h2', 'h4')])
+    # s1-s2 fills first at 5 each; h2's link then gives c what is left
+    assert a.rate == pytest.approx(5)
+    assert b.rate == pytest.approx(5)
+    assert c.rate == pytest.approx(7)
+    assert a.bottleneck == b.bottleneck == ('s1', 's2')
+    assert c.bottleneck == ('h2', 's1')
+    assert (a.isolated_rate, b.isolated_rate, c.isolated_rate) == (
+        10, 10, 12)
+
+
+def test_directions_are_separate(dumbbell):
+    there, back = dumbbell.predict([('h1', 'h3'), ('h3', 'h1')])
+    assert there.rate == back.rate == pytest.approx(10)
+
+
+def test_demand_limited(dumbbell):
+    a, b = dumbbell.predict([('h1', 'h3'), ('h2', 'h3')], demands=[2, None])
+    assert a.rate == pytest.approx(2)
+    assert a.bottleneck == 'demand'
+    assert a.demand == 2
+    assert b.rate == pytest.approx(8)
+    assert b.bottleneck == ('s1', 's2')
+
+
+def test_unlimited_and_unreachable():
+    plan = planner({('h1', 's1'): None, ('s1', 'h2'): None},
+                   ['h1', 'h2', 'h3'], ['s1'])
+    free, lost = plan.predict([('h1', 'h2'), ('h1', 'h3')])
+    assert math.isinf(free.rate)
+    assert free.bottleneck is None
+    assert lost.rate == 0.0
+    assert lost.isolated_rate == 0.0
+    assert lost.bottleneck is None
+
+
+def test_ecmp_paths_add_up():
+    plan = planner({('h1', 's1'): None, ('s1', 's2'): 10, ('s1', 's3'): 10,
+                    ('s2', 's4'): None, ('s3', 's4'): None,
+                    ('s4', 'h2'): None},
+                   ['h1', 'h2'], ['s1', 's2', 's3', 's4'])
+    flow, = plan.predict([('h1', 'h2')])
+    assert flow.rate == pytest.approx(20)
+    assert flow.isolated_rate == pytest.approx(20)
+
+
+def test_parallel_links_add_capacity():
+    plan = planner({('h1', 's1'): None, ('s1', 'h2'): 10, ('h2', 's1'): 5},
+                   ['h1', 'h2'], ['s1'])
+    flow, = plan.predict([('h1', 'h2')])
+    assert flow.rate == pytest.approx(15)
+
+
+class Node:
+    def __init__(self, name):
+        self.name = name
+
+
+class Intf:
+    def __init__(self, node, bw=None):
+        self.node = node
+        self.params = {'bw': bw} if bw else {}
+
+
+class Link:
+    def __init__(self, a, b, bw=None):
+        self.intf1, self.intf2 = Intf(a, bw), Intf(b, bw)
+
+
+class Net:
+    def __init__(self, hosts, switches, links):
+        self.hosts, self.switches, self.links = hosts, switches, links
+
+
+def test_from_net_sums_parallel_links():
+    h1, h2, s1, s2 = Node('h1'), Node('h2'), Node('s1'), Node('s2')
+    net = Net([h1, h2], [s1, s2],
+              [Link(h1, s1), Link(s1, s2, 10), Link(s1, s2, 5),
+               Link(s2, h2)])
+    flow, = CapacityPlanner.from_net(net).predict([('h1', 'h2')])
+    assert flow.rate == pytest.approx(15)
+    # An unshaped parallel link lifts the limit
+    net.links.append(Link(s1, s2))
+    flow, = CapacityPlanner.from_net(net).predict([('h1', 'h2')])
+    assert math.isinf(flow.rate)
@@ -0,0 +1,113 @@
+"""Tests of iperfparser against captured iperf and iperf3 output"""
+
+from iperfparser import IperfParser, parse_iperf
+import os
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def test_iperf2_tcp():
+    result = parse_iperf(fixture('iperf2_tcp.txt'))
+    assert result.format == 'text'
+    assert [(r.start, r.end) for r in result.series()] == [
+        (0.0, 1.0), (1.0, 2.0), (2.0, 3.0)]
+    assert result.series()[0].bits_per_second == pytest.approx(9.44e6)
+    assert result.series()[0].bytes == int(1.12 * 1024 ** 2)
+    summary = result.summary
+    assert (summary.start, summary.end) == (0.0, 3.1)
+    assert summary.bits_per_second == pytest.approx(9.15e6)
+    assert summary.retransmits is None
+
+
+def test_iperf2_udp_server_report():
+    result = parse_iperf(fixture('iperf2_udp.txt'))
+    assert len(result.series()) == 2
+    summary = result.summary
+    assert summary.bits_per_second == pytest.approx(4.99e6)
+    assert summary.jitter_ms == pytest.approx(0.021)
+    assert (summary.lost, summary.packets) == (3, 852)
+
+
+def test_iperf2_csv():
+    result = parse_iperf(fixture('iperf2_csv.txt'))
+    assert result.format == 'csv'
+    assert len(result.series()) == 2
+    assert (result.summary.start, result.summary.end) == (0.0, 2.0)
+    assert result.summary.bytes == 2359296
+
+
+def test_iperf3_text_keeps_sender_retransmits():
+    result = parse_iperf(fixture('iperf3_tcp.txt'))
+    assert [r.retransmits for r in result.series()] == [2, 1]
+    summary = result.summary
+    assert summary.role == 'receiver'
+    assert summary.end == 2.05
+    assert summary.bits_per_second == pytest.approx(9.21e6)
+    assert summary.retransmits == 3
+
+
+def test_iperf3_json_keeps_sender_retransmits():
+    result = parse_iperf(fixture('iperf3_tcp.json'))
+    assert result.format == 'json'
+    assert [r.bits_per_second for r in result.series()] == [1e7, 9e6]
+    summary = result.summary
+    assert summary.role == 'receiver'
+    assert summary.bytes == 2300000
+    assert summary.retransmits == 3
+
+
+def test_incremental_feed_matches_whole_output():
+    output = fixture('iperf3_tcp.txt')
+    parser = IperfParser()
+    records = []
+    for i in range(0, len(output), 7):
+        records.extend(parser.feed(output[i:i + 7]))
+    result = parser.close()
+    assert records == result.intervals + result.summaries
+    assert result.summary == parse_iperf(output).summary
+
+
+def test_truncated_run_uses_longest_interval():
+    # The client was killed before printing its summary
+    lines = fixture('iperf2_tcp.txt').splitlines(True)
+    result = parse_iperf(''.join(lines[:9]))
+    assert len(result.series()) == 3
+    assert result.summary.is_summary
+    assert (result.summary.start, result.summary.end) == (2.0, 3.0)
+
+
+def test_truncated_mid_line():
+    output = fixture('iperf3_tcp.txt')
+    cut = output.index('sender') - 20
+    result = parse_iperf(output[:cut])
+    assert [r.retransmits for r in result.series()] == [2, 1]
+    assert result.summary.end == 2.0
+
+
+def test_run_shorter_than_one_interval():
+    result = parse_iperf(
+        '[  3]  0.0- 0.5 sec   576 KBytes  9.44 Mbits/sec\n')
+    assert result.summary.end == 0.5
+    assert result.summary.is_summary
+
+
+def test_truncated_json_document():
+    output = fixture('iperf3_tcp.json')
+    result = parse_iperf(output[:len(output) // 2])
+    assert result.format == 'json'
+    assert result.summary is None
+    assert result.intervals == []
+
+
+def test_empty_output():
+    result = parse_iperf('')
+    assert result.summary is None
+    assert result.to_dict()['intervals'] == []
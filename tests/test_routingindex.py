@@ -0,0 +1,78 @@
+"""Tests of RoutingIndex shortest paths and ECMP"""
+
+from routingindex import RoutingIndex
+
+import pytest
+
+# h1 - s1 = {s2, s3} = s4 - h2, plus h3 on s1
+DIAMOND = (['h1', 'h2', 'h3', 's1', 's2', 's3', 's4'],
+           [('h1', 's1'), ('h3', 's1'), ('s1', 's2'), ('s1', 's3'),
+            ('s2', 's4'), ('s3', 's4'), ('s4', 'h2')],
+           ['s1', 's2', 's3', 's4'])
+
+
+@pytest.fixture
+def diamond():
+    nodes, edges, switches = DIAMOND
+    return RoutingIndex(nodes, edges, transit=switches)
+
+
+def test_distance_and_path(diamond):
+    assert diamond.distance('h1', 'h2') == 4
+    assert diamond.distance('h1', 'h1') == 0
+    path = diamond.path('h1', 'h2')
+    assert path[0] == 'h1' and path[-1] == 'h2'
+    assert path[2] in ('s2', 's3')
+    assert diamond.validate_shortest([path]) == [True]
+
+
+def test_ecmp(diamond):
+    assert diamond.ecmp_count('h1', 'h2') == 2
+    assert sorted(diamond.ecmp_paths('h1', 'h2')) == [
+        ['h1', 's1', 's2', 's4', 'h2'], ['h1', 's1', 's3', 's4', 'h2']]
+    assert len(diamond.ecmp_paths('h1', 'h2', limit=1)) == 1
+    assert sorted(diamond.nexthops('s1', 'h2')) == ['s2', 's3']
+
+
+def test_ecmp_link_fractions(diamond):
+    links = diamond.links_for('h1', 'h2', ecmp=True)
+    assert links == {('h1', 's1'): 1.0, ('s1', 's2'): 0.5,
+                     ('s1', 's3'): 0.5, ('s2', 's4'): 0.5,
+                     ('s3', 's4'): 0.5, ('s4', 'h2'): 1.0}
+
+
+def test_link_loads(diamond):
+    loads = diamond.link_loads([('h1', 'h2', 10), ('h3', 'h2', 4)])
+    assert loads[('s1', 's2')] == loads[('s1', 's3')] == 7
+    assert loads[('s4', 'h2')] == 14
+    assert loads[('h3', 's1')] == 4
+
+
+def test_hosts_do_not_forward():
+    # s1 and s2 are only joined through host hx
+    index = RoutingIndex(['h1', 'hx', 'h2', 's1', 's2'],
+                         [('h1', 's1'), ('s1', 'hx'), ('hx', 's2'),
+                          ('s2', 'h2')], transit=['s1', 's2'])
+    assert index.distance('h1', 'h2') is None
+    assert index.path('h1', 'h2') is None
+    assert index.ecmp_paths('h1', 'h2') == []
+    assert index.ecmp_count('h1', 'h2') == 0
+    assert index.distance('h1', 'hx') == 2
+
+
+def test_parallel_links_collapse():
+    index = RoutingIndex(['a', 'b'], [('a', 'b'), ('b', 'a'), ('a', 'b')])
+    assert index.ecmp_count('a', 'b') == 1
+
+
+def test_validate(diamond):
+    assert diamond.validate([
+        ['h1', 's1', 's2', 's4', 'h2'],
+        ['h1', 's2', 's4', 'h2'],
+        ['h1', 's1', 'nowhere'],
+        ['h1'],
+    ]) == [True, False, False, True]
+    # Valid but longer than the shortest path
+    detour = ['h1', 's1', 's2', 's4', 's3', 's1', 'h3']
+    assert diamond.validate([detour]) == [True]
+    assert diamond.validate_shortest([detour]) == [False]
@@ -0,0 +1,82 @@
+"""Tests of shortflows' flow size distributions and FCT buckets"""
+
+from shortflows import (MSS, SIZE_CDFS, SizeDistribution, client_command,
+                        fct_buckets)
+import random
+
+import pytest
+
+
+@pytest.mark.parametrize('name', sorted(SIZE_CDFS))
+def test_samples_stay_within_cdf(name):
+    distribution = SizeDistribution.named(name)
+    rng = random.Random(1)
+    sizes = [distribution.sample(rng) for _ in range(20000)]
+    assert min(sizes) >= SIZE_CDFS[name][0][0] * MSS
+    assert max(sizes) <= SIZE_CDFS[name][-1][0] * MSS
+
+
+def test_samples_respect_cap():
+    distribution = SizeDistribution.named('web-search', max_size=100000)
+    rng = random.Random(2)
+    sizes = [distribution.sample(rng) for _ in range(20000)]
+    assert max(sizes) == 100000
+    assert min(sizes) >= MSS
+
+
+def test_fixed_size():
+    distribution = SizeDistribution.named('fixed:5000')
+    assert {distribution.sample() for _ in range(100)} == {5000}
+    assert distribution.mean() == 5000
+
+
+def test_cdf_must_end_at_one():
+    with pytest.raises(ValueError):
+        SizeDistribution([(100, 0.0), (200, 0.5)])
+
+
+def test_mean_uniform():
+    assert SizeDistribution([(0, 0.0), (100, 1.0)]).mean() == 50
+
+
+def test_mean_under_cap():
+    # min(x, 40) for x uniform in [0, 100]: 0.4 * 20 + 0.6 * 40
+    distribution = SizeDistribution([(0, 0.0), (100, 1.0)], max_size=40)
+    assert distribution.mean() == pytest.approx(32)
+
+
+@pytest.mark.parametrize('name', sorted(SIZE_CDFS))
+def test_capped_mean_matches_samples(name):
+    cap = 200000
+    distribution = SizeDistribution.named(name, max_size=cap)
+    rng = random.Random(3)
+    n = 200000
+    sampled = sum(distribution.sample(rng) for _ in range(n)) / n
+    assert distribution.mean() <= cap
+    assert distribution.mean() < SizeDistribution.named(name).mean()
+    assert sampled == pytest.approx(distribution.mean(), rel=0.03)
+
+
+def test_bucket_assignment():
+    flows = [(1, 1.0), (9999, 2.0), (10000, 3.0), (99999, 4.0),
+             (100000, 5.0), (999999, 6.0), (1000000, 7.0), (5e6, 8.0)]
+    buckets = fct_buckets(flows)
+    assert list(buckets) == ['<10KB', '10KB-100KB', '100KB-1MB', '>1MB']
+    assert [buckets[name]['count'] for name in buckets] == [2, 2, 2, 2]
+    assert buckets['<10KB']['peak'] == 2.0
+    assert buckets['10KB-100KB']['min'] == 3.0
+    assert buckets['>1MB']['mean'] == 7.5
+
+
+def test_empty_buckets():
+    buckets = fct_buckets([])
+    assert all(data is None for data in buckets.values())
+
+
+def test_client_command_keeps_arguments_intact():
+    args = client_command(['10.0.0.2:80', '10.0.0.3:80'], '/tmp/my cdf.json',
+                          rate=2.5, max_size=1000)
+    assert args[args.index('--cdf') + 1] == '/tmp/my cdf.json'
+    assert args[args.index('--targets') + 1:][:2] == ['10.0.0.2:80',
+                                                      '10.0.0.3:80']
+    assert args[-2:] == ['--max-size', '1000']
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Scalable parameterized topologies and a phased, batched network builder
+
+The Topo classes generate star, linear, tree, leaf-spine and fat-tree
+topologies of any size.  build_network() brings them up phase by phase,
+applying tc shaping for all TCLink interfaces in parallel batches (one
+shell round-trip per node instead of one per tc command), and returns a
+timing breakdown of every phase.
+
+Usage with mn:  sudo mn --custom topobuilder.py --topo leafspine,2,4,8
+"""
+
+from mininet.net import Mininet
+from mininet.node import Controller, OVSKernelSwitch
+from mininet.link import Intf, TCIntf, TCLink
+from mininet.topo import Topo
+from mininet.log import setLogLevel, info, error
+from fanout import fanout
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import groupby
+import time
+
+
+class StarTopo(Topo):
+    """n hosts on a single switch"""
+
+    def build(self, n=4, host_link=None, switch_link=None):
+        switch = self.addSwitch('s1')
+        for i in range(1, n + 1):
+            self.addLink(self.addHost(f'h{i}'), switch, **(host_link or {}))
+
+
+class LinearTopo(Topo):
+    """A chain of k switches with n hosts on each switch"""
+
+    def build(self, k=3, n=1, host_link=None, switch_link=None):
+        previous = None
+        for i in range(1, k + 1):
+            switch = self.addSwitch(f's{i}')
+            for j in range(1, n + 1):
+                host = self.addHost(f'h{(i - 1) * n + j}')
+                self.addLink(host, switch, **(host_link or {}))
+            if previous:
+                self.addLink(previous, switch, **(switch_link or {}))
+            previous = switch
+
+
+class TreeTopo(Topo):
+    """A tree of switches of given depth and fanout, hosts at the leaves"""
+
+    def build(self, depth=2, fanout=2, host_link=None, switch_link=None):
+        self.hostCount = self.switchCount = 0
+        self._addTree(depth, fanout, host_link or {}, switch_link or {})
+
+    def _addTree(self, depth, fanout, host_link, switch_link):
+        """Add a subtree and return its root node"""
+        if depth == 0:
+            self.hostCount += 1
+            return self.addHost(f'h{self.hostCount}')
+        self.switchCount += 1
+        switch = self.addSwitch(f's{self.switchCount}')
+        for _ in range(fanout):
+            child = self._addTree(depth - 1, fanout, host_link, switch_link)
+            opts = host_link if depth == 1 else switch_link
+            self.addLink(switch, child, **opts)
+        return switch
+
+
+class LeafSpineTopo(Topo):
+    """Every leaf connects to every spine; n hosts per leaf"""
+
+    def build(self, spines=2, leaves=4, n=4, host_link=None,
+              switch_link=None):
+        spine_switches = [self.addSwitch(f's{i}')
+                          for i in range(1, spines + 1)]
+        host = 0
+        for i in range(1, leaves + 1):
+            leaf = self.addSwitch(f's{spines + i}')
+            for spine in spine_switches:
+                self.addLink(leaf, spine, **(switch_link or {}))
+            for _ in range(n):
+                host += 1
+                self.addLink(self.addHost(f'h{host}'), leaf,
+                             **(host_link or {}))
+
+
+class FatTreeTopo(Topo):
+    """k-ary fat tree: (k/2)^2 core switches, k pods, k^3/4 hosts"""
+
+    def build(self, k=4, host_link=None, switch_link=None):
+        if k % 2:
+            raise ValueError('fat-tree arity k must be even')
+        half = k // 2
+        switch_link = switch_link or {}
+        count = iter(range(1, 5 * k * k // 4 + 1))
+        core = [self.addSwitch(f's{next(count)}') for _ in range(half * half)]
+        host = 0
+        for _pod in range(k):
+            aggs = [self.addSwitch(f's{next(count)}') for _ in range(half)]
+            edges = [self.addSwitch(f's{next(count)}') for _ in range(half)]
+            for i, agg in enumerate(aggs):
+                for j in range(half):
+                    self.addLink(agg, core[i * half + j], **switch_link)
+                for edge in edges:
+                    self.addLink(edge, agg, **switch_link)
+            for edge in edges:
+                for _ in range(half):
+                    host += 1
+                    self.addLink(self.addHost(f'h{host}'), edge,
+                                 **(host_link or {}))
+
+
+class BatchTCIntf(TCIntf):
+    """TCIntf whose tc configuration is deferred to apply_tc_batches()
+
+    While deferred, config() only sets MAC/IP/up and remembers the
+    shaping parameters, so link creation and OVS port attachment do not
+    run tc one command at a time.
+    """
+
+    deferred = True
+
+    def config(self, **params):
+        if self.deferred:
+            return Intf.config(self, **params)
+        return TCIntf.config(self, **params)
+
+    def tcCommands(self):
+        """Return the shell commands that TCIntf.config() would run"""
+        params = self.params
+        gro = not params.get('disable_gro', not params.get('gro', False))
+        # ethtool reports changed dependent features even on success
+        cmds = ['ethtool -K %s gro %s tx %s rx %s >/dev/null 2>&1' % (
+            self, 'on' if gro else 'off',
+            'on' if params.get('txo', True) else 'off',
+            'on' if params.get('rxo', True) else 'off')]
+        bw = params.get('bw')
+        if (bw is None and not params.get('delay') and
+                not params.get('loss') and
+                params.get('max_queue_size') is None):
+            return cmds
+        bwcmds, parent = self.bwCmds(
+            bw=bw, speedup=params.get('speedup', 0),
+            use_hfsc=params.get('use_hfsc', False),
+            use_tbf=params.get('use_tbf', False),
+            latency_ms=params.get('latency_ms'),
+            enable_ecn=params.get('enable_ecn', False),
+            enable_red=params.get('enable_red', False))
+        delaycmds, parent = self.delayCmds(
+            parent, delay=params.get('delay'), jitter=params.get('jitter'),
+            loss=params.get('loss'),
+            max_queue_size=params.get('max_queue_size'))
+        cmds.append('tc qdisc del dev %s root 2>/dev/null' % self)
+        # tc is silent on success; name the command that failed
+        cmds += ['{0} || echo "failed: {0}"'.format(cmd % ('tc', self))
+                 for cmd in bwcmds + delaycmds]
+        return cmds
+
+
+def apply_tc_batches(intfs, batch_size=64, timeout=None):
+    """Apply deferred tc configuration, one shell command per node
+
+    Nodes are configured concurrently through fanout() in waves of
+    batch_size nodes.  Returns the number of interfaces configured;
+    raises RuntimeError naming the nodes where tc failed.
+    """
+    intfs = [intf for intf in intfs
+             if isinstance(intf, BatchTCIntf) and intf.deferred]
+    intfs.sort(key=lambda intf: intf.node.name)
+    commands = {}
+    for node, node_intfs in groupby(intfs, key=lambda intf: intf.node):
+        commands[node] = ' ; '.join(
+            cmd for intf in node_intfs for cmd in intf.tcCommands())
+    nodes = list(commands)
+    failed = []
+    for start in range(0, len(nodes), batch_size):
+        batch = {node: commands[node]
+                 for node in nodes[start:start + batch_size]}
+        for node, result in fanout(batch, timeout).items():
+            if result.output.strip() or result.timed_out:
+                error(f'*** tc on {node.name}: {result.output}\n')
+                failed.append(node.name)
+    for intf in intfs:
+        intf.deferred = False
+    if failed:
+        raise RuntimeError(f'tc failed on {", ".join(sorted(failed))}')
+    return len(intfs)
+
+
+@contextmanager
+def phase(timings, name):
+    """Record the wall time of a bring-up phase in timings[name]"""
+    info(f'*** Phase: {name}\n')
+    start = time.monotonic()
+    yield
+    timings[name] = time.monotonic() - start
+
+
+def build_network(topo, switch=OVSKernelSwitch, controller=Controller,
+                  link=TCLink, batch_size=64, wait_connected=True,
+                  timeout=None, controllers=None, **mnopts):
+    """Build and start a Mininet network from topo, phase by phase
+
+    controllers: optional list of dicts of net.addController() arguments
+                 used instead of a single default controller; switches
+                 whose params name 'controllers' only connect to those
+    returns: (net, timings) where timings is an OrderedDict of
+             phase name -> seconds
+    """
+    timings = OrderedDict()
+    total = time.monotonic()
+    net = Mininet(topo=None, switch=switch, controller=controller,
+                  link=link, build=False, **mnopts)
+
+    with phase(timings, 'namespaces'):
+        if controllers is not None:
+            for params in controllers:
+                net.addController(**params)
+        elif controller:
+            net.addController('c0')
+        for name in topo.hosts():
+            net.addHost(name, **topo.nodeInfo(name))
+        for name in topo.switches():
+            params = topo.nodeInfo(name)
+            cls = params.get('cls', net.switch)
+            if hasattr(cls, 'batchStartup'):
+                params.setdefault('batch', True)
+            net.addSwitch(name, **params)
+
+    # Veth pairs plus host IP/MAC configuration
+    with phase(timings, 'veths'):
+        for _src, _dst, params in topo.links(sort=True, withInfo=True):
+            params = dict(params)
+            cls = params.get('cls', net.link)
+            if issubclass(cls, TCLink):
+                params.setdefault('cls1', BatchTCIntf)
+                params.setdefault('cls2', BatchTCIntf)
+            net.addLink(**params)
+        net.configHosts()
+        if net.autoStaticArp:
+            net.staticArp()
+        net.built = True
+
+    with phase(timings, 'switch attach'):
+        for c in net.controllers:
+            c.start()
+        for sw in net.switches:
+            wanted = sw.params.get('controllers')
+            sw.start([c for c in net.controllers
+                      if wanted is None or c.name in wanted])
+        for swclass, switches in groupby(
+                sorted(net.switches, key=lambda s: str(type(s))), type):
+            if hasattr(swclass, 'batchStartup'):
+                swclass.batchStartup(tuple(switches))
+
+    with phase(timings, 'tc setup'):
+        intfs = [intf for l in net.links for intf in (l.intf1, l.intf2)]
+        try:
+            apply_tc_batches(intfs, batch_size=batch_size)
+        except RuntimeError:
+            net.stop()
+            raise
+
+    with phase(timings, 'controller connect'):
+        if wait_connected and net.controllers:
+            net.waitConnected(timeout=timeout)
+
+    timings['total'] = time.monotonic() - total
+    return net, timings
+
+
+def report_timings(timings):
+    """Log a phase-by-phase bring-up breakdown"""
+    info('*** Bring-up timing breakdown\n')
+    for name, seconds in timings.items():
+        info(f'    {name:<20} {seconds:8.3f} s\n')
+
+
+topos = {'star': StarTopo, 'linear': LinearTopo, 'tree': TreeTopo,
+         'leafspine': LeafSpineTopo, 'fattree': FatTreeTopo}
+
+
+if __name__ == '__main__':
+    setLogLevel('info')
+    topo = LeafSpineTopo(spines=2, leaves=4, n=4,
+                         host_link=dict(bw=50, delay='2ms'),
+                         switch_link=dict(bw=100))
+    net, timings = build_network(topo)
+    report_timings(timings)
+    net.pingAll()
+    net.stop()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Compiled-topology cache
+
+compile_topo() turns a Topo into a fully resolved plan: every node with
+its explicit IP, dpid (and MAC with autoSetMacs), every link with
+explicit port numbers, interface names and parameters.  The plan is
+validated once and stored on disk, together with the Topo rebuilt from
+it, under a key derived from the topology's source (Topo class, the
+source of every module its class hierarchy is defined in and its
+arguments, or a project file's bytes).  The Topo is stored pickled:
+loading it is several times faster than running the topology's build()
+again, so re-launching an unchanged topology skips both planning and
+validation and goes straight to creating namespaces and links.
+
+    cache = TopoCache()
+    topo = cache.topo(LeafSpineTopo, spines=4, leaves=16, n=16)
+    net, timings = build_network(topo)
+"""
+
+from mininet.topo import Topo
+from mininet.util import ipAdd, macColonHex, netParse
+from mininet.log import setLogLevel, info
+from projectloader import IFNAMSIZ, Project, load_project
+from topobuilder import LeafSpineTopo
+import hashlib
+import importlib
+import inspect
+import ipaddress
+import json
+import os
+import pickle
+import re
+import sys
+import time
+
+# Bump when the plan layout changes so stale cache entries are ignored
+PLAN_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'mininet-topos')
+
+
+class PlanError(ValueError):
+    """Raised when a topology cannot be compiled into a valid plan"""
+
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__('invalid topology:\n  ' + '\n  '.join(problems))
+
+
+def _encode(value):
+    """Make a parameter value JSON-serializable; classes become paths"""
+    if inspect.isclass(value):
+        return {'__class__': f'{value.__module__}:{value.__qualname__}'}
+    if isinstance(value, dict):
+        return {key: _encode(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f'cannot cache parameter value {value!r}')
+
+
+def load_class(name):
+    """Import a class named 'module:QualifiedName'"""
+    module, _, qualname = name.partition(':')
+    obj = importlib.import_module(module)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _decode(value):
+    """Inverse of _encode()"""
+    if isinstance(value, dict):
+        if set(value) == {'__class__'}:
+            return load_class(value['__class__'])
+        return {key: _decode(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def compile_topo(topo, ipBase='10.0.0.0/8', autoSetMacs=False):
+    """Resolve everything Mininet would derive from topo into a plan
+
+    IPs are assigned in host order exactly as Mininet.addHost() would,
+    and MACs too when autoSetMacs is set (otherwise they stay random,
+    as without the cache); dpids are derived from switch names and
+    interface names from port numbers.  Raises PlanError if the result
+    is inconsistent.
+    """
+    ipBaseNum, prefixLen = netParse(ipBase)
+    problems = []
+    nodes = []
+    next_ip = 1
+    for name in topo.nodes():
+        params = dict(topo.nodeInfo(name))
+        switch = params.pop('isSwitch', False)
+        if switch:
+            if not params.get('dpid'):
+                nums = re.findall(r'\d+', name)
+                if nums:
+                    params['dpid'] = '%016x' % int(nums[0])
+                else:
+                    problems.append(f'switch {name} has no dpid and no '
+                                    'number in its name')
+        else:
+            params.setdefault('ip', ipAdd(next_ip, ipBaseNum=ipBaseNum,
+                                          prefixLen=prefixLen) +
+                              f'/{prefixLen}')
+            if autoSetMacs:
+                params.setdefault('mac', macColonHex(next_ip))
+            next_ip += 1
+        try:
+            params = _encode(params)
+        except TypeError as e:
+            problems.append(f'{name}: {e}')
+        nodes.append({'name': name, 'switch': switch, 'params': params})
+
+    links = []
+    for node1, node2, opts in topo.links(sort=True, withInfo=True):
+        opts = dict(opts)
+        opts.setdefault('intfName1', f'{node1}-eth{opts["port1"]}')
+        opts.setdefault('intfName2', f'{node2}-eth{opts["port2"]}')
+        try:
+            opts = _encode(opts)
+        except TypeError as e:
+            problems.append(f'link {node1}-{node2}: {e}')
+        links.append(opts)
+
+    plan = {'version': PLAN_VERSION, 'ipBase': ipBase,
+            'autoSetMacs': autoSetMacs, 'nodes': nodes, 'links': links}
+    problems += validate_plan(plan)
+    if problems:
+        raise PlanError(problems)
+    return plan
+
+
+def validate_plan(plan):
+    """Return a list of problems with a plan (empty when valid)"""
+    problems = []
+    kinds = {}
+    for node in plan['nodes']:
+        if node['name'] in kinds:
+            problems.append(f'duplicate node {node["name"]}')
+        kinds[node['name']] = node['switch']
+    ips = {}
+    for node in plan['nodes']:
+        ip = node['params'].get('ip')
+        if node['switch'] or not ip:
+            continue
+        try:
+            addr = ipaddress.ip_interface(ip).ip
+        except ValueError:
+            problems.append(f'{node["name"]} has invalid IP {ip}')
+            continue
+        if addr in ips:
+            problems.append(f'{node["name"]} and {ips[addr]} share IP {addr}')
+        ips[addr] = node['name']
+    ports = set()
+    # Host interfaces live in their host's namespace; switch interfaces
+    # share the root namespace
+    intf_names = set()
+    for link in plan['links']:
+        for end in ('1', '2'):
+            name = link[f'node{end}']
+            if name not in kinds:
+                problems.append(f'link end {name} is not a node')
+                continue
+            port = (name, link[f'port{end}'])
+            if port in ports:
+                problems.append(f'port {port[1]} of {name} is used twice')
+            ports.add(port)
+            intf = link[f'intfName{end}']
+            if len(intf) > IFNAMSIZ:
+                problems.append(f'interface name {intf} is longer than '
+                                f'{IFNAMSIZ} characters')
+            scope = None if kinds[name] else name
+            if (scope, intf) in intf_names:
+                problems.append(f'interface name {intf} is used twice')
+            intf_names.add((scope, intf))
+    return problems
+
+
+class PlanTopo(Topo):
+    """Topo rebuilt from a compiled plan, with every value explicit"""
+
+    def build(self, plan):
+        for node in plan['nodes']:
+            params = _decode(node['params'])
+            if node['switch']:
+                self.addSwitch(node['name'], **params)
+            else:
+                self.addHost(node['name'], **params)
+        for opts in plan['links']:
+            opts = _decode(opts)
+            self.addLink(opts.pop('node1'), opts.pop('node2'),
+                         opts.pop('port1'), opts.pop('port2'), **opts)
+
+
+def source_hash(cls):
+    """sha256 over the source of every module defining a class in the MRO
+
+    Editing the topology class, a base class or anything else in their
+    modules changes the hash.  Helpers imported from other modules and
+    called by build() are not covered.
+    """
+    digest = hashlib.sha256()
+    paths = []
+    for base in cls.__mro__:
+        try:
+            path = inspect.getsourcefile(base)
+        except TypeError:
+            # Built-in classes such as object have no source
+            continue
+        if path and path not in paths:
+            paths.append(path)
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class TopoCache:
+    """On-disk cache of compiled plans and their Topos
+
+    Entries are pickles, so the cache directory must only be writable
+    by the user running Mininet.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ipBase='10.0.0.0/8',
+                 autoSetMacs=False):
+        """ipBase, autoSetMacs: as given to Mininet, whose IP and MAC
+           assignment the plans reproduce"""
+        self.directory = directory
+        self.ipBase = ipBase
+        self.autoSetMacs = autoSetMacs
+        self.hits = self.misses = 0
+
+    def _key(self, source):
+        """Cache key for a JSON-serializable description of the source"""
+        data = json.dumps({'version': PLAN_VERSION, 'ipBase': self.ipBase,
+                           'autoSetMacs': self.autoSetMacs,
+                           'source': source}, sort_keys=True, default=repr)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pickle')
+
+    def get(self, key):
+        """Return the cached entry for key, or None if absent or corrupt
+
+        An entry is a dict with the PlanTopo built from the plan (or,
+        for projects, the Project) and the plan itself, pickled on its
+        own so that loading the Topo does not pay for it.
+        """
+        try:
+            with open(self._path(key), 'rb') as f:
+                stored = pickle.load(f)
+            if stored['hash'] != hashlib.sha256(
+                    stored['payload']).hexdigest():
+                return None
+            return pickle.loads(stored['payload'])
+        except (OSError, pickle.UnpicklingError, AttributeError,
+                ImportError, EOFError, KeyError, TypeError):
+            return None
+
+    def put(self, key, entry):
+        """Store an entry atomically"""
+        os.makedirs(self.directory, exist_ok=True)
+        payload = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp = f'{self._path(key)}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({'key': key, 'created': time.time(),
+                         'hash': hashlib.sha256(payload).hexdigest(),
+                         'payload': payload}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+
+    def _lookup(self, key, compile_fn):
+        """Return the cached entry for key, compiling it on a miss"""
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = compile_fn()
+        self.put(key, entry)
+        return entry
+
+    def _entry(self, cls, args, kwargs):
+        """Cache entry for cls(*args, **kwargs)
+
+        The key covers the class, its arguments and the source of the
+        modules of its class hierarchy (see source_hash()).
+        """
+        key = self._key({'class': f'{cls.__module__}:{cls.__qualname__}',
+                         'code': source_hash(cls), 'args': args,
+                         'kwargs': kwargs})
+
+        def compile_class():
+            plan = compile_topo(cls(*args, **kwargs), self.ipBase,
+                                self.autoSetMacs)
+            return {'plan': pickle.dumps(plan), 'topo': PlanTopo(plan)}
+
+        return self._lookup(key, compile_class)
+
+    def plan(self, cls, *args, **kwargs):
+        """Return the plan for cls(*args, **kwargs)"""
+        return pickle.loads(self._entry(cls, args, kwargs)['plan'])
+
+    def topo(self, cls, *args, **kwargs):
+        """Return a PlanTopo for cls(*args, **kwargs), using the cache"""
+        return self._entry(cls, args, kwargs)['topo']
+
+    def project(self, path):
+        """Return a Project for a project file, using the cache
+
+        The key is the hash of the file's bytes; controllers and the
+        start script are cached together with the plan.
+        """
+        with open(path, 'rb') as f:
+            key = self._key({'project': hashlib.sha256(f.read()).hexdigest()})
+
+        def compile_project():
+            project = load_project(path)
+            plan = compile_topo(project.topo, self.ipBase, self.autoSetMacs)
+            return {'plan': pickle.dumps(plan), 'project': Project(
+                project.name, PlanTopo(plan), project.controllers,
+                project.start_script)}
+
+        return self._lookup(key, compile_project)['project']
+
+    def clear(self):
+        """Remove every cached plan"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                os.unlink(os.path.join(self.directory, name))
+
+
+if __name__ == '__main__':
+    setLogLevel('info')
+    cache = TopoCache()
+    args = [int(a) for a in sys.argv[1:4]] or [4, 16, 16]
+    start = time.monotonic()
+    LeafSpineTopo(*args)
+    info(f'*** without cache: built in '
+         f'{(time.monotonic() - start) * 1000:.1f} ms\n')
+    for attempt in ('first', 'second'):
+        start = time.monotonic()
+        topo = cache.topo(LeafSpineTopo, *args)
+        info(f'*** {attempt}: {len(topo.hosts())} hosts planned in '
+             f'{(time.monotonic() - start) * 1000:.1f} ms '
+             f'(hits={cache.hits} misses={cache.misses})\n')
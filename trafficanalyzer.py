@@ -3,23 +3,81 @@
 Enhanced Mininet Traffic Analysis with Real-time Monitoring
 """
 
-from mininet.net import Mininet
 from mininet.node import Controller, OVSKernelSwitch
 from mininet.cli import CLI
 from mininet.log import setLogLevel, info
 from mininet.link import TCLink
+from mininet.util import pmonitor
+from iperfparser import IperfParser, parse_iperf
+from ifsampler import InterfaceSampler
+from qdiscstats import QdiscCollector
+from topobuilder import StarTopo, build_network, report_timings
+from capacityplanner import CapacityPlanner, compare
+from latencyprobe import probe, report as report_latency
+from resultstore import RunStore
+from metricsstore import MetricsStore
+from metricsexport import MetricsExporter
+from cpuplacement import CpuWatchdog, place_hosts
+from tcpanalysis import (HostCaptures, attach_to_tests, data_direction,
+                         format_summary)
+from httpload import start_server
+from shortflows import FlowParser, SizeDistribution, client_command
+from collections import deque
+from itertools import chain
+import os
+import shlex
+import subprocess
 import time
 import json
+import numpy as np
+
+# Sending rate of UDP tests
+UDP_RATE_MBPS = 5
+
+# Short flows of HTTP-like tests: flow size mix, flow arrivals per
+# second and a size cap that lets the heavy tail finish within a test
+HTTP_CDF = 'web-search'
+HTTP_FLOW_RATE = 5
+HTTP_MAX_SIZE = 1000000
+
+# Newest samples kept per in-memory series when results go to a store,
+# which already keeps all of them on disk
+STORED_METRICS_LIMIT = 100000
 
 class EnhancedTrafficAnalyzer:
     """Enhanced traffic analysis with statistics collection"""
     
-    def __init__(self):
+    def __init__(self, store=None, log_limit=1000, metrics_limit=None,
+                 exporter=None, watchdog=None):
+        """store: optional resultstore.RunStore that every result is
+           streamed to; memory then only keeps the last log_limit tests
+           metrics_limit: newest samples kept per in-memory series
+           (default: unbounded, or STORED_METRICS_LIMIT with a store)
+           exporter: optional metricsexport.MetricsExporter publishing
+           live rates, qdisc counters, RTTs and test progress
+           watchdog: optional started cpuplacement.CpuWatchdog; each
+           test is then marked when it was CPU-bound"""
+        self.store = store
+        self.exporter = exporter
+        self.watchdog = watchdog
+        if metrics_limit is None and store:
+            metrics_limit = STORED_METRICS_LIMIT
+        self.metrics = MetricsStore(limit=metrics_limit)
         self.stats = {}
-        self.traffic_log = []
+        self.traffic_log = deque(maxlen=log_limit) if store else []
+        self.latency = None
+        # Wave ids are unique per analyzer, so waves of separate
+        # run_traffic() calls are never taken to have run together
+        self._next_wave = 0
     
-    def generate_traffic_matrix(self, net):
-        """Generate traffic between multiple hosts"""
+    def generate_traffic_matrix(self, net, concurrent=False, wave_size=None,
+                                base_port=5001, duration=5):
+        """Generate traffic between multiple hosts
+        
+        With concurrent=True every pair gets its own server port and all
+        clients run at the same time (or in waves of wave_size pairs), so
+        the flows contend with each other as they would in production.
+        """
         info('\n*** Generating traffic matrix\n')
         hosts = net.hosts
         
@@ -30,96 +88,396 @@ class EnhancedTrafficAnalyzer:
             (hosts[0], hosts[4], 'UDP Streaming'),
             (hosts[2], hosts[4], 'HTTP-like')
         ]
+        return self.run_traffic(traffic_pairs, concurrent, wave_size,
+                                base_port, duration)
+    
+    def run_traffic(self, traffic_pairs, concurrent=False, wave_size=None,
+                    base_port=5001, duration=5):
+        """Run a list of (src, dst, traffic type) tests"""
+        if self.exporter:
+            self.exporter.inc('tests_planned', len(traffic_pairs),
+                              help='Traffic tests scheduled so far')
+        
+        if concurrent:
+            return self._run_concurrent_traffic(traffic_pairs, wave_size,
+                                                base_port, duration)
         
-        for src, dst, traffic_type in traffic_pairs:
-            self._run_traffic_test(src, dst, traffic_type)
+        return [self._run_traffic_test(src, dst, traffic_type,
+                                       port=base_port, duration=duration)
+                for src, dst, traffic_type in traffic_pairs]
     
-    def _run_traffic_test(self, src, dst, traffic_type):
+    def _run_traffic_test(self, src, dst, traffic_type, port=5001, duration=5):
         """Run individual traffic test"""
         info(f'\n*** {traffic_type} traffic: {src.name} -> {dst.name}\n')
         
         # Start server on destination
-        dst.cmd(f'iperf -s -p 5001 > /tmp/iperf_server_{dst.name}.log 2>&1 &')
+        server = self._start_iperf_server(dst, traffic_type, port)
         time.sleep(1)
         
         # Run client on source
+        started = time.time()
+        result = self._parser(traffic_type)
+        result.feed(src.cmd(shlex.join(self._iperf_client_cmd(
+            dst, traffic_type, port, duration))))
+        
+        # Log results
+        test_result = self._log_traffic_result(src, dst, traffic_type, result,
+                                               started=started, port=port)
+        
+        # Kill only the server we started
+        self._stop_iperf_server(server)
+        
+        return test_result
+    
+    def _run_concurrent_traffic(self, traffic_pairs, wave_size=None,
+                                base_port=5001, duration=5):
+        """Run traffic pairs simultaneously, one server port per pair"""
+        wave_size = wave_size or len(traffic_pairs)
+        results = []
+        
+        for start in range(0, len(traffic_pairs), wave_size):
+            wave = traffic_pairs[start:start + wave_size]
+            wave_id = self._next_wave
+            self._next_wave += 1
+            info(f'\n*** Starting wave of {len(wave)} concurrent flows\n')
+            
+            # Distinct ports let several flows share a destination host
+            servers = [self._start_iperf_server(dst, traffic_type,
+                                                base_port + start + i)
+                       for i, (src, dst, traffic_type) in enumerate(wave)]
+            time.sleep(1)
+            
+            clients = {}
+            started = time.time()
+            for i, (src, dst, traffic_type) in enumerate(wave):
+                info(f'*** {traffic_type} traffic: {src.name} -> {dst.name}\n')
+                cmd = self._iperf_client_cmd(dst, traffic_type,
+                                             base_port + start + i, duration)
+                clients[i] = src.popen(cmd, stderr=subprocess.STDOUT)
+            
+            # Parse output while clients run; log each one as it exits
+            parsers = {i: self._parser(wave[i][2]) for i in clients}
+            running = dict(clients)
+            pending = set(clients)
+            # The trailing (None, '') flushes clients that exit last
+            for i, line in chain(pmonitor(running), [(None, '')]):
+                if i is not None:
+                    parsers[i].feed(line)
+                for done in sorted(pending - set(running)):
+                    src, dst, traffic_type = wave[done]
+                    results.append(self._log_traffic_result(
+                        src, dst, traffic_type, parsers[done], wave=wave_id,
+                        started=started, port=base_port + start + done))
+                    pending.discard(done)
+            
+            for client in clients.values():
+                client.wait()
+            for server in servers:
+                self._stop_iperf_server(server)
+        
+        return results
+    
+    def _start_iperf_server(self, dst, traffic_type, port):
+        """Start the server of a traffic test on dst; returns its process
+        
+        HTTP-like tests get a multi-worker httpload server instead of iperf.
+        """
+        if traffic_type == 'HTTP-like':
+            return start_server(dst, port, workers=2)
+        cmd = ['iperf', '-s', '-p', str(port)]
         if 'UDP' in traffic_type:
-            cmd = f'iperf -c {dst.IP()} -u -b 5M -t 5 -i 1'
-        else:
-            cmd = f'iperf -c {dst.IP()} -t 5 -i 1'
+            cmd.append('-u')
+        return dst.popen(cmd, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL)
+    
+    def _stop_iperf_server(self, server):
+        """Terminate an iperf server started by _start_iperf_server"""
+        server.terminate()
+        server.wait()
+    
+    def _iperf_client_cmd(self, dst, traffic_type, port, duration):
+        """Build the client argument list for a traffic type
         
-        result = src.cmd(cmd)
+        HTTP-like tests run short request/response flows and measure
+        their completion times instead of one long iperf stream.
+        """
+        if traffic_type == 'HTTP-like':
+            return client_command([f'{dst.IP()}:{port}'], HTTP_CDF,
+                                  HTTP_FLOW_RATE, duration,
+                                  max_size=HTTP_MAX_SIZE)
+        cmd = ['iperf', '-c', dst.IP(), '-p', str(port), '-t', str(duration),
+               '-i', '1']
+        if 'UDP' in traffic_type:
+            cmd += ['-u', '-b', f'{UDP_RATE_MBPS}M']
+        return cmd
+    
+    def _log_traffic_result(self, src, dst, traffic_type, result, wave=None,
+                            started=None, port=None):
+        """Record the outcome of one traffic test
         
-        # Log results
+        Tests logged with the same wave ran concurrently; wave None means
+        the test ran on its own.  started is when the client started and
+        port the server port, which identify the test's connections.
+        """
         test_result = {
             'type': traffic_type,
             'source': src.name,
             'destination': dst.name,
             'result': self._parse_iperf_result(result),
+            'wave': wave,
+            'port': port,
+            'started': started,
             'timestamp': time.time()
         }
+        if self.watchdog and started is not None:
+            test_result['cpu'] = self.watchdog.verdict(
+                [src.name, dst.name], started, test_result['timestamp'])
         
         self.traffic_log.append(test_result)
-        
-        # Kill server
-        dst.cmd('pkill -f "iperf -s"')
-        
+        self.metrics.add_test(test_result['timestamp'], src.name, dst.name,
+                              traffic_type, test_result['result']['summary'],
+                              wave)
+        if self.store:
+            self.store.event('traffic_test', **test_result)
+        if self.exporter:
+            self._export_test(test_result)
         return test_result
     
+    def _export_test(self, test_result):
+        """Publish test progress and the latest throughput of a pair"""
+        self.exporter.inc('tests_completed', type=test_result['type'],
+                          help='Traffic tests finished, by type')
+        summary = test_result['result']['summary'] or {}
+        if summary.get('bits_per_second') is not None:
+            self.exporter.set('test_throughput_bps',
+                              summary['bits_per_second'],
+                              help='Throughput of the latest test of a pair',
+                              src=test_result['source'],
+                              dst=test_result['destination'],
+                              type=test_result['type'])
+    
+    def _parser(self, traffic_type):
+        """Incremental parser for the client output of a traffic type"""
+        if traffic_type == 'HTTP-like':
+            distribution = SizeDistribution.named(HTTP_CDF, HTTP_MAX_SIZE)
+            return FlowParser(HTTP_FLOW_RATE * distribution.mean() * 8)
+        return IperfParser()
+    
     def _parse_iperf_result(self, result):
         """Parse iperf output for relevant metrics"""
-        lines = result.split('\n')
-        for line in lines:
-            if 'Gbits/sec' in line or 'Mbits/sec' in line:
-                return line.strip()
-        return "No throughput data"
-    
-    def monitor_bandwidth(self, net, duration=10):
-        """Monitor bandwidth usage on all links"""
-        info(f'\n*** Monitoring bandwidth for {duration} seconds\n')
+        if isinstance(result, (IperfParser, FlowParser)):
+            return result.close().to_dict()
+        return parse_iperf(result).to_dict()
+    
+    def monitor_bandwidth(self, net, duration=10, rate=50, nodes=None,
+                          qdisc_interval=0.5):
+        """Monitor bandwidth usage on all links
         
-        hosts = net.hosts
-        monitor_data = {}
+        Counters of every interface of every host and switch are sampled
+        at `rate` Hz, so bursts show up in the peak and percentile figures
+        instead of being averaged away over the whole duration.  TCLink
+        qdisc counters are collected alongside every qdisc_interval
+        seconds (None disables them).
+        """
+        info(f'\n*** Monitoring bandwidth for {duration} seconds\n')
         
-        # Start monitoring on each host
-        for host in hosts:
-            # Get initial stats
-            initial = self._get_interface_stats(host)
-            monitor_data[host.name] = {'initial': initial}
+        window = int(duration * rate) + 1
+        sampler = InterfaceSampler(net, rate=rate, window=window, nodes=nodes)
+        collector = None
+        if qdisc_interval:
+            collector = QdiscCollector(net, interval=qdisc_interval)
+        if self.exporter:
+            self.exporter.attach_sampler(sampler)
+            if collector:
+                self.exporter.attach_collector(collector)
+        started = time.monotonic()
+        try:
+            sampler.start()
+            if collector:
+                collector.start()
+            time.sleep(duration)
+            sampler.stop()
+            self._load_rates(sampler)
+            monitor_data = self.bandwidth_summary(start=started)
+        finally:
+            sampler.close()
+            if collector:
+                collector.stop()
+            if self.exporter:
+                # Stopped sources would keep exporting their last values
+                self.exporter.detach(sampler)
+                if collector:
+                    self.exporter.detach(collector)
         
-        time.sleep(duration)
+        if collector:
+            self.stats['qdisc'] = collector.summary()
+        if self.store:
+            self._store_series(sampler, collector)
+            self.store.event('bandwidth', summary=monitor_data,
+                             qdisc=self.stats.get('qdisc'))
         
-        # Get final stats and calculate differences
-        for host in hosts:
-            final = self._get_interface_stats(host)
-            monitor_data[host.name]['final'] = final
-            
-            # Calculate bandwidth
-            rx_rate = (final['rx_bytes'] - monitor_data[host.name]['initial']['rx_bytes']) / duration
-            tx_rate = (final['tx_bytes'] - monitor_data[host.name]['initial']['tx_bytes']) / duration
-            
-            info(f'\n*** {host.name} Bandwidth Usage:\n')
-            info(f'   RX Rate: {rx_rate/1000:.2f} KB/s\n')
-            info(f'   TX Rate: {tx_rate/1000:.2f} KB/s\n')
-            
-            monitor_data[host.name]['rx_rate'] = rx_rate
-            monitor_data[host.name]['tx_rate'] = tx_rate
+        for node, intfs in monitor_data.items():
+            info(f'\n*** {node} Bandwidth Usage:\n')
+            for intf, data in intfs.items():
+                if data['rx_bps'] is None:
+                    continue
+                info(f'   {intf}: RX {data["rx_bps"]["mean"]/8000:.2f} KB/s '
+                     f'(peak {data["rx_bps"]["peak"]/8000:.2f}), '
+                     f'TX {data["tx_bps"]["mean"]/8000:.2f} KB/s '
+                     f'(peak {data["tx_bps"]["peak"]/8000:.2f})\n')
         
         self.stats['bandwidth'] = monitor_data
+        return monitor_data
     
-    def _get_interface_stats(self, host):
-        """Get network interface statistics"""
-        stats = {}
-        output = host.cmd('cat /proc/net/dev')
+    def _load_rates(self, sampler):
+        """Move a sampler's rates and utilization into the metrics store"""
+        for (node, intf), ring in sampler.rings.items():
+            times, rx, tx = ring.rate_arrays()
+            self.metrics.append('rx_bps', node, intf, times, rx)
+            self.metrics.append('tx_bps', node, intf, times, tx)
+            capacity = sampler.capacity[(node, intf)]
+            if capacity:
+                self.metrics.append('rx_util', node, intf, times,
+                                    rx / capacity)
+                self.metrics.append('tx_util', node, intf, times,
+                                    tx / capacity)
+    
+    def bandwidth_summary(self, start=None, end=None):
+        """Per-interface rate and utilization statistics for a window
         
-        for line in output.split('\n'):
-            if 'eth0' in line:
-                parts = line.split()
-                stats['rx_bytes'] = int(parts[1])
-                stats['tx_bytes'] = int(parts[9])
-                break
+        Times are time.monotonic() values; by default every sample
+        collected so far is included.
+        """
+        summary = {}
+        for metric in ('rx_bps', 'tx_bps', 'rx_util', 'tx_util'):
+            for (node, intf), data in self.metrics.aggregate(
+                    metric, start=start, end=end).items():
+                entry = summary.setdefault(node, {}).setdefault(intf, {
+                    'samples': 0, 'rx_bps': None, 'tx_bps': None,
+                    'rx_util': None, 'tx_util': None})
+                entry[metric] = data
+                entry['samples'] = max(entry['samples'], data['count'])
+        return summary
+    
+    def _store_series(self, sampler, collector=None):
+        """Append the sampled rates and qdisc counters to the store"""
+        # Samplers use the monotonic clock; the store keeps wall time
+        offset = time.time() - time.monotonic()
+        for (node, intf), ring in sampler.rings.items():
+            times, rx, tx = ring.rate_arrays()
+            times = (times + offset).tolist()
+            self.store.samples(f'bandwidth/{node}/{intf}/rx_bps',
+                               zip(times, rx.tolist()))
+            self.store.samples(f'bandwidth/{node}/{intf}/tx_bps',
+                               zip(times, tx.tolist()))
+        if collector:
+            for (dev, what, kind, handle), samples in collector.series.items():
+                prefix = f'qdisc/{dev}/{what}/{kind}/{handle}'
+                for field in ('sent_bytes', 'dropped', 'overlimits',
+                              'backlog_packets'):
+                    self.store.samples(
+                        f'{prefix}/{field}',
+                        ((sample.time + offset, getattr(sample, field))
+                         for sample in samples))
+        self.store.flush()
+    
+    def measure_latency(self, net, count=10, **kwargs):
+        """Probe RTT and loss between all host pairs concurrently"""
+        info('\n*** Measuring all-pairs latency\n')
+        self.latency = probe(net, count=count, **kwargs)
+        self.stats['latency'] = self.latency.to_dict()
+        if self.store:
+            self.store.event('latency', **self.stats['latency'])
+        if self.exporter:
+            self._export_latency(self.latency)
+        return self.latency
+    
+    def _export_latency(self, matrix):
+        """Publish per-pair RTT and loss of a LatencyMatrix"""
+        for stat, name in (('min', 'rtt_min_ms'), ('avg', 'rtt_avg_ms'),
+                           ('p99', 'rtt_p99_ms'),
+                           ('loss', 'ping_loss_ratio')):
+            values = getattr(matrix, stat)
+            self.exporter.replace(name, [
+                ({'src': matrix.names[i], 'dst': matrix.names[j]},
+                 float(values[i, j]))
+                for i, j in zip(*np.nonzero(~np.isnan(values)))])
+    
+    def check_capacity(self, net, tolerance=0.15):
+        """Compare measured throughput with what the topology allows
         
-        return stats
+        Flows that ran together are predicted together with max-min
+        fair sharing; flows that ran alone get their stand-alone rate.
+        UDP and HTTP-like tests are capped at the load their client
+        offers.
+        """
+        planner = CapacityPlanner.from_net(net)
+        groups = {}
+        for test in self.traffic_log:
+            groups.setdefault(test['wave'], []).append(test)
+        
+        checks = []
+        for wave, tests in groups.items():
+            flows = [(t['source'], t['destination']) for t in tests]
+            demands = [UDP_RATE_MBPS if 'UDP' in t['type'] else
+                       t['result'].get('offered_bps', 0) / 1e6 or None
+                       for t in tests]
+            measured = [t['result']['summary']['bits_per_second'] / 1e6
+                        if t['result']['summary'] else None for t in tests]
+            predictions = planner.predict(flows, demands)
+            for test, check in zip(tests, compare(
+                    predictions, measured, tolerance, isolated=wave is None)):
+                check['type'] = test['type']
+                if (check['verdict'] == 'below prediction' and
+                        test.get('cpu', {}).get('cpu_bound')):
+                    # The host, not the network, limited this flow
+                    check['verdict'] = 'cpu-bound'
+                checks.append(check)
+        
+        self.stats['capacity'] = checks
+        if self.store:
+            self.store.event('capacity', checks=checks)
+        return checks
+    
+    def attach_tcp(self, net, summaries):
+        """Add captured TCP connection analysis to the traffic tests
+        
+        summaries: tcpanalysis summaries, e.g. HostCaptures.summaries()
+        Each test gets the connections it opened in test['tcp'], so its
+        RTTs, retransmissions and zero windows sit next to its result.
+        """
+        hosts = {host.name: host.IP() for host in net.hosts}
+        matched = attach_to_tests(self.traffic_log, summaries, hosts)
+        if self.store:
+            for test in matched:
+                self.store.event('tcp_analysis', source=test['source'],
+                                 destination=test['destination'],
+                                 port=test['port'], started=test['started'],
+                                 connections=test['tcp'])
+        return matched
+    
+    def _format_result(self, result):
+        """Render a parsed iperf result as a one-line summary"""
+        summary = result['summary']
+        if summary is None:
+            return "No throughput data"
+        text = f'{summary["bits_per_second"] / 1e6:.2f} Mbits/sec'
+        if summary['retransmits'] is not None:
+            text += f', {summary["retransmits"]} retransmits'
+        if summary['jitter_ms'] is not None:
+            text += f', {summary["jitter_ms"]:.3f} ms jitter'
+        if result['format'] == 'shortflows':
+            text += f', {result["flows"]} flows'
+            if summary['lost']:
+                text += f', {summary["lost"]} failed'
+            for size, fct in result['fct_ms'].items():
+                if fct is not None:
+                    text += (f'\n    FCT {size}: p50 {fct["p50"]:.1f} ms, '
+                             f'p99 {fct["p99"]:.1f} ms ({fct["count"]})')
+        elif summary['lost'] is not None and summary['packets']:
+            loss = 100.0 * summary['lost'] / summary['packets']
+            text += f', {loss:.2f}% loss'
+        return text
     
     def generate_report(self):
         """Generate analysis report"""
@@ -132,49 +490,101 @@ class EnhancedTrafficAnalyzer:
             info(f'Test {i}:\n')
             info(f'  Type: {test["type"]}\n')
             info(f'  Path: {test["source"]} -> {test["destination"]}\n')
-            info(f'  Result: {test["result"]}\n')
+            info(f'  Result: {self._format_result(test["result"])}\n')
+            if test.get('cpu', {}).get('cpu_bound'):
+                info(f'  CPU-bound: {"; ".join(test["cpu"]["reasons"])}\n')
+            # Short-flow tests open many connections; show the slowest
+            connections = sorted(test.get('tcp', ()), key=lambda c:
+                                 data_direction(c)['goodput_bps'])
+            for connection in connections[:3]:
+                info(f'  TCP: {format_summary(connection)}\n')
+            if len(connections) > 3:
+                info(f'  TCP: {len(connections) - 3} more connections\n')
+        
+        pairs = self.metrics.pair_aggregate()
+        if pairs:
+            info('\n=== Per-pair Throughput ===\n')
+            for (src, dst), data in pairs.items():
+                info(f'{src} -> {dst}: {data["mean"] / 1e6:.2f} Mbits/sec '
+                     f'mean over {data["count"]} tests '
+                     f'(min {data["min"] / 1e6:.2f}, '
+                     f'max {data["max"] / 1e6:.2f})\n')
         
-        if 'bandwidth' in self.stats:
+        bandwidth = self.bandwidth_summary()
+        if bandwidth:
+            self.stats['bandwidth'] = bandwidth
             info('\n=== Bandwidth Usage Summary ===\n')
-            for host, data in self.stats['bandwidth'].items():
-                if 'rx_rate' in data:
-                    info(f'{host}:\n')
-                    info(f'  Average RX: {data["rx_rate"]/1000:.2f} KB/s\n')
-                    info(f'  Average TX: {data["tx_rate"]/1000:.2f} KB/s\n')
+            for node, intfs in bandwidth.items():
+                info(f'{node}:\n')
+                for intf, data in intfs.items():
+                    if data['rx_bps'] is None:
+                        continue
+                    rx, tx = data['rx_bps'], data['tx_bps']
+                    info(f'  {intf} Average RX: {rx["mean"]/8000:.2f} KB/s, '
+                         f'p99 {rx["p99"]/8000:.2f} KB/s\n')
+                    info(f'  {intf} Average TX: {tx["mean"]/8000:.2f} KB/s, '
+                         f'p99 {tx["p99"]/8000:.2f} KB/s\n')
+                    if data['tx_util'] is not None:
+                        util = data['tx_util']
+                        info(f'  {intf} TX utilization: '
+                             f'p50 {util["p50"]:.0%}, p95 {util["p95"]:.0%}, '
+                             f'p99 {util["p99"]:.0%}, '
+                             f'peak {util["peak"]:.0%}\n')
+        
+        if self.stats.get('qdisc'):
+            info('\n=== Queue and Shaping Summary ===\n')
+            for intf, data in self.stats['qdisc'].items():
+                info(f'{data["node"]} {intf}:\n')
+                info(f'  Shaper overlimits: {data["shaper_overlimits"]}\n')
+                info(f'  netem drops: {data["netem_dropped"]} '
+                     f'(expected from loss: '
+                     f'{data["expected_loss_drops"]:.0f}, '
+                     f'queue overflow: {data["queue_overflow_drops"]:.0f})\n')
+                info(f'  Peak backlog: {data["peak_backlog_packets"]} '
+                     f'packets (limit {data["max_queue_size"]})\n')
         
-        # Save report to file
+        if self.latency is not None:
+            info('\n=== Latency Summary ===\n')
+            report_latency(self.latency)
+        
+        if self.stats.get('capacity'):
+            info('\n=== Capacity Check ===\n')
+            for check in self.stats['capacity']:
+                predicted, measured = (
+                    'n/a' if check[key] is None else f'{check[key]:.2f}'
+                    for key in ('predicted', 'measured'))
+                info(f'{check["src"]} -> {check["dst"]} ({check["type"]}): '
+                     f'predicted {predicted}, measured {measured} '
+                     f'Mbits/sec -> {check["verdict"]}\n')
+        
+        # Save report to file; with a store it goes into the run directory
         report_data = {
-            'traffic_tests': self.traffic_log,
+            'traffic_tests': list(self.traffic_log),
             'statistics': self.stats
         }
+        path = '/tmp/mininet_analysis_report.json'
+        if self.store:
+            path = os.path.join(self.store.path, 'report.json')
         
-        with open('/tmp/mininet_analysis_report.json', 'w') as f:
+        with open(path, 'w') as f:
             json.dump(report_data, f, indent=2)
         
-        info('\n*** Report saved to /tmp/mininet_analysis_report.json\n')
+        info(f'\n*** Report saved to {path}\n')
 
-def create_simple_topology():
-    """Create a simple star topology for testing"""
-    net = Mininet(controller=Controller, switch=OVSKernelSwitch, link=TCLink)
-    
-    info('*** Adding controller\n')
-    c0 = net.addController('c0')
+def create_simple_topology(n=5):
+    """Create a simple star topology for testing
     
-    info('*** Adding switch\n')
-    s1 = net.addSwitch('s1')
+    The network is brought up with topobuilder.build_network, which
+    applies the TCLink shaping of all n links in parallel batches.
+    """
+    topo = StarTopo(n=n, host_link=dict(bw=50, delay='2ms'))
+    prefix = 24 if n < 255 else 16
     
-    info('*** Adding hosts\n')
-    for i in range(1, 6):
-        net.addHost(f'h{i}', ip=f'10.0.0.{i}/24')
-    
-    info('*** Creating links\n')
-    for host in net.hosts:
-        net.addLink(host, s1, bw=50, delay='2ms')
-    
-    info('*** Building network\n')
-    net.build()
-    c0.start()
-    s1.start([c0])
+    info(f'*** Building star topology with {n} hosts\n')
+    net, timings = build_network(topo, controller=Controller,
+                                 switch=OVSKernelSwitch, link=TCLink,
+                                 ipBase=f'10.0.0.0/{prefix}')
+    report_timings(timings)
     
     return net
 
@@ -195,25 +605,36 @@ if __name__ == '__main__':
     
     # Check for required tools
     try:
-        import subprocess
         install_tools()
     except:
         info('*** Skipping tool installation\n')
     
     # Create and run network
     net = create_simple_topology()
-    analyzer = EnhancedTrafficAnalyzer()
+    store = RunStore(meta={'script': 'trafficanalyzer.py', 'hosts': 5})
+    exporter = MetricsExporter()
+    exporter.start()
+    watchdog = CpuWatchdog(net, placement=place_hosts(net))
+    watchdog.start()
+    analyzer = EnhancedTrafficAnalyzer(store=store, exporter=exporter,
+                                       watchdog=watchdog)
+    captures = HostCaptures(net.hosts)
     
     try:
-        net.start()
-        
         info('\n' + '='*60 + '\n')
         info('*** Starting Enhanced Traffic Analysis\n')
         info('='*60 + '\n')
         
         # Run comprehensive tests
-        analyzer.generate_traffic_matrix(net)
+        captures.start()
+        try:
+            analyzer.generate_traffic_matrix(net)
+        finally:
+            captures.stop()
+        analyzer.attach_tcp(net, captures.summaries())
         analyzer.monitor_bandwidth(net, duration=5)
+        analyzer.measure_latency(net)
+        analyzer.check_capacity(net)
         analyzer.generate_report()
         
         info('\n*** Analysis complete. Entering interactive mode...\n')
@@ -226,5 +647,8 @@ if __name__ == '__main__':
         CLI(net)
         
     finally:
+        watchdog.stop()
+        exporter.stop()
+        store.close()
         net.stop()
         info('\n*** Network stopped\n')
\ No newline at end of file